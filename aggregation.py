@@ -0,0 +1,167 @@
+"""
+报告与分析的聚合计算
+一次遍历记录，同时得到汇总、分类、每日、每月统计和大额记录排行，
+供月度/年度报告、时间范围分析和分类分析共用。
+累加全部使用整数分，只在输出时换算为元，结果精确。
+"""
+
+import heapq
+
+import categories
+import dates
+from money import from_cents
+
+# 聚合时读取的列，顺序与 PeriodAggregate.add 的参数一致
+RECORD_COLUMNS = 'amount_cents, category_id, type, description, date, day'
+
+
+def iter_period_records(conn, user_id, start_date, end_date):
+    """逐行读取用户在日期区间（均含当天）内的记录，不在内存中整体保存"""
+    start_day, end_day = dates.day_range(start_date, end_date)
+    return conn.execute(f'''
+        SELECT {RECORD_COLUMNS}
+        FROM records WHERE user_id = ? AND day >= ? AND day < ?
+    ''', (user_id, start_day, end_day))
+
+
+class PeriodAggregate:
+    """单次遍历的区间聚合结果
+
+    分类、每日、每月统计中非income类型按支出计入（与原报告逻辑一致），
+    大额记录用容量为top_n的小顶堆维护，不对全部记录排序。
+    categories、daily、monthly中的金额单位为分，categories以分类id、daily以整数天数为键，
+    各输出方法返回以元为单位、以分类名称为键的结果（名称取自category_names）。
+    """
+
+    def __init__(self, top_n=10, category_names=None):
+        self.top_n = top_n
+        self.category_names = category_names or {}
+        self.income_cents = 0
+        self.expense_cents = 0
+        self.records_count = 0
+        self.categories = {}
+        self.daily = {}
+        self.monthly = {}
+        self._top = {'income': [], 'expense': []}
+        self._seq = 0
+
+    def add(self, amount, category, record_type, description, date, day):
+        """累加一条记录，amount为整数分，category为分类id，day为records.day"""
+        self.records_count += 1
+        is_income = record_type == 'income'
+
+        if is_income:
+            self.income_cents += amount
+        elif record_type == 'expense':
+            self.expense_cents += amount
+
+        side = 'income' if is_income else 'expense'
+
+        stats = self.categories.get(category)
+        if stats is None:
+            stats = self.categories[category] = {'income': 0, 'expense': 0, 'count': 0}
+        stats[side] += amount
+        stats['count'] += 1
+
+        daily = self.daily.get(day)
+        if daily is None:
+            daily = self.daily[day] = {'income': 0, 'expense': 0}
+        daily[side] += amount
+
+        month = self.monthly.get(date[:7])
+        if month is None:
+            month = self.monthly[date[:7]] = {'income': 0, 'expense': 0}
+        month[side] += amount
+
+        heap = self._top.get(record_type)
+        if heap is not None and self.top_n > 0:
+            # 金额相同时保留先出现的记录：序号取负，较晚的记录先被挤出
+            self._seq += 1
+            key = (amount, -self._seq)
+            if len(heap) < self.top_n:
+                heapq.heappush(heap, (key, self._record(amount, category, record_type, description, date)))
+            elif key > heap[0][0]:
+                heapq.heapreplace(heap, (key, self._record(amount, category, record_type, description, date)))
+
+    def set_top_records(self, record_type, records):
+        """直接设置已按金额从大到小排好的大额记录（金额为分、分类为id），用于其它方式计算的结果"""
+        self._top[record_type] = [((record['amount'], -rank), record)
+                                  for rank, record in enumerate(records[:self.top_n])]
+
+    @staticmethod
+    def _record(amount, category, record_type, description, date):
+        return {
+            'amount': amount,
+            'category': category,
+            'type': record_type,
+            'description': description,
+            'date': date
+        }
+
+    @property
+    def income(self):
+        return from_cents(self.income_cents)
+
+    @property
+    def expense(self):
+        return from_cents(self.expense_cents)
+
+    @property
+    def balance(self):
+        return from_cents(self.income_cents - self.expense_cents)
+
+    def category_name(self, category_id):
+        return self.category_names.get(category_id, '')
+
+    def top_records(self, record_type, limit=None):
+        """金额最大的记录，按金额从大到小"""
+        ranked = sorted(self._top[record_type], key=lambda item: item[0], reverse=True)
+        return [dict(record, amount=from_cents(record['amount']), category=self.category_name(record['category']))
+                for _, record in ranked[:limit]]
+
+    def category_stats(self, with_count=False):
+        """各分类的收入/支出，with_count为True时包含记录数"""
+        result = {}
+        for category_id, stats in self.categories.items():
+            item = {'income': from_cents(stats['income']), 'expense': from_cents(stats['expense'])}
+            if with_count:
+                item['count'] = stats['count']
+            result[self.category_name(category_id)] = item
+        return result
+
+    def daily_stats(self):
+        """每日收支，按日期排序，键为 YYYY-MM-DD"""
+        return {
+            dates.from_day(day): {'income': from_cents(stats['income']), 'expense': from_cents(stats['expense'])}
+            for day, stats in sorted(self.daily.items())
+        }
+
+    def monthly_trend(self, months):
+        """按给定月份顺序返回每月收支，缺少数据的月份为0"""
+        trend = []
+        for month in months:
+            stats = self.monthly.get(month, {'income': 0, 'expense': 0})
+            trend.append({
+                'month': month,
+                'income': from_cents(stats['income']),
+                'expense': from_cents(stats['expense']),
+                'balance': from_cents(stats['income'] - stats['expense'])
+            })
+        return trend
+
+
+def aggregate(rows, top_n=10):
+    """对 (amount_cents, category_id, type, description, date, day) 行做一次遍历聚合"""
+    result = PeriodAggregate(top_n)
+    add = result.add
+    for row in rows:
+        add(*row)
+    return result
+
+
+def aggregate_period(conn, user_id, start_date, end_date, top_n=10):
+    """读取并聚合用户在日期区间内的记录"""
+    result = aggregate(iter_period_records(conn, user_id, start_date, end_date), top_n)
+    # 读完记录后再取分类名称，记录引用的分类一定已在其中
+    result.category_names = categories.lookup(conn, user_id).names
+    return result
@@ -0,0 +1,650 @@
+"""
+性能基准测试
+生成包含N个用户、每人M条记录的测试数据库（收支分类、日期、金额按常见记账习惯分布，
+部分记录以旧finance_records表数据的形式存在），再通过Flask测试客户端逐个调用所有路由，
+输出每个接口的p50/p95/p99延迟、吞吐量和峰值内存（JSON），便于在不同提交之间对比。
+
+用法:
+    python benchmark.py [--users 5] [--records 2000] [--iterations 50] [--output result.json]
+    python benchmark.py --compare baseline.json      # 与之前的结果对比，p95变慢超过阈值时返回非0
+"""
+
+import argparse
+import contextlib
+import gc
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import budgets
+import categories
+import columnar
+import database
+import dates
+import jobs
+import ledger
+import report_cache
+import search
+import server
+import slow_query
+from money import to_cents
+
+# 测试用户的密码
+BENCH_PASSWORD = 'bench123'
+
+# 收入分类: (分类, 说明)
+INCOME_DESCRIPTIONS = {
+    '工资': ['月工资', '工资到账'],
+    '奖金': ['季度奖金', '绩效奖金', '项目奖金'],
+    '投资': ['基金收益', '股票分红', '理财到期'],
+    '其他收入': ['二手转让', '红包', '报销'],
+}
+
+# 支出分类: (权重, 金额中位数, 说明)
+EXPENSE_PROFILES = {
+    '餐饮': (35, 35, ['午餐', '晚餐', '早餐', '外卖', '咖啡', '聚餐']),
+    '交通': (15, 12, ['地铁', '公交', '打车', '加油', '停车费']),
+    '购物': (15, 150, ['超市', '网购', '日用品', '衣服', '数码产品']),
+    '娱乐': (8, 80, ['电影', '游戏', 'KTV', '旅游', '演出']),
+    '医疗': (4, 120, ['药品', '门诊', '体检']),
+    '教育': (5, 300, ['书籍', '网课', '培训']),
+    '其他支出': (5, 50, ['快递', '话费', '礼物', '维修']),
+}
+
+# 延迟对比时判定为变慢的比例
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+
+
+def _random_time(rng, day):
+    """约三成记录带具体时间"""
+    if rng.random() < 0.3:
+        return f"{day.isoformat()} {rng.randint(7, 22):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+    return day.isoformat()
+
+
+def _month_starts(start, end):
+    current = start.replace(day=1)
+    while current <= end:
+        yield current
+        current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def generate_user_records(rng, count, start, end):
+    """生成一个用户的记录 (amount, category, type, description, date)
+
+    每月固定的工资和房租，每季度奖金，其余为按权重随机分类的日常支出（对数正态金额）
+    和少量投资/其他收入，日期在 [start, end] 内均匀分布。
+    """
+    rows = []
+    salary = round(rng.uniform(6000, 25000), -2)
+    rent = round(rng.uniform(1500, 5000), -2)
+
+    for month_start in _month_starts(start, end):
+        payday = month_start.replace(day=10)
+        if start <= payday <= end:
+            rows.append((salary, '工资', 'income', '月工资', payday.isoformat()))
+            if month_start.month in (3, 6, 9, 12):
+                rows.append((round(salary * rng.uniform(0.3, 1.5), 2), '奖金', 'income',
+                             rng.choice(INCOME_DESCRIPTIONS['奖金']), payday.isoformat()))
+        if start <= month_start <= end:
+            rows.append((rent, '住房', 'expense', '房租', month_start.isoformat()))
+
+    rows = rows[:count]
+    span = (end - start).days
+    names = list(EXPENSE_PROFILES)
+    weights = [EXPENSE_PROFILES[name][0] for name in names]
+
+    while len(rows) < count:
+        day = start + timedelta(days=rng.randint(0, span))
+        if rng.random() < 0.05:
+            category = rng.choice(['投资', '其他收入'])
+            amount = round(rng.lognormvariate(6, 1), 2)
+            rows.append((amount, category, 'income', rng.choice(INCOME_DESCRIPTIONS[category]),
+                         _random_time(rng, day)))
+            continue
+        category = rng.choices(names, weights)[0]
+        _, median, descriptions = EXPENSE_PROFILES[category]
+        amount = round(max(0.5, rng.lognormvariate(0, 0.8) * median), 2)
+        rows.append((amount, category, 'expense', rng.choice(descriptions), _random_time(rng, day)))
+
+    rng.shuffle(rows)
+    return rows
+
+
+def generate_dataset(conn, users=5, records_per_user=2000, months=24, legacy_fraction=0.2,
+                     seed=42, password=BENCH_PASSWORD):
+    """生成测试用户和记录，返回 [(user_id, username), ...]
+
+    每个用户约legacy_fraction的记录写入finance_records_legacy，
+    再按迁移3的方式合并进records，与从旧版本升级上来的数据库一致。
+    """
+    rng = random.Random(seed)
+    end = date.today()
+    start = end - timedelta(days=months * 30)
+    # 与 simple_desktop_client.hash_password 一致
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    created = []
+
+    for index in range(users):
+        username = f'bench_user_{index + 1}'
+        conn.execute('BEGIN')
+        cursor = conn.execute('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
+                              (username, password_hash, f'{username}@example.com'))
+        user_id = cursor.lastrowid
+
+        rows = generate_user_records(rng, records_per_user, start, end)
+        legacy_count = int(len(rows) * legacy_fraction)
+        legacy, current = rows[:legacy_count], rows[legacy_count:]
+
+        current = [(to_cents(row[0]),) + row[1:] for row in current]
+        for offset in range(0, len(current), 5000):
+            ledger.add_records(conn, user_id, current[offset:offset + 5000])
+        # 旧数据合并时按名称关联分类，先确保这些分类对该用户存在
+        categories.resolve(conn, user_id, [(row[1], row[2]) for row in legacy])
+        conn.executemany('''
+            INSERT INTO finance_records_legacy (user_id, amount, category, record_type, description,
+                                                record_date, created_at, updated_at, sync_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(user_id, amount, category, record_type, description, record_date, now, now,
+               f'{user_id}-{position}')
+              for position, (amount, category, record_type, description, record_date) in enumerate(legacy)])
+        # 为各支出分类设置预算，添加记录时执行预算检查
+        for category, (_, median, _) in EXPENSE_PROFILES.items():
+            budgets.set_budget(conn, user_id, category, to_cents(median * 30))
+        conn.commit()
+        created.append((user_id, username))
+
+    conn.execute('BEGIN')
+    last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM records').fetchone()[0]
+    # 与迁移7相同，旧表金额用 money.to_cents 换算，而不是SQL中的浮点运算
+    legacy_rows = conn.execute('''
+        SELECT l.user_id, l.amount, c.id, l.record_type, l.description, l.record_date, l.id, l.created_at
+        FROM finance_records_legacy l
+        JOIN categories c ON c.name = l.category AND (c.user_id IS NULL OR c.user_id = l.user_id)
+        WHERE l.id NOT IN (SELECT source_id FROM records WHERE source = 'finance_records')
+        ORDER BY l.id
+    ''').fetchall()
+    conn.executemany('''
+        INSERT INTO records (user_id, amount_cents, category_id, type, description, date, day,
+                             source, source_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 'finance_records', ?, ?)
+    ''', [(user_id, to_cents(amount), category_id, record_type, description, record_date,
+           dates.to_day(record_date), legacy_id, created_at)
+          for user_id, amount, category_id, record_type, description, record_date, legacy_id, created_at
+          in legacy_rows])
+    search.index_ngrams(conn, conn.execute(
+        'SELECT id, description FROM records WHERE id > ?', (last_id,)).fetchall())
+    ledger.rebuild_rollups(conn)
+    conn.commit()
+    conn.execute('ANALYZE')
+    return created
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class BenchContext:
+    """基准测试期间共享的客户端和数据"""
+
+    def __init__(self, app, db_path, users, rng):
+        self.app = app
+        self.db_path = db_path
+        self.users = users
+        self.rng = rng
+        self.clients = []
+        self._turn = 0
+        self._serial = 0
+
+    def login_all(self):
+        for user_id, username in self.users:
+            client = self.app.test_client()
+            client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+            self.clients.append((user_id, client))
+
+    def next_client(self):
+        """轮流使用各用户的客户端"""
+        user_id, client = self.clients[self._turn % len(self.clients)]
+        self._turn += 1
+        return user_id, client
+
+    def serial(self):
+        self._serial += 1
+        return self._serial
+
+    def random_day(self, months_back=12):
+        day = date.today() - timedelta(days=self.rng.randint(0, months_back * 30))
+        return day.isoformat()
+
+    def record_json(self):
+        category = self.rng.choice(list(EXPENSE_PROFILES))
+        return {
+            'amount': round(self.rng.uniform(1, 500), 2),
+            'category': category,
+            'type': 'expense',
+            'description': 'benchmark',
+            'date': self.random_day()
+        }
+
+    def create_record(self, user_id):
+        with database.connection(self.db_path) as conn:
+            record_id = ledger.add_record(conn, user_id, 1000, '餐饮', 'expense', 'benchmark',
+                                          date.today().isoformat())
+            conn.commit()
+        return record_id
+
+    def create_report(self, client):
+        client.post('/api/web/reports/monthly', json={'year': date.today().year, 'month': date.today().month})
+        with database.connection(self.db_path) as conn:
+            return conn.execute('SELECT MAX(id) FROM reports').fetchone()[0]
+
+    def drop_saved_reports(self, user_id):
+        """清空报告缓存和已保存报告，使报告按冷启动重新计算"""
+        report_cache.cache.clear()
+        with database.connection(self.db_path) as conn:
+            conn.execute('DELETE FROM reports WHERE user_id = ?', (user_id,))
+            conn.commit()
+
+
+def _csv_upload(ctx, rows=200):
+    lines = ['date,type,category,amount,description']
+    for _ in range(rows):
+        item = ctx.record_json()
+        lines.append(f"{item['date']},expense,{item['category']},{item['amount']},import")
+    return io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+
+
+def build_endpoints():
+    """所有路由的调用方式
+
+    每项为 (名称, 准备函数)，准备函数在计时之外执行，返回 (客户端, 方法, 路径, 请求参数)。
+    """
+    today = date.today()
+    this_year, this_month = today.year, today.month
+    last_year = today - timedelta(days=365)
+
+    def get(path, **kwargs):
+        def prepare(ctx):
+            _, client = ctx.next_client()
+            return client, 'GET', path, kwargs
+        return prepare
+
+    def anonymous(method, path, data_factory=None):
+        def prepare(ctx):
+            client = ctx.app.test_client()
+            kwargs = {'data': data_factory(ctx)} if data_factory else {}
+            return client, method, path, kwargs
+        return prepare
+
+    def add_record(ctx):
+        _, client = ctx.next_client()
+        return client, 'POST', '/api/records', {'json': ctx.record_json()}
+
+    def add_batch(ctx):
+        _, client = ctx.next_client()
+        return client, 'POST', '/api/records/batch', {'json': [ctx.record_json() for _ in range(50)]}
+
+    def delete_batch(ctx):
+        user_id, client = ctx.next_client()
+        ids = [ctx.create_record(user_id) for _ in range(20)]
+        return client, 'DELETE', '/api/records/batch', {'json': {'ids': ids}}
+
+    def delete_record(ctx):
+        user_id, client = ctx.next_client()
+        return client, 'DELETE', f'/api/records/{ctx.create_record(user_id)}', {}
+
+    def import_csv(ctx):
+        _, client = ctx.next_client()
+        return client, 'POST', '/api/records/import', {
+            'data': {'file': (_csv_upload(ctx), 'records.csv')},
+            'content_type': 'multipart/form-data'
+        }
+
+    def monthly_report(ctx):
+        _, client = ctx.next_client()
+        return client, 'POST', '/api/web/reports/monthly', {'json': {'year': this_year, 'month': this_month}}
+
+    def monthly_report_cold(ctx):
+        user_id, client = ctx.next_client()
+        ctx.drop_saved_reports(user_id)
+        return client, 'POST', '/api/web/reports/monthly', {'json': {'year': this_year, 'month': this_month}}
+
+    def yearly_report(ctx):
+        _, client = ctx.next_client()
+        return client, 'POST', '/api/web/reports/yearly', {'json': {'year': this_year}}
+
+    def yearly_report_cold(ctx):
+        user_id, client = ctx.next_client()
+        ctx.drop_saved_reports(user_id)
+        return client, 'POST', '/api/web/reports/yearly', {'json': {'year': last_year.year}}
+
+    def report_content(ctx):
+        _, client = ctx.next_client()
+        return client, 'GET', f'/api/web/reports/{ctx.create_report(client)}', {}
+
+    def delete_report(ctx):
+        _, client = ctx.next_client()
+        return client, 'DELETE', f'/api/web/reports/{ctx.create_report(client)}', {}
+
+    def get_job(ctx):
+        _, client = ctx.next_client()
+        job_id = client.post('/api/web/reports/yearly', json={'year': this_year, 'async': True}).get_json()['job_id']
+        return client, 'GET', f'/api/web/jobs/{job_id}', {}
+
+    def cancel_job(ctx):
+        _, client = ctx.next_client()
+        job_id = client.post('/api/web/reports/yearly', json={'year': this_year, 'async': True}).get_json()['job_id']
+        return client, 'DELETE', f'/api/web/jobs/{job_id}', {}
+
+    def login(ctx):
+        return ctx.app.test_client(), 'POST', '/login', {
+            'data': {'username': ctx.users[0][1], 'password': BENCH_PASSWORD}
+        }
+
+    def register(ctx):
+        return ctx.app.test_client(), 'POST', '/register', {
+            'data': {'username': f'bench_new_{os.getpid()}_{ctx.serial()}', 'password': BENCH_PASSWORD}
+        }
+
+    def logout(ctx):
+        client = ctx.app.test_client()
+        client.post('/login', data={'username': ctx.users[0][1], 'password': BENCH_PASSWORD})
+        return client, 'GET', '/logout', {}
+
+    start_date = (today - timedelta(days=90)).isoformat()
+    end_date = today.isoformat()
+
+    return [
+        ('GET /', get('/')),
+        ('GET /reports', get('/reports')),
+        ('GET /login', anonymous('GET', '/login')),
+        ('POST /login', login),
+        ('GET /register', anonymous('GET', '/register')),
+        ('POST /register', register),
+        ('GET /logout', logout),
+        ('GET /api/records (all)', get('/api/records')),
+        ('GET /api/records?limit=50', get('/api/records', query_string={'limit': 50})),
+        ('GET /api/records?limit=50&type&category', get('/api/records', query_string={
+            'limit': 50, 'type': 'expense', 'category': '餐饮'})),
+        ('GET /api/records?limit=50&dates&total', get('/api/records', query_string={
+            'limit': 50, 'start_date': start_date, 'end_date': end_date, 'total': 1})),
+        ('POST /api/records', add_record),
+        ('POST /api/records/batch', add_batch),
+        ('DELETE /api/records/batch', delete_batch),
+        ('DELETE /api/records/<id>', delete_record),
+        ('POST /api/records/import', import_csv),
+        ('GET /api/records/search?q (indexed)', get('/api/records/search', query_string={'q': '数码产品'})),
+        ('GET /api/records/search?q (short)', get('/api/records/search', query_string={'q': '咖啡'})),
+        ('GET /api/records/search?q&dates&type', get('/api/records/search', query_string={
+            'q': '月工资', 'type': 'income', 'start_date': last_year.isoformat(), 'end_date': end_date})),
+        ('GET /api/records/export (csv)', get('/api/records/export')),
+        ('GET /api/records/export (ndjson)', get('/api/records/export', query_string={'format': 'ndjson'})),
+        ('GET /api/summary', get('/api/summary')),
+        ('GET /api/monthly-data', get('/api/monthly-data')),
+        ('GET /api/monthly-data?months=24', get('/api/monthly-data', query_string={'months': 24})),
+        ('GET /api/charts/category', get('/api/charts/category')),
+        ('GET /api/charts/category?dates', get('/api/charts/category', query_string={
+            'start_date': start_date, 'end_date': end_date})),
+        ('GET /api/charts/daily', get('/api/charts/daily')),
+        ('GET /api/categories', get('/api/categories')),
+        ('GET /api/budgets', get('/api/budgets')),
+        ('GET /api/web/reports', get('/api/web/reports')),
+        ('GET /api/web/reports/<id>', report_content),
+        ('DELETE /api/web/reports/<id>', delete_report),
+        ('POST /api/web/reports/monthly', monthly_report),
+        ('POST /api/web/reports/monthly (cold)', monthly_report_cold),
+        ('POST /api/web/reports/yearly', yearly_report),
+        ('POST /api/web/reports/yearly (cold)', yearly_report_cold),
+        ('GET /api/web/jobs/<id>', get_job),
+        ('DELETE /api/web/jobs/<id>', cancel_job),
+        ('GET /api/web/analysis/time-range', get('/api/web/analysis/time-range', query_string={
+            'start_date': last_year.isoformat(), 'end_date': end_date})),
+        ('GET /api/web/analysis/category', get('/api/web/analysis/category', query_string={
+            'start_date': last_year.isoformat(), 'end_date': end_date})),
+        ('GET /api/diagnostics/slow-queries', get('/api/diagnostics/slow-queries')),
+        ('GET /ready', get('/ready')),
+        ('GET /metrics', get('/metrics')),
+    ]
+
+
+def _call(client, method, path, kwargs):
+    headers = {'Accept-Encoding': 'gzip'}
+    response = client.open(path, method=method, headers=headers, **kwargs)
+    # 读取完整响应体（包括流式导出）
+    body = response.get_data()
+    response.close()
+    return response.status_code, body
+
+
+def _is_failure(status, body):
+    if status >= 400:
+        return True
+    if body.startswith(b'{') and len(body) <= 512:
+        try:
+            return json.loads(body).get('success') is False
+        except ValueError:
+            return False
+    return False
+
+
+def run_endpoint(ctx, prepare, iterations, warmup):
+    """计时执行一个接口，返回延迟列表（秒）、失败次数和总耗时"""
+    for _ in range(warmup):
+        _call(*prepare(ctx))
+
+    latencies = []
+    failures = 0
+    elapsed = 0.0
+    for _ in range(iterations):
+        call = prepare(ctx)
+        start = time.perf_counter()
+        status, body = _call(*call)
+        duration = time.perf_counter() - start
+        elapsed += duration
+        latencies.append(duration)
+        if _is_failure(status, body):
+            failures += 1
+    return latencies, failures, elapsed
+
+
+def measure_peak_memory(ctx, prepare, iterations):
+    """单独一轮（tracemalloc会拖慢执行）统计接口处理期间的峰值内存（字节）"""
+    peak = 0
+    for _ in range(iterations):
+        call = prepare(ctx)
+        gc.collect()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        _call(*call)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    return peak
+
+
+def run_benchmark(app, db_path, users, iterations=50, warmup=3, memory_iterations=3,
+                  only=None, seed=42):
+    """对所有接口执行基准测试，返回 {名称: 结果}"""
+    ctx = BenchContext(app, db_path, users, random.Random(seed))
+    # 不经过server.serve启动，就绪检查需要手动标记
+    server.set_ready(True)
+    ctx.login_all()
+    results = {}
+
+    endpoints = [(name, prepare) for name, prepare in build_endpoints()
+                 if not only or any(pattern in name for pattern in only)]
+
+    for name, prepare in endpoints:
+        latencies, failures, elapsed = run_endpoint(ctx, prepare, iterations, warmup)
+        latencies.sort()
+        results[name] = {
+            'count': len(latencies),
+            'failures': failures,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        }
+        print(f"  {name:<48} p50 {results[name]['p50_ms']:>9.2f}ms  p95 {results[name]['p95_ms']:>9.2f}ms"
+              f"  {results[name]['throughput_rps']:>8} req/s" + (f"  失败 {failures}" if failures else ''))
+
+    if memory_iterations:
+        tracemalloc.start()
+        try:
+            for name, prepare in endpoints:
+                results[name]['peak_memory_kb'] = round(measure_peak_memory(ctx, prepare, memory_iterations) / 1024, 1)
+        finally:
+            tracemalloc.stop()
+
+    if not jobs.manager.wait_idle(timeout=30):
+        print("⚠️ 仍有后台任务未结束")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """与之前的结果对比p95，返回变慢的接口列表"""
+    regressions = []
+    print(f"\n{'接口':<48} {'基准p95':>10} {'本次p95':>10} {'变化':>8}")
+    for name, result in current['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(name)
+        if not old or not old.get('p95_ms'):
+            continue
+        change = result['p95_ms'] / old['p95_ms'] - 1
+        flag = ''
+        if change > threshold:
+            flag = ' ⚠️'
+            regressions.append(name)
+        print(f"{name:<48} {old['p95_ms']:>10.2f} {result['p95_ms']:>10.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def _run(args, app, db_path):
+    """生成测试数据并执行基准测试，返回结果"""
+    import simple_desktop_client
+
+    print(f"生成测试数据: {args.users} 个用户 × {args.records} 条记录 -> {db_path}")
+    setup_start = time.perf_counter()
+    simple_desktop_client.init_database()
+    with database.connection(db_path) as conn:
+        users = generate_dataset(conn, args.users, args.records, args.months,
+                                 args.legacy_fraction, args.seed)
+    setup_seconds = time.perf_counter() - setup_start
+
+    print(f"开始测试（每个接口 {args.iterations} 次）")
+    endpoints = run_benchmark(app, db_path, users[:max(1, args.clients)], args.iterations,
+                              args.warmup, args.memory_iterations, args.only, args.seed)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'users': args.users,
+            'records_per_user': args.records,
+            'months': args.months,
+            'iterations': args.iterations,
+            'columnar': columnar.engine.enabled,
+            'setup_seconds': round(setup_seconds, 2),
+        },
+        'endpoints': endpoints,
+    }
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='接口性能基准测试')
+    parser.add_argument('--users', type=int, default=5, help='生成的用户数')
+    parser.add_argument('--records', type=int, default=2000, help='每个用户的记录数')
+    parser.add_argument('--months', type=int, default=24, help='记录覆盖的月数')
+    parser.add_argument('--legacy-fraction', type=float, default=0.2, help='来自旧finance_records表的记录比例')
+    parser.add_argument('--clients', type=int, default=3, help='轮流发起请求的登录用户数')
+    parser.add_argument('--iterations', type=int, default=50, help='每个接口的计时请求次数')
+    parser.add_argument('--warmup', type=int, default=3, help='每个接口计时前的预热请求次数')
+    parser.add_argument('--memory-iterations', type=int, default=3, help='统计峰值内存的请求次数，0为不统计')
+    parser.add_argument('--only', action='append', help='只测试名称包含该文本的接口，可重复')
+    parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    parser.add_argument('--db', help='测试数据库文件，默认使用临时文件并在结束后删除')
+    parser.add_argument('--keep-db', action='store_true', help='保留生成的测试数据库')
+    parser.add_argument('--output', help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='p95变慢超过该比例视为性能退化')
+    parser.add_argument('--no-columnar', action='store_true', help='数据分析接口不使用NumPy列式引擎')
+    args = parser.parse_args(argv)
+
+    import simple_desktop_client
+
+    app = simple_desktop_client.app
+    workdir = None
+    if args.db:
+        db_path = args.db
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    else:
+        workdir = tempfile.mkdtemp(prefix='finance-bench-')
+        db_path = os.path.join(workdir, 'bench.db')
+
+    app.config['DATABASE'] = db_path
+    if args.no_columnar:
+        columnar.engine.enabled = False
+    # 慢查询只保存在内存中，诊断接口也参与测试
+    slow_query.log.configure(app.config['SLOW_QUERY_MS'], None, True)
+    app.config['SLOW_QUERY_ENDPOINT'] = True
+
+    # 进度信息（包括数据库迁移的输出）写到标准错误，标准输出只保留结果JSON
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            result = _run(args, app, db_path)
+    finally:
+        database.close_pools()
+        if workdir and not args.keep_db:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"✅ 结果已保存: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with contextlib.redirect_stdout(sys.stderr):
+            regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} 个接口p95变慢超过 {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
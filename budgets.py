@@ -0,0 +1,109 @@
+"""
+分类月度预算
+budgets表为用户的支出分类设置每月预算金额（整数分），每个月按同一金额计算。
+当月已支出金额直接取 monthly_rollups 中 (用户, 月份, 分类, expense) 的汇总行，
+该行在 ledger 增删记录时于同一事务中更新，查询预算状态只需按主键读取，不扫描记录。
+"""
+
+from datetime import date, datetime
+
+import categories
+from money import from_cents
+
+# 月份参数格式
+MONTH_FORMAT_MESSAGE = '月份格式应为 YYYY-MM'
+
+
+def parse_month(text=None):
+    """校验 YYYY-MM 形式的月份，未指定时为当月，格式错误时抛出ValueError"""
+    if not text:
+        return date.today().strftime('%Y-%m')
+    try:
+        return datetime.strptime(text, '%Y-%m').strftime('%Y-%m')
+    except ValueError:
+        raise ValueError(MONTH_FORMAT_MESSAGE)
+
+
+def _status(budget_cents, spent_cents):
+    return {
+        'budget': from_cents(budget_cents),
+        'spent': from_cents(spent_cents),
+        'remaining': from_cents(budget_cents - spent_cents),
+        'over_budget': spent_cents > budget_cents
+    }
+
+
+def list_status(conn, user_id, month):
+    """用户全部预算在某月的执行情况（按分类显示顺序排列）及合计"""
+    rows = conn.execute('''
+        SELECT b.category_id, b.amount_cents, IFNULL(r.total_cents, 0)
+        FROM budgets b
+        LEFT JOIN monthly_rollups r
+            ON r.user_id = b.user_id AND r.month = ? AND r.category_id = b.category_id AND r.type = 'expense'
+        WHERE b.user_id = ?
+    ''', (month, user_id)).fetchall()
+
+    category_set = categories.lookup(conn, user_id)
+    order = {item['id']: index for index, item in enumerate(category_set.ordered(include_archived=True))}
+    rows.sort(key=lambda row: order.get(row[0], len(order)))
+    return {
+        'budgets': [dict(_status(budget_cents, spent_cents),
+                         category_id=category_id, category=category_set.names.get(category_id, ''))
+                    for category_id, budget_cents, spent_cents in rows],
+        'total': _status(sum(row[1] for row in rows), sum(row[2] for row in rows))
+    }
+
+
+def category_status(conn, user_id, category_id, month):
+    """某个分类在某月的预算执行情况，未设置预算时返回None"""
+    row = conn.execute('''
+        SELECT b.amount_cents, IFNULL(r.total_cents, 0)
+        FROM budgets b
+        LEFT JOIN monthly_rollups r
+            ON r.user_id = b.user_id AND r.month = ? AND r.category_id = b.category_id AND r.type = 'expense'
+        WHERE b.user_id = ? AND b.category_id = ?
+    ''', (month, user_id, category_id)).fetchone()
+    if row is None:
+        return None
+    return dict(_status(*row), category_id=category_id,
+                category=categories.lookup(conn, user_id).names.get(category_id, ''))
+
+
+def record_status(conn, user_id, record_id):
+    """记录所属分类和月份的预算执行情况，用于写入记录后提示是否超出预算
+
+    只读取记录、预算和月度汇总各一行，与账本大小无关。非支出记录或未设置预算时返回None。
+    """
+    row = conn.execute('SELECT category_id, type, date FROM records WHERE id = ? AND user_id = ?',
+                       (record_id, user_id)).fetchone()
+    if row is None or row[1] != 'expense':
+        return None
+    return category_status(conn, user_id, row[0], row[2][:7])
+
+
+def set_budget(conn, user_id, category, amount_cents):
+    """设置支出分类的每月预算，返回分类id；分类不存在、不是支出分类或金额不合法时抛出ValueError"""
+    category_set = categories.lookup(conn, user_id)
+    category_id = category_set.by_name.get(str(category or '').strip())
+    if category_id is None:
+        raise ValueError('分类不存在')
+    if category_set.by_id[category_id]['type'] != 'expense':
+        raise ValueError('只能为支出分类设置预算')
+    if amount_cents <= 0:
+        raise ValueError('预算金额必须大于0')
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute('''
+        INSERT INTO budgets (user_id, category_id, amount_cents, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, category_id) DO UPDATE SET
+            amount_cents = excluded.amount_cents, updated_at = excluded.updated_at
+    ''', (user_id, category_id, amount_cents, now, now))
+    return category_id
+
+
+def delete_budget(conn, user_id, category_id):
+    """删除预算，返回是否存在"""
+    cursor = conn.execute('DELETE FROM budgets WHERE user_id = ? AND category_id = ?',
+                          (user_id, category_id))
+    return cursor.rowcount > 0
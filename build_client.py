@@ -9,6 +9,28 @@ import subprocess
 import shutil
 from pathlib import Path
 
+# 服务器运行所需的Python模块
+SERVER_MODULES = [
+    "simple_desktop_client.py",
+    "aggregation.py",
+    "budgets.py",
+    "categories.py",
+    "columnar.py",
+    "database.py",
+    "dates.py",
+    "http_cache.py",
+    "import_export.py",
+    "jobs.py",
+    "ledger.py",
+    "metrics.py",
+    "migrations.py",
+    "money.py",
+    "report_cache.py",
+    "search.py",
+    "server.py",
+    "slow_query.py",
+]
+
 def check_dependencies():
     """检查必要的依赖"""
     required_packages = ['PyInstaller', 'tkinter', 'requests']
@@ -266,6 +288,19 @@ class FinanceClient:
         except requests.exceptions.RequestException:
             messagebox.showerror("错误", "无法连接到服务器，请检查网络连接")
             
+    def load_categories(self):
+        """从服务器获取分类，按类型分组；获取失败时使用默认分类"""
+        try:
+            response = requests.get(f"{self.api_base_url}/api/categories", timeout=5)
+            if response.status_code == 200:
+                return response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        return {
+            "income": ["工资", "奖金", "投资", "其他收入"],
+            "expense": ["餐饮", "交通", "购物", "娱乐", "医疗", "教育", "住房", "其他支出"]
+        }
+        
     def show_add_record_dialog(self, record_type=None):
         """显示添加记录对话框"""
         dialog = tk.Toplevel(self.root)
@@ -279,8 +314,10 @@ class FinanceClient:
         type_var = tk.StringVar(value=record_type or "expense")
         type_frame = ttk.Frame(dialog)
         type_frame.pack(fill="x", pady=5)
-        ttk.Radiobutton(type_frame, text="收入", variable=type_var, value="income").pack(side="left")
-        ttk.Radiobutton(type_frame, text="支出", variable=type_var, value="expense").pack(side="left")
+        ttk.Radiobutton(type_frame, text="收入", variable=type_var, value="income",
+                        command=lambda: update_categories()).pack(side="left")
+        ttk.Radiobutton(type_frame, text="支出", variable=type_var, value="expense",
+                        command=lambda: update_categories()).pack(side="left")
         
         # 金额
         ttk.Label(dialog, text="金额:").pack(anchor="w", pady=5)
@@ -290,10 +327,16 @@ class FinanceClient:
         # 分类
         ttk.Label(dialog, text="分类:").pack(anchor="w", pady=5)
         category_var = tk.StringVar()
-        categories = ["餐饮", "购物", "交通", "娱乐", "医疗", "教育", "住房", "其他支出", "工资", "奖金", "投资", "兼职", "其他收入"]
-        category_combo = ttk.Combobox(dialog, textvariable=category_var, values=categories)
+        categories = self.load_categories()
+        category_combo = ttk.Combobox(dialog, textvariable=category_var)
         category_combo.pack(fill="x", pady=5)
         
+        def update_categories():
+            """按记录类型切换可选分类"""
+            category_combo["values"] = categories.get(type_var.get(), [])
+        
+        update_categories()
+        
         # 描述
         ttk.Label(dialog, text="描述:").pack(anchor="w", pady=5)
         desc_entry = ttk.Entry(dialog)
@@ -325,7 +368,13 @@ class FinanceClient:
                 if response.status_code == 200:
                     result = response.json()
                     if result.get('success'):
-                        messagebox.showinfo("成功", "记录添加成功！")
+                        if result.get('over_budget'):
+                            budget = result['budget']
+                            messagebox.showwarning(
+                                "超出预算",
+                                f"记录添加成功，{budget['category']}当月预算已超出 ¥{-budget['remaining']:.2f}")
+                        else:
+                            messagebox.showinfo("成功", "记录添加成功！")
                         dialog.destroy()
                     else:
                         messagebox.showerror("错误", result.get('message', '添加失败'))
@@ -439,7 +488,10 @@ def build_client():
             "--windowed",
             "--name=智能记账客户端",
             "--icon=NONE",  # 可以指定图标文件
-            "--add-data", "simple_desktop_client.py;.",
+        ]
+        for module in SERVER_MODULES:
+            cmd += ["--add-data", f"{module};."]
+        cmd += [
             "--add-data", "templates;templates",
             "--add-data", "finance_system.db;.",
             "desktop_client.py"
@@ -463,9 +515,10 @@ def build_client():
                 print("模板文件已复制")
             
             # 复制服务器文件
-            if os.path.exists("simple_desktop_client.py"):
-                shutil.copy2("simple_desktop_client.py", "dist/")
-                print("服务器文件已复制")
+            for module in SERVER_MODULES:
+                if os.path.exists(module):
+                    shutil.copy2(module, "dist/")
+            print("服务器文件已复制")
             
             # 创建使用说明
             create_readme()
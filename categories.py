@@ -0,0 +1,215 @@
+"""
+收支分类
+categories表保存全局默认分类（user_id为NULL）和用户自己添加的分类，记录通过整数category_id引用。
+同一用户可见的分类（全局 + 自己的）名称唯一；写入记录时按名称解析为id，
+名称不存在时自动创建为该用户的分类。归档的分类不出现在选择列表中，已有记录仍正常显示。
+每个用户可见的分类按 users.categories_version 缓存，分类变化时版本号递增。
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# 全局默认分类，列表顺序即显示顺序
+DEFAULT_CATEGORIES = {
+    'income': ['工资', '奖金', '投资', '其他收入'],
+    'expense': ['餐饮', '交通', '购物', '娱乐', '医疗', '教育', '住房', '其他支出']
+}
+
+CATEGORY_TYPES = ('income', 'expense')
+
+# 分类名称的最大长度
+MAX_NAME_LENGTH = 20
+
+# 默认最多缓存的用户数
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class CategorySet:
+    """一个用户可见的全部分类"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        # id -> {id, name, type, sort_order, archived, custom}
+        self.by_id = {}
+        self.by_name = {}
+        for category_id, user_id, name, category_type, sort_order, archived in rows:
+            self.by_id[category_id] = {
+                'id': category_id,
+                'name': name,
+                'type': category_type,
+                'sort_order': sort_order,
+                'archived': bool(archived),
+                'custom': user_id is not None
+            }
+            self.by_name[name] = category_id
+        self.names = {category_id: item['name'] for category_id, item in self.by_id.items()}
+
+    def ordered(self, include_archived=False):
+        """按类型、显示顺序排列的分类"""
+        items = [item for item in self.by_id.values() if include_archived or not item['archived']]
+        return sorted(items, key=lambda item: (item['type'], item['sort_order'], item['id']))
+
+    def listing(self):
+        """未归档分类的名称，按类型分组: {'income': [...], 'expense': [...]}"""
+        result = {category_type: [] for category_type in CATEGORY_TYPES}
+        for item in self.ordered():
+            result.setdefault(item['type'], []).append(item['name'])
+        return result
+
+    def matching(self, text):
+        """名称包含text的分类id（英文不区分大小写）"""
+        text = text.lower()
+        return [category_id for category_id, name in self.names.items() if text in name.lower()]
+
+
+class CategoryCache:
+    """线程安全的按用户LRU缓存"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conn, user_id):
+        """取出用户当前版本的分类，版本变化时重新读取；user_id为None时只有全局分类"""
+        version = 0
+        if user_id is not None:
+            row = conn.execute('SELECT categories_version FROM users WHERE id = ?', (user_id,)).fetchone()
+            version = row[0] if row else 0
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(user_id)
+                return entry
+
+        rows = conn.execute('''
+            SELECT id, user_id, name, type, sort_order, archived FROM categories
+            WHERE user_id IS NULL OR user_id = ?
+        ''', (user_id,)).fetchall()
+        entry = CategorySet(version, rows)
+
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程内共享的缓存实例
+cache = CategoryCache()
+
+
+def lookup(conn, user_id):
+    """用户可见的分类（带缓存）"""
+    return cache.get(conn, user_id)
+
+
+def _bump(conn, user_id):
+    conn.execute('UPDATE users SET categories_version = categories_version + 1 WHERE id = ?', (user_id,))
+
+
+def validate_name(name):
+    """校验并返回去掉首尾空白的分类名称，不合法时抛出ValueError"""
+    name = str(name or '').strip()
+    if not name:
+        raise ValueError('分类不能为空')
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f'分类名称不能超过{MAX_NAME_LENGTH}个字符')
+    return name
+
+
+def _insert(conn, user_id, name, category_type, sort_order):
+    """插入用户分类并返回id，同名分类已被并发创建时返回已有的id"""
+    cursor = conn.execute('''
+        INSERT OR IGNORE INTO categories (user_id, name, type, sort_order, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (user_id, name, category_type, sort_order,
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    if cursor.rowcount:
+        return cursor.lastrowid
+    return conn.execute('SELECT id FROM categories WHERE user_id = ? AND name = ?',
+                        (user_id, name)).fetchone()[0]
+
+
+def _next_sort_order(conn, user_id, category_type):
+    row = conn.execute('''
+        SELECT MAX(sort_order) FROM categories
+        WHERE (user_id IS NULL OR user_id = ?) AND type = ?
+    ''', (user_id, category_type)).fetchone()
+    return (row[0] or 0) + 10
+
+
+def resolve(conn, user_id, pairs):
+    """把 (分类名称, 记录类型) 解析为 {名称: id}
+
+    不存在的名称创建为用户的分类，类型取第一次出现时的记录类型。调用方负责提交事务。
+    """
+    known = lookup(conn, user_id).by_name
+    result = {}
+    created = False
+    for original, record_type in pairs:
+        if original in result:
+            continue
+        category_id = known.get(original)
+        if category_id is None:
+            name = validate_name(original)
+            category_id = known.get(name)
+            if category_id is None:
+                category_type = record_type if record_type in CATEGORY_TYPES else 'expense'
+                category_id = _insert(conn, user_id, name, category_type,
+                                      _next_sort_order(conn, user_id, category_type))
+                known = {**known, name: category_id}
+                created = True
+        result[original] = category_id
+    if created:
+        _bump(conn, user_id)
+    return result
+
+
+def create(conn, user_id, name, category_type, sort_order=None):
+    """添加用户分类，返回新分类id；名称重复或参数不合法时抛出ValueError"""
+    name = validate_name(name)
+    if category_type not in CATEGORY_TYPES:
+        raise ValueError('分类类型必须是 income 或 expense')
+    if name in lookup(conn, user_id).by_name:
+        raise ValueError('分类已存在')
+    if sort_order is None:
+        sort_order = _next_sort_order(conn, user_id, category_type)
+    category_id = _insert(conn, user_id, name, category_type, int(sort_order))
+    _bump(conn, user_id)
+    return category_id
+
+
+def update(conn, user_id, category_id, name=None, sort_order=None, archived=None):
+    """修改用户自己的分类（名称、显示顺序、归档），分类不存在或是全局分类时返回False"""
+    row = conn.execute('SELECT name FROM categories WHERE id = ? AND user_id = ?',
+                       (category_id, user_id)).fetchone()
+    if row is None:
+        return False
+
+    changes = {}
+    if name is not None:
+        name = validate_name(name)
+        if name != row[0]:
+            if name in lookup(conn, user_id).by_name:
+                raise ValueError('分类已存在')
+            changes['name'] = name
+    if sort_order is not None:
+        changes['sort_order'] = int(sort_order)
+    if archived is not None:
+        changes['archived'] = 1 if archived else 0
+
+    if changes:
+        conn.execute(f'''
+            UPDATE categories SET {', '.join(f'{column} = ?' for column in changes)}
+            WHERE id = ?
+        ''', list(changes.values()) + [category_id])
+        _bump(conn, user_id)
+    return True
@@ -0,0 +1,338 @@
+"""
+列式分析引擎（可选，需要 pip install numpy）
+把用户的全部记录按 (day, date, id) 顺序载入NumPy数组，按账本版本缓存，
+写入记录后只重新读取发生变化的月份；
+时间范围和分类分析用二分查找定位日期区间，再用bincount等向量运算求和，
+结果与 aggregation.PeriodAggregate 的接口和数值一致。未安装NumPy时退回逐行聚合。
+"""
+
+import threading
+from collections import OrderedDict
+
+import aggregation
+from aggregation import PeriodAggregate
+import categories as categories_module
+import dates
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 默认缓存列数据的总字节数上限
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+# 类型编码，其它类型按支出计入分类和每日统计（与PeriodAggregate一致）
+_TYPE_CODES = {'income': 0, 'expense': 1}
+_OTHER_TYPE = 2
+
+# bincount按float64累加，所有金额绝对值之和不超过该值时结果是精确的整数
+_FLOAT_EXACT_LIMIT = 2 ** 53
+
+
+class UserColumns:
+    """一个用户在某个账本版本下的列数据，按 (day, date, id) 排序
+
+    创建后不再修改，账本变化时由 refreshed 生成新的对象，正在使用旧对象的线程不受影响。
+    """
+
+    _COLUMNS = ('days', 'types', 'categories', 'amounts', 'ids', 'months')
+
+    def __init__(self, version, rows, category_ids=()):
+        self.version = version
+        # 编码 -> 分类id，刷新时沿用已有的编码
+        self.category_ids = list(category_ids)
+        self._category_codes = {category_id: code for code, category_id in enumerate(self.category_ids)}
+        self._set(self._encode(rows))
+
+    def _encode(self, rows):
+        """把 (day, type, category_id, amount_cents, id) 行转换为各列数组"""
+        category_codes = self._category_codes
+        days, types, categories, amounts, ids = [], [], [], [], []
+        for day, record_type, category_id, amount_cents, record_id in rows:
+            code = category_codes.get(category_id)
+            if code is None:
+                code = category_codes[category_id] = len(self.category_ids)
+                self.category_ids.append(category_id)
+            days.append(day)
+            types.append(_TYPE_CODES.get(record_type, _OTHER_TYPE))
+            categories.append(code)
+            amounts.append(amount_cents)
+            ids.append(record_id)
+
+        days = np.array(days, dtype=np.int32)
+        return {
+            'days': days,
+            'types': np.array(types, dtype=np.int8),
+            'categories': np.array(categories, dtype=np.int32),
+            'amounts': np.array(amounts, dtype=np.int64),
+            'ids': np.array(ids, dtype=np.int64),
+            # 距1970-01的月数
+            'months': days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+        }
+
+    def _set(self, columns):
+        for name in self._COLUMNS:
+            setattr(self, name, columns[name])
+
+    def refreshed(self, version, month_rows):
+        """用重新读取的若干月份的行替换对应月份，返回新的列数据
+
+        month_rows 为 {距1970-01的月数: 该月按 (day, date, id) 排序的行}。
+        未变化的月份直接复用原数组的切片，开销与变化的记录数和一次数组拼接相当。
+        """
+        result = UserColumns.__new__(UserColumns)
+        result.version = version
+        result.category_ids = list(self.category_ids)
+        result._category_codes = dict(self._category_codes)
+
+        pieces = {name: [] for name in self._COLUMNS}
+        position = 0
+        for month in sorted(month_rows):
+            start = int(np.searchsorted(self.months, month, side='left'))
+            end = int(np.searchsorted(self.months, month, side='right'))
+            loaded = result._encode(month_rows[month])
+            for name in self._COLUMNS:
+                pieces[name].append(getattr(self, name)[position:start])
+                pieces[name].append(loaded[name])
+            position = end
+        for name in self._COLUMNS:
+            pieces[name].append(getattr(self, name)[position:])
+        result._set({name: np.concatenate(arrays) for name, arrays in pieces.items()})
+        return result
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self._COLUMNS)
+
+    def period_slice(self, start_day, end_day):
+        """[start_day, end_day) 对应的行区间"""
+        return slice(int(np.searchsorted(self.days, start_day, side='left')),
+                     int(np.searchsorted(self.days, end_day, side='left')))
+
+
+def _month_number(text):
+    """'YYYY-MM' 转换为距1970-01的月数，格式错误时抛出ValueError"""
+    if len(text) != 7 or text[4] != '-':
+        raise ValueError(text)
+    year, month = int(text[:4]), int(text[5:])
+    if not 1 <= month <= 12:
+        raise ValueError(text)
+    return (year - 1970) * 12 + month - 1
+
+
+def _month_day_range(number):
+    """距1970-01的月数对应的 [第一天, 下月第一天) 天数"""
+    start = np.datetime64(number, 'M')
+    return (int(start.astype('datetime64[D]').astype(np.int64)),
+            int((start + 1).astype('datetime64[D]').astype(np.int64)))
+
+
+def _sum_by(codes, amounts, size):
+    """按编码分组对整数分求和，返回int64数组
+
+    amounts为float64时用bincount（调用方保证结果精确），为int64时用add.at逐个累加。
+    """
+    if amounts.dtype == np.float64:
+        return np.rint(np.bincount(codes, weights=amounts, minlength=size)).astype(np.int64)
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, codes, amounts)
+    return totals
+
+
+def _top_positions(amounts, positions, limit):
+    """金额最大的limit个位置，按金额从大到小，金额相同时靠前的记录优先"""
+    if limit <= 0 or not len(positions):
+        return positions[:0]
+    values = amounts[positions]
+    if len(positions) > limit:
+        threshold = np.partition(values, len(values) - limit)[len(values) - limit]
+        keep = values >= threshold
+        positions, values = positions[keep], values[keep]
+    order = np.lexsort((positions, -values))
+    return positions[order[:limit]]
+
+
+class ColumnarEngine:
+    """按用户缓存列数据并计算区间聚合，线程安全"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.enabled = np is not None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def columns(self, conn, user_id):
+        """取出用户当前账本版本的列数据
+
+        首次使用时载入全部记录；之后账本版本变化时，只重新读取 ledger_versions 中
+        版本号比缓存新的月份，其余月份沿用缓存。
+        """
+        # 先读版本再读数据，缓存的数据不会比版本号旧
+        row = conn.execute('SELECT ledger_version FROM users WHERE id = ?', (user_id,)).fetchone()
+        version = row[0] if row else 0
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            if entry is None:
+                self.misses += 1
+            else:
+                self.refreshes += 1
+
+        if entry is None:
+            rows = conn.execute('''
+                SELECT day, type, category_id, amount_cents, id FROM records
+                WHERE user_id = ? AND day IS NOT NULL
+                ORDER BY day, date, id
+            ''', (user_id,)).fetchall()
+            entry = UserColumns(version, rows)
+        else:
+            entry = entry.refreshed(version, self._changed_months(conn, user_id, entry.version))
+
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            if entry.nbytes <= self.max_bytes:
+                self._entries[user_id] = entry
+                self._bytes += entry.nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return entry
+
+    @staticmethod
+    def _changed_months(conn, user_id, since_version):
+        """读取账本版本号大于since_version的月份的记录，返回 {距1970-01的月数: 行}"""
+        month_rows = {}
+        for month, in conn.execute('''
+            SELECT month FROM ledger_versions WHERE user_id = ? AND version > ?
+        ''', (user_id, since_version)).fetchall():
+            try:
+                number = _month_number(month)
+            except ValueError:
+                # 无法识别的日期没有day，不在列数据中
+                continue
+            start_day, end_day = _month_day_range(number)
+            month_rows[number] = conn.execute('''
+                SELECT day, type, category_id, amount_cents, id FROM records
+                WHERE user_id = ? AND day >= ? AND day < ?
+                ORDER BY day, date, id
+            ''', (user_id, start_day, end_day)).fetchall()
+        return month_rows
+
+    def aggregate_period(self, conn, user_id, start_date, end_date, top_n=10):
+        """与 aggregation.aggregate_period 相同的区间聚合，未安装NumPy或已关闭时逐行计算"""
+        if not self.enabled:
+            return aggregation.aggregate_period(conn, user_id, start_date, end_date, top_n)
+
+        start_day, end_day = dates.day_range(start_date, end_date)
+        data = self.columns(conn, user_id)
+        period = data.period_slice(start_day, end_day)
+        days = data.days[period]
+        months = data.months[period]
+        types = data.types[period]
+        categories = data.categories[period]
+        amounts = data.amounts[period]
+
+        result = PeriodAggregate(top_n, categories_module.lookup(conn, user_id).names)
+        result.records_count = len(amounts)
+        if not result.records_count:
+            return result
+
+        is_income = types == 0
+        income_amounts = np.where(is_income, amounts, 0)
+        expense_amounts = amounts - income_amounts
+        result.income_cents = int(income_amounts.sum())
+        result.expense_cents = int(amounts[types == 1].sum())
+
+        if int(np.abs(amounts).sum()) < _FLOAT_EXACT_LIMIT:
+            income_amounts = income_amounts.astype(np.float64)
+            expense_amounts = expense_amounts.astype(np.float64)
+
+        # 分类统计只输出区间内出现过的分类
+        size = len(data.category_ids)
+        category_counts = np.bincount(categories, minlength=size)
+        category_income = _sum_by(categories, income_amounts, size)
+        category_expense = _sum_by(categories, expense_amounts, size)
+        for code in np.flatnonzero(category_counts).tolist():
+            result.categories[data.category_ids[code]] = {
+                'income': int(category_income[code]),
+                'expense': int(category_expense[code]),
+                'count': int(category_counts[code])
+            }
+
+        offsets = days - start_day
+        span = int(offsets[-1]) + 1
+        day_counts = np.bincount(offsets, minlength=span)
+        day_income = _sum_by(offsets, income_amounts, span)
+        day_expense = _sum_by(offsets, expense_amounts, span)
+        for offset in np.flatnonzero(day_counts).tolist():
+            result.daily[start_day + offset] = {
+                'income': int(day_income[offset]),
+                'expense': int(day_expense[offset])
+            }
+
+        # 与每日统计相同，按距区间第一个月的月数分组
+        month_offsets = months - months[0]
+        month_span = int(month_offsets[-1]) + 1
+        month_counts = np.bincount(month_offsets, minlength=month_span)
+        month_income = _sum_by(month_offsets, income_amounts, month_span)
+        month_expense = _sum_by(month_offsets, expense_amounts, month_span)
+        for offset in np.flatnonzero(month_counts).tolist():
+            month = str(np.datetime64(int(months[0]) + offset, 'M'))
+            result.monthly[month] = {
+                'income': int(month_income[offset]),
+                'expense': int(month_expense[offset])
+            }
+
+        if top_n > 0:
+            for record_type, code in _TYPE_CODES.items():
+                positions = _top_positions(amounts, np.flatnonzero(types == code), top_n)
+                ids = data.ids[period][positions].tolist()
+                result.set_top_records(record_type, self._load_records(conn, user_id, ids))
+        return result
+
+    @staticmethod
+    def _load_records(conn, user_id, ids):
+        """按给定id顺序读取大额记录的详细内容，期间被删除的记录跳过"""
+        if not ids:
+            return []
+        rows = conn.execute(f'''
+            SELECT id, amount_cents, category_id, type, description, date FROM records
+            WHERE user_id = ? AND id IN ({','.join('?' * len(ids))})
+        ''', [user_id] + ids).fetchall()
+        found = {
+            record_id: {'amount': amount, 'category': category, 'type': record_type,
+                        'description': description, 'date': record_date}
+            for record_id, amount, category, record_type, description, record_date in rows
+        }
+        return [found[record_id] for record_id in ids if record_id in found]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'users': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes
+            }
+
+
+# 进程内共享的分析引擎
+engine = ColumnarEngine()
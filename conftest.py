@@ -0,0 +1,29 @@
+"""
+pytest公共配置
+test_reports.py 是需要先启动服务的手动验证脚本，不参与自动测试。
+"""
+
+import pytest
+
+collect_ignore = ['test_reports.py']
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """已建表并执行全部迁移的临时数据库，包含默认测试用户（id为1）"""
+    import simple_desktop_client
+
+    path = str(tmp_path / 'finance.db')
+    simple_desktop_client.app.config['DATABASE'] = path
+    simple_desktop_client.init_database()
+    return path
+
+
+@pytest.fixture
+def client(db_path):
+    """已登录默认测试用户（testuser）的Flask测试客户端"""
+    import simple_desktop_client
+
+    client = simple_desktop_client.app.test_client()
+    client.post('/login', data={'username': 'testuser', 'password': 'test123'})
+    return client
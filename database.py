@@ -0,0 +1,311 @@
+"""
+数据库连接管理
+维护有界的SQLite长连接池，集中配置WAL、busy_timeout等性能参数，
+请求内通过Flask应用上下文复用同一个连接
+"""
+
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, current_app, has_app_context
+
+# 默认数据库文件
+DEFAULT_DB_PATH = 'finance_system.db'
+
+# 默认连接池大小
+DEFAULT_POOL_SIZE = 8
+
+# 获取连接的最长等待时间（秒）
+ACQUIRE_TIMEOUT = 10
+
+# 每个连接打开时统一设置的参数
+PRAGMAS = (
+    ('journal_mode', 'WAL'),          # 读写互不阻塞
+    ('synchronous', 'NORMAL'),        # WAL模式下安全且减少fsync
+    ('busy_timeout', 5000),           # 遇到写锁时等待而不是立即报错
+    ('cache_size', -16000),           # 约16MB页缓存
+    ('mmap_size', 268435456),         # 256MB内存映射读取
+    ('temp_store', 'MEMORY'),
+)
+
+
+# SQL执行观察者，每条语句结束时以 (连接, sql, params, 耗时秒数, 返回行数) 调用
+_query_observers = []
+
+# 统计游标被迭代时每次从SQLite取出的行数
+ITER_BATCH_SIZE = 256
+
+
+def add_query_observer(func):
+    """注册SQL执行观察者，只对注册之后打开的连接生效"""
+    _query_observers.append(func)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """统计每条语句耗时和返回行数的游标
+
+    SQLite在取结果时才逐步执行查询，耗时包括execute和之后所有fetch的时间，
+    语句在结果取完、再次execute或游标关闭时视为结束并通知观察者。
+    计时和计数按批进行：迭代游标时按 ITER_BATCH_SIZE 行一批调用fetchmany，
+    行数取每批的长度，逐行取结果不经过Python代码。
+    """
+
+    _sql = None
+
+    def _begin(self, sql, parameters):
+        self._finish()
+        self._sql = sql
+        self._params = parameters
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        sql = self._sql
+        if sql is None:
+            return
+        self._sql = None
+        for observer in _query_observers:
+            observer(self.connection, sql, self._params, self._elapsed, self._rows)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except Exception:
+            self._elapsed += time.perf_counter() - start
+            self._finish()
+            raise
+        self._elapsed += time.perf_counter() - start
+        if self.description is None:
+            # 非查询语句没有结果集，执行完即结束
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, None)
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            self._elapsed += time.perf_counter() - start
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        # 不覆盖__next__：逐行调用Python方法的开销与取一行本身相当
+        batches = iter(lambda: self.fetchmany(ITER_BATCH_SIZE), [])
+        return itertools.chain.from_iterable(batches)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """所有语句都通过InstrumentedCursor执行的连接"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# 可选的日志模式，WAL之外的模式仅用于对比测试
+JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY')
+
+
+def configure_connection(conn, journal_mode=None):
+    """为新连接设置性能参数，journal_mode可覆盖默认的WAL"""
+    for name, value in PRAGMAS:
+        if name == 'journal_mode' and journal_mode:
+            value = journal_mode
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class ConnectionPool:
+    """有界SQLite连接池
+
+    连接在首次需要时创建并长期保留，归还时回滚未提交的事务。
+    连接数达到上限后，获取连接会阻塞等待其他请求归还。
+    """
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE, timeout=ACQUIRE_TIMEOUT, journal_mode=None):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        # 没有观察者时使用原生连接，避免统计开销
+        factory = InstrumentedConnection if _query_observers else sqlite3.Connection
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               factory=factory)
+        return configure_connection(conn, self.journal_mode)
+
+    def acquire(self):
+        """获取一个连接"""
+        if self._closed:
+            raise sqlite3.ProgrammingError('连接池已关闭')
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError('数据库连接池已满，等待连接超时')
+
+    def release(self, conn):
+        """归还连接"""
+        if conn.in_transaction:
+            conn.rollback()
+
+        if self._closed:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+
+        self._idle.put(conn)
+
+    def close(self):
+        """关闭所有空闲连接"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_db_path():
+    """当前使用的数据库文件路径"""
+    if has_app_context():
+        return current_app.config.get('DATABASE', DEFAULT_DB_PATH)
+    return DEFAULT_DB_PATH
+
+
+def get_pool(path=None):
+    """获取（必要时创建）指定数据库文件的连接池"""
+    path = path or get_db_path()
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                size = DEFAULT_POOL_SIZE
+                journal_mode = None
+                if has_app_context():
+                    size = current_app.config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE)
+                    journal_mode = current_app.config.get('DB_JOURNAL_MODE')
+                pool = ConnectionPool(path, size=size, journal_mode=journal_mode)
+                _pools[path] = pool
+    return pool
+
+
+def close_pools():
+    """关闭所有连接池，用于程序退出"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+@contextmanager
+def connection(path=None):
+    """在请求之外使用连接（初始化、后台任务、命令行工具）"""
+    pool = get_pool(path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def get_db():
+    """获取当前请求使用的连接，同一请求内多次调用返回同一个连接"""
+    if 'db_conn' not in g:
+        pool = get_pool()
+        g.db_conn = pool.acquire()
+        g.db_pool = pool
+    return g.db_conn
+
+
+def release_db(exception=None):
+    """请求结束时归还连接"""
+    conn = g.pop('db_conn', None)
+    pool = g.pop('db_pool', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+def init_app(app):
+    """注册请求结束时的连接归还"""
+    app.config.setdefault('DATABASE', DEFAULT_DB_PATH)
+    app.config.setdefault('DB_POOL_SIZE', DEFAULT_POOL_SIZE)
+    app.config.setdefault('DB_JOURNAL_MODE', 'WAL')
+    app.teardown_appcontext(release_db)
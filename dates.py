@@ -0,0 +1,89 @@
+"""
+记录日期
+records.date 统一保存为 "YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM:SS"（本地时间），
+另存整数列 day（距1970-01-01的天数）。日期范围筛选、排序和按天分组都使用 day 列，
+区间为左闭右开的整数比较，带时间的记录也不会因为字符串比较被漏掉。
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+_EPOCH = date(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+DATE_FORMAT_MESSAGE = '日期格式应为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS'
+
+# 旧数据和银行流水中常见的 YYYY/M/D [H:MM[:SS]] 写法
+_SLASH_DATE = re.compile(r'(\d{4})/(\d{1,2})/(\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?')
+
+
+def normalize(value):
+    """把日期/日期时间转换为统一格式的字符串，格式错误时抛出ValueError
+
+    支持 date、datetime、ISO格式字符串（日期和时间之间可用空格或T）以及 YYYY/M/D 写法，
+    时间部分保留到秒，不接受带时区的时间。
+    """
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, date):
+        return value.isoformat()
+    else:
+        text = str(value or '').strip()
+        try:
+            match = _SLASH_DATE.fullmatch(text)
+            if match:
+                parts = [int(part) for part in match.groups(0)]
+                if match.group(4) is None:
+                    return date(*parts[:3]).isoformat()
+                moment = datetime(*parts)
+            elif len(text) == 10:
+                return date.fromisoformat(text).isoformat()
+            else:
+                moment = datetime.fromisoformat(text)
+        except ValueError:
+            raise ValueError(DATE_FORMAT_MESSAGE)
+
+    if moment.tzinfo is not None:
+        raise ValueError(DATE_FORMAT_MESSAGE)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def to_day(text):
+    """统一格式的日期字符串对应的天数"""
+    return date.fromisoformat(text[:10]).toordinal() - _EPOCH_ORDINAL
+
+
+def from_day(day):
+    """天数转换为 YYYY-MM-DD"""
+    return (_EPOCH + timedelta(days=day)).isoformat()
+
+
+def parse_day(text):
+    """校验 YYYY-MM-DD 形式的查询参数并返回天数，格式错误时抛出ValueError"""
+    return datetime.strptime(text, '%Y-%m-%d').toordinal() - _EPOCH_ORDINAL
+
+
+def day_range(start_date=None, end_date=None):
+    """把可选的开始/结束日期（均含当天）转换为 [开始天数, 结束天数+1)，未指定的一端为None"""
+    start_day = parse_day(start_date) if start_date else None
+    end_day = parse_day(end_date) + 1 if end_date else None
+    return start_day, end_day
+
+
+def range_conditions(start_date=None, end_date=None, column='day'):
+    """日期范围对应的SQL条件和参数列表"""
+    start_day, end_day = day_range(start_date, end_date)
+    conditions = []
+    params = []
+    if start_day is not None:
+        conditions.append(f'{column} >= ?')
+        params.append(start_day)
+    if end_day is not None:
+        conditions.append(f'{column} < ?')
+        params.append(end_day)
+    return conditions, params
+
+
+def sql_day(column):
+    """在SQL中由统一格式的日期列计算天数的表达式，与to_day结果一致"""
+    return f'CAST(julianday(substr({column}, 1, 10)) - 2440587.5 AS INTEGER)'
@@ -0,0 +1,114 @@
+"""
+HTTP缓存与压缩
+读接口的ETag由用户的账本版本（users.ledger_version）和请求地址生成，
+客户端带 If-None-Match 且账本未变化时直接返回304，不执行查询和序列化。
+较大的响应按客户端支持的编码进行brotli或gzip压缩。
+"""
+
+import gzip
+import hashlib
+from datetime import date
+from functools import wraps
+
+from flask import current_app, request, session
+
+from database import get_db
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 超过该字节数的响应才压缩
+COMPRESS_MIN_SIZE = 1024
+
+# 压缩级别，兼顾速度和压缩率
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/css', 'text/plain',
+                      'application/javascript', 'text/javascript')
+
+
+def ledger_version(user_id):
+    """用户当前的账本版本"""
+    row = get_db().execute('SELECT ledger_version FROM users WHERE id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def ledger_etag(user_id):
+    """由账本版本、请求地址和当天日期生成ETag（日期用于“最近几个月”这类随时间变化的结果）"""
+    key = f"{user_id}:{ledger_version(user_id)}:{date.today().isoformat()}:{request.full_path}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def conditional_get(view):
+    """为只依赖账本数据的读接口添加ETag和304处理"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            return view(*args, **kwargs)
+
+        etag = ledger_etag(session['user_id'])
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+            # 不为错误响应加ETag，避免客户端缓存临时错误
+            if response.status_code != 200 or is_error_response(response):
+                return response
+
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+
+def is_error_response(response):
+    """是否为业务错误响应（HTTP 200 但 success 为 false）"""
+    # 错误响应都很短，只检查小响应
+    if not response.is_json or response.content_length is None or response.content_length > 512:
+        return False
+    data = response.get_json(silent=True)
+    return isinstance(data, dict) and data.get('success') is False
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request钩子：压缩较大的文本响应"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """注册响应压缩"""
+    app.after_request(compress_response)
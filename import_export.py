@@ -0,0 +1,279 @@
+"""
+记录批量导入与导出
+导入: 流式解析CSV或NDJSON（每行一个JSON对象），逐行校验，按批用executemany写入，
+每批一个事务。校验失败的行不会写入，并在结果中给出行号和原因。
+导出: 直接从数据库游标分块读取并生成文本，内存占用与账本大小无关。
+
+命令行用法:
+    python import_export.py import FILE --user-id ID [--format csv|ndjson] [--db finance_system.db]
+    python import_export.py export FILE --user-id ID [--format csv|ndjson] [--start-date D] [--end-date D] [--type T]
+"""
+
+import argparse
+import csv
+import io
+import json
+
+import categories
+import dates
+import ledger
+from money import format_cents, from_cents, to_cents
+
+# 每个事务写入的记录数
+BATCH_SIZE = 2000
+
+# 导出时每次从游标读取的行数
+EXPORT_CHUNK_SIZE = 1000
+
+# 导出的列，与导入的表头一致，导出文件可以直接重新导入
+EXPORT_COLUMNS = ('date', 'type', 'category', 'amount', 'description')
+
+# 导出时查询的字段，与EXPORT_COLUMNS一一对应
+_EXPORT_FIELDS = ('date', 'type', 'category_id', 'amount_cents', 'description')
+
+# 结果中最多返回的错误条数
+MAX_ERRORS = 1000
+
+SUPPORTED_FORMATS = ('csv', 'ndjson')
+
+# 字段别名，兼容常见的中文表头
+FIELD_ALIASES = {
+    'date': 'date', '日期': 'date', '交易日期': 'date',
+    'type': 'type', '类型': 'type', '收支': 'type',
+    'category': 'category', '分类': 'category',
+    'amount': 'amount', '金额': 'amount',
+    'description': 'description', '描述': 'description', '备注': 'description',
+}
+
+TYPE_ALIASES = {
+    'income': 'income', '收入': 'income',
+    'expense': 'expense', '支出': 'expense',
+}
+
+
+class ImportResult:
+    """导入结果统计"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def to_dict(self):
+        return {
+            'success': True,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def detect_format(filename=None, content_type=None):
+    """根据文件名或Content-Type判断格式，默认CSV"""
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    if content_type and ('ndjson' in content_type or 'json' in content_type):
+        return 'ndjson'
+    return 'csv'
+
+
+def validate_row(item):
+    """校验并规范化一行数据，返回 (amount_cents, category, type, description, date)，不合法时抛出ValueError"""
+    fields = {}
+    for key, value in item.items():
+        name = FIELD_ALIASES.get(str(key).strip().lower()) if key is not None else None
+        if name:
+            fields[name] = value.strip() if isinstance(value, str) else value
+
+    amount = to_cents(fields.get('amount'))
+
+    # 没有类型列时按金额正负判断（银行流水中支出通常为负数），此时金额取绝对值；
+    # 指定了类型时金额原样保存，与单条添加接口一致
+    type_text = str(fields.get('type') or '').lower()
+    if type_text:
+        record_type = TYPE_ALIASES.get(type_text)
+        if record_type is None:
+            raise ValueError('类型必须是 income 或 expense')
+    else:
+        record_type = 'expense' if amount < 0 else 'income'
+        amount = abs(amount)
+
+    # 分类名称在这里校验，不合法的行单独报错，不影响同批其它记录写入
+    category = categories.validate_name(fields.get('category'))
+
+    record_date = dates.normalize(fields.get('date'))
+
+    description = fields.get('description') or ''
+    return amount, category, record_type, str(description), record_date
+
+
+def iter_csv(stream):
+    """逐行读取CSV，产生 (行号, 字典)"""
+    reader = csv.DictReader(stream)
+    for item in reader:
+        yield reader.line_num, item
+
+
+def iter_ndjson(stream):
+    """逐行读取NDJSON，产生 (行号, 字典)，无法解析的行产生 (行号, 异常)"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield line_number, ValueError('JSON格式错误')
+            continue
+        if not isinstance(item, dict):
+            yield line_number, ValueError('每行必须是一个JSON对象')
+            continue
+        yield line_number, item
+
+
+def text_stream(binary_stream):
+    """把上传的字节流包装为按UTF-8解码的文本流（兼容带BOM的文件）"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+
+def import_records(conn, user_id, stream, fmt='csv', batch_size=BATCH_SIZE):
+    """从文本流导入记录，返回ImportResult"""
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f'不支持的格式: {fmt}')
+
+    rows = iter_csv(stream) if fmt == 'csv' else iter_ndjson(stream)
+    result = ImportResult()
+    batch = []
+
+    def flush():
+        # 批次先读分类等再写入，WAL下延迟事务在读后升级为写时若已有其他提交会直接失败，
+        # 因此开始时就取得写锁
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ledger.add_records(conn, user_id, batch)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        result.imported += len(batch)
+        batch.clear()
+
+    try:
+        for line_number, item in rows:
+            if isinstance(item, Exception):
+                result.add_error(line_number, str(item))
+                continue
+            try:
+                batch.append(validate_row(item))
+            except ValueError as e:
+                result.add_error(line_number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                flush()
+    except (csv.Error, UnicodeDecodeError) as e:
+        result.add_error(None, f'文件读取失败: {e}')
+
+    if batch:
+        flush()
+
+    return result
+
+
+def iter_export(conn, user_id, fmt='csv', conditions=(), params=()):
+    """按日期顺序分块导出记录，产生文本片段
+
+    conditions/params 为额外的SQL筛选条件及参数（如日期范围、类型）。
+    """
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f'不支持的格式: {fmt}')
+
+    where = ' AND '.join(['user_id = ?'] + list(conditions))
+    cursor = conn.execute(f'''
+        SELECT {', '.join(_EXPORT_FIELDS)}
+        FROM records WHERE {where}
+        ORDER BY day, date, id
+    ''', [user_id] + list(params))
+    # 查询已开始读取，此时的分类包含导出记录引用的全部分类
+    names = categories.lookup(conn, user_id).names
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == 'csv':
+        # 带BOM便于Excel识别UTF-8
+        buffer.write('\ufeff')
+        writer.writerow(EXPORT_COLUMNS)
+
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        if fmt == 'csv':
+            writer.writerows((day, record_type, names.get(category_id, ''), format_cents(amount), description)
+                             for day, record_type, category_id, amount, description in rows)
+        else:
+            for day, record_type, category_id, amount, description in rows:
+                item = dict(zip(EXPORT_COLUMNS, (day, record_type, names.get(category_id, ''),
+                                                 from_cents(amount), description)))
+                buffer.write(json.dumps(item, ensure_ascii=False))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def main():
+    """命令行入口"""
+    import database
+    import migrations
+
+    parser = argparse.ArgumentParser(description='记录导入导出工具')
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('file', help='CSV或NDJSON文件')
+    parser.add_argument('--user-id', type=int, required=True, help='导入到/导出自的用户')
+    parser.add_argument('--format', choices=SUPPORTED_FORMATS, help='文件格式，默认按扩展名判断')
+    parser.add_argument('--start-date', help='导出的开始日期（含）YYYY-MM-DD')
+    parser.add_argument('--end-date', help='导出的结束日期（含）YYYY-MM-DD')
+    parser.add_argument('--type', choices=('income', 'expense'), help='只导出指定类型')
+    parser.add_argument('--db', default=database.DEFAULT_DB_PATH, help='数据库文件')
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.file)
+
+    with database.connection(args.db) as conn:
+        migrations.migrate(conn)
+
+        if args.command == 'import':
+            with open(args.file, 'r', encoding='utf-8-sig', newline='') as f:
+                result = import_records(conn, args.user_id, f, fmt)
+        else:
+            conditions, params = dates.range_conditions(args.start_date, args.end_date)
+            if args.type:
+                conditions.append('type = ?')
+                params.append(args.type)
+            with open(args.file, 'w', encoding='utf-8', newline='') as f:
+                for chunk in iter_export(conn, args.user_id, fmt, conditions, params):
+                    f.write(chunk)
+
+    database.close_pools()
+
+    if args.command == 'import':
+        print(f"✅ 导入完成: 成功 {result.imported} 条，失败 {result.failed} 条")
+        for error in result.errors[:20]:
+            print(f"   第{error['line']}行: {error['message']}")
+    else:
+        print(f"✅ 导出完成: {args.file}")
+
+
+if __name__ == '__main__':
+    main()
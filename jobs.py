@@ -0,0 +1,184 @@
+"""
+后台任务
+固定数量的工作线程从有界队列中取任务执行，报告等耗时计算不占用请求线程。
+任务通过id查询状态和结果，排队中的任务可以直接取消，运行中的任务取消后结果被丢弃。
+"""
+
+import queue
+import secrets
+import threading
+import time
+
+# 默认工作线程数
+DEFAULT_WORKERS = 2
+
+# 默认队列长度上限，超过时拒绝新任务
+DEFAULT_QUEUE_SIZE = 32
+
+# 已结束任务的保留时间（秒）
+FINISHED_TTL = 3600
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+
+class Job:
+    """一个后台任务"""
+
+    def __init__(self, user_id, job_type, func):
+        self.id = secrets.token_hex(8)
+        self.user_id = user_id
+        self.job_type = job_type
+        self.func = func
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'type': self.job_type,
+            'status': self.status,
+            'created_at': _format_time(self.created_at),
+            'finished_at': _format_time(self.finished_at)
+        }
+        if self.status == DONE:
+            data['result'] = self.result
+        elif self.status == FAILED:
+            data['message'] = self.error
+        return data
+
+
+def _format_time(timestamp):
+    if timestamp is None:
+        return None
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+class JobManager:
+    """有界队列 + 固定工作线程的任务执行器"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'job-worker-{index}')
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, user_id, job_type, func):
+        """提交任务，队列已满时抛出QueueFullError"""
+        self._ensure_started()
+        self._prune()
+
+        job = Job(user_id, job_type, func)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFullError('任务队列已满，请稍后再试')
+        return job
+
+    def get(self, job_id, user_id):
+        """查询任务，只能查询自己的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def cancel(self, job_id, user_id):
+        """取消任务，返回取消后的任务，不存在时返回None"""
+        job = self.get(job_id, user_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+            elif job.status == RUNNING:
+                job.cancel_requested = True
+        return job
+
+    def wait_idle(self, timeout=None):
+        """等待队列中的任务全部结束，超时返回False"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.status != QUEUED:
+                        continue
+                    job.status = RUNNING
+
+                try:
+                    result = job.func()
+                    error = None
+                except Exception as e:
+                    result = None
+                    error = str(e)
+                    print(f"后台任务失败 {job.job_type} {job.id}: {e}")
+
+                with self._lock:
+                    if job.cancel_requested:
+                        job.status = CANCELLED
+                    elif error is not None:
+                        job.status = FAILED
+                        job.error = error
+                    else:
+                        job.status = DONE
+                        job.result = result
+                    job.finished_at = time.time()
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        """清理过期的已结束任务"""
+        expire_before = time.time() - FINISHED_TTL
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished and job.finished_at < expire_before
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+# 进程内共享的任务执行器
+manager = JobManager()
@@ -0,0 +1,200 @@
+"""
+账本写入操作
+所有对records表的增删都经过这里，在同一事务中维护月度汇总表monthly_rollups、
+短词搜索索引records_ngram（见search）和账本数据版本（users.ledger_version、ledger_versions）。
+调用方负责提交事务。
+金额参数均为整数分（见money.to_cents）；日期在这里统一格式并计算day列（见dates）；
+分类按名称传入，在这里解析为category_id（见categories）。
+
+命令行用法:
+    python ledger.py rebuild-rollups [--user-id ID] [--db finance_system.db]
+"""
+
+import argparse
+
+import categories
+import dates
+import report_cache
+import search
+
+
+def _apply_rollups(conn, user_id, deltas):
+    """把 {(月份, 分类id, 类型): [金额（分）, 条数]} 的增减累加到月度汇总"""
+    conn.executemany('''
+        INSERT INTO monthly_rollups (user_id, month, category_id, type, total_cents, count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, month, category_id, type) DO UPDATE SET
+            total_cents = total_cents + excluded.total_cents,
+            count = count + excluded.count
+    ''', [(user_id, month, category, record_type, amount, count)
+          for (month, category, record_type), (amount, count) in deltas.items()])
+
+    emptied = [(user_id, month, category, record_type)
+               for (month, category, record_type), (_, count) in deltas.items() if count < 0]
+    if emptied:
+        conn.executemany('''
+            DELETE FROM monthly_rollups
+            WHERE user_id = ? AND month = ? AND category_id = ? AND type = ? AND count <= 0
+        ''', emptied)
+
+
+def _touch(conn, user_id, months):
+    """递增用户的账本版本，并记为这些月份的数据版本"""
+    conn.execute('UPDATE users SET ledger_version = ledger_version + 1 WHERE id = ?', (user_id,))
+    row = conn.execute('SELECT ledger_version FROM users WHERE id = ?', (user_id,)).fetchone()
+    version = row[0] if row else 0
+
+    conn.executemany('''
+        INSERT INTO ledger_versions (user_id, month, version) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, month) DO UPDATE SET version = excluded.version
+    ''', [(user_id, month, version) for month in months])
+
+    for month in months:
+        report_cache.cache.invalidate_month(user_id, month)
+
+
+def add_record(conn, user_id, amount_cents, category, record_type, description, record_date):
+    """插入一条记录，返回新记录id，日期或分类不合法时抛出ValueError"""
+    record_date = dates.normalize(record_date)
+    category_id = categories.resolve(conn, user_id, [(category, record_type)])[category]
+    cursor = conn.execute('''
+        INSERT INTO records (user_id, amount_cents, category_id, type, description, date, day)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, amount_cents, category_id, record_type, description, record_date,
+          dates.to_day(record_date)))
+    search.index_ngrams(conn, [(cursor.lastrowid, description)])
+
+    month = record_date[:7]
+    _apply_rollups(conn, user_id, {(month, category_id, record_type): [amount_cents, 1]})
+    _touch(conn, user_id, [month])
+    return cursor.lastrowid
+
+
+def add_records(conn, user_id, rows, return_ids=False):
+    """批量插入 (amount_cents, category, type, description, date) 记录
+
+    返回插入条数；return_ids为True时逐行插入并返回新记录id列表。
+    任何一行日期或分类不合法时抛出ValueError，不插入任何记录。
+    """
+    if not rows:
+        return [] if return_ids else 0
+
+    category_ids = categories.resolve(conn, user_id, [(row[1], row[2]) for row in rows])
+    rows = [(amount_cents, category_ids[category], record_type, description, dates.normalize(record_date))
+            for amount_cents, category, record_type, description, record_date in rows]
+
+    insert_sql = '''
+        INSERT INTO records (user_id, amount_cents, category_id, type, description, date, day)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+    params = [(user_id,) + row + (dates.to_day(row[4]),) for row in rows]
+    if return_ids:
+        ids = [conn.execute(insert_sql, item).lastrowid for item in params]
+        search.index_ngrams(conn, [(record_id, row[3]) for record_id, row in zip(ids, rows)])
+    else:
+        # id自增，写事务中新插入的记录id都大于插入前的最大id
+        last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM records').fetchone()[0]
+        conn.executemany(insert_sql, params)
+        search.index_ngrams(conn, conn.execute(
+            'SELECT id, description FROM records WHERE id > ?', (last_id,)).fetchall())
+
+    deltas = {}
+    for amount_cents, category_id, record_type, _, record_date in rows:
+        delta = deltas.setdefault((record_date[:7], category_id, record_type), [0, 0])
+        delta[0] += amount_cents
+        delta[1] += 1
+
+    _apply_rollups(conn, user_id, deltas)
+    _touch(conn, user_id, sorted({key[0] for key in deltas}))
+    return ids if return_ids else len(rows)
+
+
+def delete_record(conn, user_id, record_id):
+    """删除一条记录，记录不存在或不属于该用户时返回False"""
+    return record_id in delete_records(conn, user_id, [record_id])
+
+
+# 单条SQL中IN列表的最大参数个数（兼容较旧SQLite的999个变量限制）
+_IN_CHUNK_SIZE = 500
+
+
+def delete_records(conn, user_id, record_ids):
+    """批量删除用户的记录，返回实际删除的id集合
+
+    月度汇总和索引只按 DELETE ... RETURNING 返回的行调整：并发删除同一条记录时，
+    后执行的一方在写锁释放后才删除，得不到该行，不会重复扣减。
+    """
+    record_ids = list(dict.fromkeys(record_ids))
+    found = []
+    for start in range(0, len(record_ids), _IN_CHUNK_SIZE):
+        chunk = record_ids[start:start + _IN_CHUNK_SIZE]
+        found += conn.execute(f'''
+            DELETE FROM records WHERE user_id = ? AND id IN ({','.join('?' * len(chunk))})
+            RETURNING id, amount_cents, category_id, type, date, description
+        ''', [user_id] + chunk).fetchall()
+
+    if not found:
+        return set()
+
+    search.unindex_ngrams(conn, [(row[0], row[5]) for row in found])
+
+    deltas = {}
+    for _, amount_cents, category_id, record_type, record_date, _ in found:
+        delta = deltas.setdefault((record_date[:7], category_id, record_type), [0, 0])
+        delta[0] -= amount_cents
+        delta[1] -= 1
+
+    _apply_rollups(conn, user_id, deltas)
+    _touch(conn, user_id, sorted({key[0] for key in deltas}))
+    return {row[0] for row in found}
+
+
+def touch_all(conn, user_id):
+    """用户全部月份的数据都视为已变化（如分类改名后），报告和分析缓存随之失效"""
+    months = [row[0] for row in conn.execute('''
+        SELECT month FROM monthly_rollups WHERE user_id = ?
+        UNION SELECT month FROM ledger_versions WHERE user_id = ?
+    ''', (user_id, user_id))]
+    _touch(conn, user_id, months)
+
+
+def rebuild_rollups(conn, user_id=None):
+    """从records表重新计算月度汇总，用于修复"""
+    if user_id is None:
+        conn.execute('DELETE FROM monthly_rollups')
+        where, params = '', ()
+    else:
+        conn.execute('DELETE FROM monthly_rollups WHERE user_id = ?', (user_id,))
+        where, params = 'WHERE user_id = ?', (user_id,)
+
+    conn.execute(f'''
+        INSERT INTO monthly_rollups (user_id, month, category_id, type, total_cents, count)
+        SELECT user_id, substr(date, 1, 7), category_id, type, SUM(amount_cents), COUNT(*)
+        FROM records {where}
+        GROUP BY user_id, substr(date, 1, 7), category_id, type
+    ''', params)
+
+
+def main():
+    """命令行入口"""
+    import database
+    import migrations
+
+    parser = argparse.ArgumentParser(description='账本维护工具')
+    parser.add_argument('command', choices=['rebuild-rollups'])
+    parser.add_argument('--user-id', type=int, help='只处理指定用户')
+    parser.add_argument('--db', default=database.DEFAULT_DB_PATH, help='数据库文件')
+    args = parser.parse_args()
+
+    with database.connection(args.db) as conn:
+        migrations.migrate(conn)
+        if args.command == 'rebuild-rollups':
+            rebuild_rollups(conn, args.user_id)
+            conn.commit()
+            print("✅ 月度汇总已重建")
+
+    database.close_pools()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+"""
+并发负载测试
+在本机启动一个服务进程（或连接已有服务），用多个线程模拟同时在线的用户，
+按配置的比例混合执行以下操作，统计吞吐量、尾延迟以及“database is locked”等失败次数：
+    dashboard  刷新仪表板（汇总、月度数据、最近记录、分类图表、每日图表）
+    add        连续添加几条记录
+    report     生成年度报告
+    analysis   时间范围分析和分类分析
+可以用不同的运行模式、线程数、连接池大小和日志模式对比测试结果。
+
+用法:
+    python loadtest.py [--server waitress] [--threads 8] [--clients 16] [--duration 30]
+                       [--mix dashboard=50,add=30,report=10,analysis=10] [--output result.json]
+    python loadtest.py --url http://127.0.0.1:5000 ...   # 测试已启动的服务（需已有benchmark生成的用户）
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+import benchmark
+import database
+import server
+
+DEFAULT_MIX = 'dashboard=50,add=30,report=10,analysis=10'
+
+# 每次add操作连续添加的记录数
+ADD_BURST = 5
+
+# 等待服务就绪的最长时间（秒）
+STARTUP_TIMEOUT = 30
+
+# 结果中保留的错误示例条数
+MAX_ERROR_SAMPLES = 20
+
+LOCKED_MESSAGE = b'database is locked'
+
+
+class RequestFailed(Exception):
+    """请求失败（HTTP错误、业务错误或连接错误）"""
+
+    def __init__(self, message, locked=False):
+        super().__init__(message)
+        self.locked = locked
+
+
+class Client:
+    """保持会话和长连接的HTTP客户端，每个线程一个"""
+
+    def __init__(self, host, port, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookie = None
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method, path, body=None, content_type=None):
+        """发送请求，返回 (状态码, 响应体)"""
+        headers = {}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        if content_type:
+            headers['Content-Type'] = content_type
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise RequestFailed(f'连接错误: {e.__class__.__name__}: {e}')
+
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+        return response.status, data
+
+    def call(self, method, path, payload=None):
+        """发送JSON请求并检查结果，失败时抛出RequestFailed"""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        status, data = self.request(method, path, body, 'application/json' if body else None)
+        locked = LOCKED_MESSAGE in data
+        if status >= 400:
+            raise RequestFailed(f'HTTP {status} {method} {path}: {data[:200].decode("utf-8", "replace")}', locked)
+        if data.startswith(b'{') and b'"success":false' in data.replace(b' ', b''):
+            raise RequestFailed(f'{method} {path}: {data[:200].decode("utf-8", "replace")}', locked)
+        return data
+
+    def login(self, username, password):
+        body = urlencode({'username': username, 'password': password}).encode('utf-8')
+        status, _ = self.request('POST', '/login', body, 'application/x-www-form-urlencoded')
+        if status != 302 or not self.cookie:
+            raise RequestFailed(f'登录失败: {username}')
+
+
+class Stats:
+    """线程安全的延迟和失败统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}     # 操作 -> [秒]
+        self.requests = []      # 单个请求的延迟
+        self.failures = {}      # 操作 -> 失败次数
+        self.locked = 0
+        self.error_samples = []
+
+    def record(self, action, seconds, request_latencies, error=None):
+        with self._lock:
+            self.latencies.setdefault(action, []).append(seconds)
+            self.requests.extend(request_latencies)
+            if error is not None:
+                self.failures[action] = self.failures.get(action, 0) + 1
+                if error.locked:
+                    self.locked += 1
+                if len(self.error_samples) < MAX_ERROR_SAMPLES:
+                    self.error_samples.append(str(error))
+
+
+def _summary(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': _ms(benchmark.percentile(values, 0.50)),
+        'p95_ms': _ms(benchmark.percentile(values, 0.95)),
+        'p99_ms': _ms(benchmark.percentile(values, 0.99)),
+        'max_ms': _ms(values[-1] if values else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class Workload:
+    """各类操作的请求序列"""
+
+    def __init__(self, client, rng):
+        self.client = client
+        self.rng = rng
+        self.timings = []
+
+    def _call(self, method, path, payload=None):
+        start = time.perf_counter()
+        try:
+            return self.client.call(method, path, payload)
+        finally:
+            self.timings.append(time.perf_counter() - start)
+
+    def dashboard(self):
+        for path in ('/api/summary', '/api/monthly-data', '/api/records?limit=10',
+                     '/api/charts/category', '/api/charts/daily'):
+            self._call('GET', path)
+
+    def add(self):
+        for _ in range(ADD_BURST):
+            category = self.rng.choice(list(benchmark.EXPENSE_PROFILES))
+            day = date.today() - timedelta(days=self.rng.randint(0, 60))
+            self._call('POST', '/api/records', {
+                'amount': round(self.rng.uniform(1, 300), 2),
+                'category': category,
+                'type': 'expense',
+                'description': 'loadtest',
+                'date': day.isoformat()
+            })
+
+    def report(self):
+        year = date.today().year - self.rng.randint(0, 1)
+        self._call('POST', '/api/web/reports/yearly', {'year': year})
+
+    def analysis(self):
+        end = date.today() - timedelta(days=self.rng.randint(0, 180))
+        start = end - timedelta(days=self.rng.choice((30, 90, 365)))
+        query = urlencode({'start_date': start.isoformat(), 'end_date': end.isoformat()})
+        self._call('GET', f'/api/web/analysis/time-range?{query}')
+        self._call('GET', f'/api/web/analysis/category?{query}')
+
+
+ACTIONS = ('dashboard', 'add', 'report', 'analysis')
+
+
+def parse_mix(text):
+    """解析 "dashboard=50,add=30" 形式的操作比例"""
+    mix = {}
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ACTIONS:
+            raise ValueError(f'未知的操作: {name}（可选 {", ".join(ACTIONS)}）')
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f'比例必须是数字: {part}')
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('至少需要一个比例大于0的操作')
+    return mix
+
+
+def _worker(index, host, port, users, mix, deadline, think_time, stats, seed):
+    rng = random.Random(seed + index)
+    client = Client(host, port)
+    _, username = users[index % len(users)]
+    try:
+        client.login(username, benchmark.BENCH_PASSWORD)
+    except RequestFailed as e:
+        stats.record('login', 0.0, [], e)
+        return
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    workload = Workload(client, rng)
+    try:
+        while time.time() < deadline:
+            action = rng.choices(names, weights)[0]
+            workload.timings = []
+            error = None
+            start = time.perf_counter()
+            try:
+                getattr(workload, action)()
+            except RequestFailed as e:
+                error = e
+            stats.record(action, time.perf_counter() - start, workload.timings, error)
+            if think_time:
+                time.sleep(rng.uniform(0, think_time * 2))
+    finally:
+        client.close()
+
+
+def run_load(host, port, users, mix, clients=16, duration=30, think_time=0.0, seed=42):
+    """运行负载测试，返回统计结果"""
+    stats = Stats()
+    deadline = time.time() + duration
+    threads = [
+        threading.Thread(target=_worker, name=f'load-client-{index}',
+                         args=(index, host, port, users, mix, deadline, think_time, stats, seed))
+        for index in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total_actions = sum(len(values) for values in stats.latencies.values())
+    total_failures = sum(stats.failures.values())
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'actions_per_second': round(total_actions / elapsed, 1) if elapsed else None,
+        'requests_per_second': round(len(stats.requests) / elapsed, 1) if elapsed else None,
+        'failures': total_failures,
+        'database_locked': stats.locked,
+        'requests': _summary(stats.requests),
+        'actions': {
+            action: dict(_summary(values), failures=stats.failures.get(action, 0))
+            for action, values in sorted(stats.latencies.items())
+        },
+        'error_samples': stats.error_samples,
+    }
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(host, port, process, timeout=STARTUP_TIMEOUT):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            status, _ = Client(host, port, timeout=2).request('GET', '/ready')
+            if status == 200:
+                return True
+        except RequestFailed:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+@contextlib.contextmanager
+def local_server(args, db_path, workdir):
+    """在子进程中启动服务，结束时发送SIGTERM优雅退出"""
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    host, port = args.host, args.port or _free_port()
+    command = [
+        sys.executable, os.path.join(base_path, 'simple_desktop_client.py'),
+        '--server', args.server, '--host', host, '--port', str(port),
+        '--threads', str(args.threads), '--processes', str(args.processes),
+        '--db', db_path, '--journal-mode', args.journal_mode,
+        '--slow-query-log', os.path.join(workdir, 'slow_queries.log'), '--no-browser',
+    ]
+    if args.pool_size:
+        command += ['--db-pool-size', str(args.pool_size)]
+
+    log_path = os.path.join(workdir, 'server.log')
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=base_path)
+        try:
+            if not _wait_ready(host, port, process):
+                raise RuntimeError(f'服务启动失败，日志: {log_path}')
+            yield host, port
+        finally:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(timeout=server.SHUTDOWN_TIMEOUT + 5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+
+def prepare_database(db_path, users, records, months, seed):
+    """初始化数据库并生成测试用户和记录"""
+    import simple_desktop_client
+
+    simple_desktop_client.app.config['DATABASE'] = db_path
+    simple_desktop_client.init_database()
+    with database.connection(db_path) as conn:
+        created = benchmark.generate_dataset(conn, users, records, months, seed=seed)
+    database.close_pools()
+    return created
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='并发负载测试')
+    server.add_arguments(parser)
+    parser.set_defaults(server='waitress', port=0)
+    parser.add_argument('--pool-size', type=int, help='服务端数据库连接池大小，默认与线程数相同')
+    parser.add_argument('--journal-mode', choices=database.JOURNAL_MODES, default='WAL',
+                        help='服务端SQLite日志模式')
+    parser.add_argument('--url', help='测试已启动的服务而不是自动启动')
+    parser.add_argument('--clients', type=int, default=16, help='并发客户端（线程）数')
+    parser.add_argument('--duration', type=float, default=30, help='测试时长（秒）')
+    parser.add_argument('--think-time', type=float, default=0.0, help='每次操作后的平均等待时间（秒）')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'操作比例，默认 {DEFAULT_MIX}')
+    parser.add_argument('--users', type=int, default=10, help='生成的用户数')
+    parser.add_argument('--records', type=int, default=2000, help='每个用户的记录数')
+    parser.add_argument('--months', type=int, default=24, help='记录覆盖的月数')
+    parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    parser.add_argument('--keep-db', action='store_true', help='保留生成的测试数据库和服务日志')
+    parser.add_argument('--output', help='结果JSON文件，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    users = [(index + 1, f'bench_user_{index + 1}') for index in range(args.users)]
+    workdir = None
+
+    # 进度信息写到标准错误，标准输出只保留结果JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if args.url:
+                target = urlsplit(args.url)
+                result = run_load(target.hostname, target.port or 80, users, mix, args.clients,
+                                  args.duration, args.think_time, args.seed)
+                server_info = {'url': args.url}
+            else:
+                workdir = tempfile.mkdtemp(prefix='finance-load-')
+                db_path = os.path.join(workdir, 'load.db')
+                print(f"生成测试数据: {args.users} 个用户 × {args.records} 条记录 -> {db_path}")
+                users = prepare_database(db_path, args.users, args.records, args.months, args.seed)
+
+                print(f"启动服务: {args.server}（线程 {args.threads}，进程 {args.processes}，"
+                      f"连接池 {args.pool_size or '默认'}，日志模式 {args.journal_mode}）")
+                with local_server(args, db_path, workdir) as (host, port):
+                    print(f"开始测试: {args.clients} 个客户端，{args.duration} 秒，比例 {args.mix}")
+                    result = run_load(host, port, users, mix, args.clients, args.duration,
+                                      args.think_time, args.seed)
+                server_info = {
+                    'mode': args.server,
+                    'threads': args.threads,
+                    'processes': args.processes,
+                    'pool_size': args.pool_size,
+                    'journal_mode': args.journal_mode,
+                }
+        finally:
+            if workdir and not args.keep_db:
+                shutil.rmtree(workdir, ignore_errors=True)
+            elif workdir:
+                print(f"测试数据和服务日志保留在: {workdir}")
+
+        print(f"吞吐量 {result['requests_per_second']} 请求/秒，"
+              f"p99 {result['requests']['p99_ms']}ms，失败 {result['failures']}，"
+              f"database is locked {result['database_locked']}")
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': benchmark.git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'server': server_info,
+            'clients': args.clients,
+            'duration': args.duration,
+            'think_time': args.think_time,
+            'mix': mix,
+            'users': args.users,
+            'records_per_user': args.records,
+        },
+        'result': result,
+    }
+    text = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"✅ 结果已保存: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
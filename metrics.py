@@ -0,0 +1,227 @@
+"""
+请求耗时与数据库统计
+通过Flask请求钩子记录每个路由的耗时直方图、请求数和错误数，
+通过数据库层的语句观察者统计每个请求的SQL条数、返回行数和耗时，
+以Prometheus文本格式在 /metrics 输出，并在响应头 Server-Timing 中给出本次请求的分解耗时。
+统计保存在进程内，多进程部署时每个进程单独统计。
+"""
+
+import threading
+import time
+
+from flask import g, has_app_context, request
+from flask.json.provider import DefaultJSONProvider
+
+import columnar
+import database
+import report_cache
+from http_cache import is_error_response
+
+# 请求耗时直方图的分桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 请求之外（后台任务、启动初始化）执行的SQL计入该端点
+BACKGROUND_ENDPOINT = 'background'
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """线程安全的进程内指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}      # (method, endpoint, status) -> 次数
+        self.errors = {}        # (method, endpoint) -> 次数
+        self.latency = {}       # (method, endpoint) -> _Histogram
+        self.db = {}            # endpoint -> [语句数, 返回行数, 耗时]
+        self.json_seconds = {}  # endpoint -> JSON编码耗时
+
+    def observe_request(self, method, endpoint, status, seconds, error, db_stats, json_seconds):
+        with self._lock:
+            key = (method, endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if error:
+                self.errors[(method, endpoint)] = self.errors.get((method, endpoint), 0) + 1
+            histogram = self.latency.get((method, endpoint))
+            if histogram is None:
+                histogram = self.latency[(method, endpoint)] = _Histogram()
+            histogram.observe(seconds)
+            self._add_db(endpoint, *db_stats)
+            if json_seconds:
+                self.json_seconds[endpoint] = self.json_seconds.get(endpoint, 0.0) + json_seconds
+
+    def observe_query(self, endpoint, rows, seconds):
+        with self._lock:
+            self._add_db(endpoint, 1, rows, seconds)
+
+    def _add_db(self, endpoint, queries, rows, seconds):
+        if not queries:
+            return
+        totals = self.db.get(endpoint)
+        if totals is None:
+            totals = self.db[endpoint] = [0, 0, 0.0]
+        totals[0] += queries
+        totals[1] += rows
+        totals[2] += seconds
+
+    def render(self):
+        """Prometheus文本格式"""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            family('finance_http_requests_total', 'counter', '按路由和状态码统计的请求数')
+            for (method, endpoint, status), value in sorted(self.requests.items()):
+                lines.append(f'finance_http_requests_total{{method="{method}",endpoint="{endpoint}",'
+                             f'status="{status}"}} {value}')
+
+            family('finance_http_request_errors_total', 'counter',
+                   '失败的请求数（HTTP 4xx/5xx 或返回 success=false）')
+            for (method, endpoint), value in sorted(self.errors.items()):
+                lines.append(f'finance_http_request_errors_total{{method="{method}",endpoint="{endpoint}"}} {value}')
+
+            family('finance_http_request_duration_seconds', 'histogram', '请求处理耗时')
+            for (method, endpoint), histogram in sorted(self.latency.items()):
+                labels = f'method="{method}",endpoint="{endpoint}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f'finance_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'finance_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'finance_http_request_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'finance_http_request_duration_seconds_count{{{labels}}} {histogram.count}')
+
+            db = sorted(self.db.items())
+            family('finance_db_queries_total', 'counter', '执行的SQL语句数')
+            for endpoint, (queries, _, _) in db:
+                lines.append(f'finance_db_queries_total{{endpoint="{endpoint}"}} {queries}')
+            family('finance_db_rows_total', 'counter', 'SQL语句返回的行数')
+            for endpoint, (_, rows, _) in db:
+                lines.append(f'finance_db_rows_total{{endpoint="{endpoint}"}} {rows}')
+            family('finance_db_duration_seconds_total', 'counter', 'SQL执行和取结果的总耗时')
+            for endpoint, (_, _, seconds) in db:
+                lines.append(f'finance_db_duration_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+
+            family('finance_json_encode_seconds_total', 'counter', 'JSON编码总耗时')
+            for endpoint, seconds in sorted(self.json_seconds.items()):
+                lines.append(f'finance_json_encode_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+
+        stats = report_cache.cache.stats()
+        family('finance_report_cache_entries', 'gauge', '报告缓存条目数')
+        lines.append(f"finance_report_cache_entries {stats['entries']}")
+        family('finance_report_cache_bytes', 'gauge', '报告缓存占用字节数')
+        lines.append(f"finance_report_cache_bytes {stats['bytes']}")
+        family('finance_report_cache_hits_total', 'counter', '报告缓存命中次数')
+        lines.append(f"finance_report_cache_hits_total {stats['hits']}")
+        family('finance_report_cache_misses_total', 'counter', '报告缓存未命中次数')
+        lines.append(f"finance_report_cache_misses_total {stats['misses']}")
+
+        stats = columnar.engine.stats()
+        family('finance_columnar_enabled', 'gauge', '列式分析引擎是否可用（已安装NumPy）')
+        lines.append(f"finance_columnar_enabled {int(stats['enabled'])}")
+        family('finance_columnar_cache_users', 'gauge', '列式分析缓存的用户数')
+        lines.append(f"finance_columnar_cache_users {stats['users']}")
+        family('finance_columnar_cache_bytes', 'gauge', '列式分析缓存占用字节数')
+        lines.append(f"finance_columnar_cache_bytes {stats['bytes']}")
+        family('finance_columnar_cache_hits_total', 'counter', '列式分析缓存命中次数')
+        lines.append(f"finance_columnar_cache_hits_total {stats['hits']}")
+        family('finance_columnar_cache_misses_total', 'counter', '列式分析缓存未命中次数')
+        lines.append(f"finance_columnar_cache_misses_total {stats['misses']}")
+        family('finance_columnar_cache_refreshes_total', 'counter', '列式分析缓存按月增量刷新次数')
+        lines.append(f"finance_columnar_cache_refreshes_total {stats['refreshes']}")
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+            self.latency.clear()
+            self.db.clear()
+            self.json_seconds.clear()
+
+
+# 进程内共享的指标
+metrics = Metrics()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """记录请求内JSON编码耗时的JSON提供者"""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_app_context() and 'metrics_start' in g:
+                g.metrics_json += time.perf_counter() - start
+
+
+def _observe_query(conn, sql, params, seconds, rows):
+    if has_app_context() and 'metrics_start' in g:
+        stats = g.metrics_db
+        stats[0] += 1
+        stats[1] += rows
+        stats[2] += seconds
+    else:
+        metrics.observe_query(BACKGROUND_ENDPOINT, rows, seconds)
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db = [0, 0, 0.0]
+    g.metrics_json = 0.0
+
+
+def _record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    total = time.perf_counter() - start
+    db_stats = g.metrics_db
+    json_seconds = g.metrics_json
+
+    endpoint = request.endpoint or 'unmatched'
+    error = response.status_code >= 400 or is_error_response(response)
+    metrics.observe_request(request.method, endpoint, response.status_code, total,
+                            error, db_stats, json_seconds)
+
+    queries, _, db_seconds = db_stats
+    response.headers['Server-Timing'] = (
+        f'db;desc="{queries} queries";dur={db_seconds * 1000:.2f}, '
+        f'json;dur={json_seconds * 1000:.2f}, '
+        f'total;dur={total * 1000:.2f}'
+    )
+    return response
+
+
+def init_app(app):
+    """注册请求计时钩子和SQL统计
+
+    需在其它after_request钩子之前注册（Flask倒序执行after_request），
+    使统计的耗时包含响应压缩等后处理。
+    """
+    app.json_provider_class = TimedJSONProvider
+    app.json = TimedJSONProvider(app)
+    database.add_query_observer(_observe_query)
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
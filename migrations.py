@@ -0,0 +1,669 @@
+"""
+数据库版本迁移
+schema_version表记录已执行的迁移，启动时按版本号顺序执行尚未执行的步骤
+"""
+
+import sqlite3
+from datetime import datetime
+
+import categories
+import dates
+import search
+from money import to_cents
+
+# 已注册的迁移: [(版本号, 说明, 函数)]
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """注册一个迁移步骤，版本号必须递增且唯一"""
+    def decorator(func):
+        if any(v == version for v, _, _ in MIGRATIONS):
+            raise ValueError(f'迁移版本重复: {version}')
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def current_version(conn):
+    """当前数据库的结构版本，未迁移过返回0"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    """执行所有未执行的迁移，每个迁移在独立事务中完成，返回执行的版本列表"""
+    applied = []
+    version = current_version(conn)
+    conn.commit()
+
+    for target, description, step in MIGRATIONS:
+        if target <= version:
+            continue
+
+        conn.execute('BEGIN')
+        try:
+            step(conn)
+            conn.execute('''
+                INSERT INTO schema_version (version, description, applied_at)
+                VALUES (?, ?, ?)
+            ''', (target, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        print(f"✅ 数据库迁移 {target}: {description}")
+        applied.append(target)
+
+    if applied:
+        conn.execute('PRAGMA optimize')
+
+    return applied
+
+
+@migration(1, '创建finance_records和reports表')
+def create_legacy_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS finance_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            record_type TEXT NOT NULL,
+            description TEXT,
+            record_date TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            sync_id TEXT UNIQUE,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            report_type TEXT NOT NULL,
+            period TEXT NOT NULL,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            generated_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+@migration(2, '为按用户和日期范围的查询添加覆盖索引')
+def add_range_indexes(conn):
+    # 报告和分析按 user_id + 日期范围 过滤，再按类型求和
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_records_user_date
+        ON records (user_id, date, type, amount)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_finance_records_user_date
+        ON finance_records (user_id, record_date, record_type, amount)
+    ''')
+
+    # 汇总按 user_id + 类型 求和
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_records_user_type
+        ON records (user_id, type, amount)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_finance_records_user_type
+        ON finance_records (user_id, record_type, amount)
+    ''')
+
+    # 报告列表按生成时间倒序
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reports_user_generated
+        ON reports (user_id, generated_at)
+    ''')
+    conn.execute('ANALYZE')
+
+
+@migration(3, '将finance_records合并到records并保留兼容视图')
+def fold_finance_records(conn):
+    # 记录来源和原始id，便于追溯旧表数据
+    conn.execute("ALTER TABLE records ADD COLUMN source TEXT NOT NULL DEFAULT 'records'")
+    conn.execute('ALTER TABLE records ADD COLUMN source_id INTEGER')
+    conn.execute('ALTER TABLE records ADD COLUMN created_at TEXT')
+
+    conn.execute('''
+        INSERT INTO records (user_id, amount, category, type, description, date,
+                             source, source_id, created_at)
+        SELECT user_id, amount, category, record_type, description, record_date,
+               'finance_records', id, created_at
+        FROM finance_records ORDER BY id
+    ''')
+
+    # 旧表改名保留原始数据，不再参与查询
+    conn.execute('DROP INDEX IF EXISTS idx_finance_records_user_date')
+    conn.execute('DROP INDEX IF EXISTS idx_finance_records_user_type')
+    conn.execute('ALTER TABLE finance_records RENAME TO finance_records_legacy')
+
+    # 兼容视图：仍按旧表的列名提供合并过来的数据
+    conn.execute('''
+        CREATE VIEW finance_records AS
+        SELECT r.source_id AS id, r.user_id, r.amount, r.category,
+               r.type AS record_type, r.description, r.date AS record_date,
+               r.created_at, l.updated_at, l.sync_id
+        FROM records r
+        LEFT JOIN finance_records_legacy l ON l.id = r.source_id
+        WHERE r.source = 'finance_records'
+    ''')
+    conn.execute('ANALYZE')
+
+
+@migration(4, '添加按日期和id倒序翻页的索引')
+def add_keyset_index(conn):
+    # 索引隐含rowid，(user_id, date) 即可按 (date, id) 顺序扫描
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_records_user_date_id
+        ON records (user_id, date)
+    ''')
+    conn.execute('ANALYZE')
+
+
+@migration(5, '创建按月、分类、类型汇总的monthly_rollups表')
+def create_monthly_rollups(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_rollups (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, category, type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO monthly_rollups (user_id, month, category, type, total, count)
+        SELECT user_id, substr(date, 1, 7), category, type, SUM(amount), COUNT(*)
+        FROM records
+        GROUP BY user_id, substr(date, 1, 7), category, type
+    ''')
+
+
+@migration(6, '记录账本数据版本，报告保存对应的数据版本')
+def add_ledger_versions(conn):
+    # 每个用户一个递增的版本号，每次写入记录时加1
+    conn.execute('ALTER TABLE users ADD COLUMN ledger_version INTEGER NOT NULL DEFAULT 0')
+
+    # 每个月份最后一次被写入时的用户版本号
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_versions (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.execute('ALTER TABLE reports ADD COLUMN data_version INTEGER')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reports_user_period
+        ON reports (user_id, report_type, period, data_version)
+    ''')
+
+
+def _legacy_cents(amount):
+    """to_cents无法换算的旧金额按浮点数换算为分，非数字或超出SQLite整数范围时为0"""
+    try:
+        cents = int(round(float(amount or 0) * 100))
+    except (TypeError, ValueError, OverflowError):
+        return 0
+    return cents if abs(cents) < 2 ** 63 else 0
+
+
+@migration(7, '金额改为以分为单位的整数保存')
+def store_amounts_as_cents(conn):
+    # SQLite不能修改列类型，按官方推荐的方式重建表：新建、复制、删除旧表、改名
+    conn.execute('DROP VIEW IF EXISTS finance_records')
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'records'").fetchone()
+    sequence = row[0] if row else 0
+
+    conn.execute('''
+        CREATE TABLE records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL,
+            description TEXT,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            source TEXT NOT NULL DEFAULT 'records',
+            source_id INTEGER,
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # 金额用 money.to_cents 换算（十进制四舍五入），与新写入的记录一致；
+    # SQL中的 ROUND(amount * 100) 是二进制浮点运算，1.005 会得到100而不是101
+    rows = []
+    invalid = []
+    for row in conn.execute('''
+        SELECT id, user_id, amount, category, type, description, date, source, source_id, created_at
+        FROM records
+    '''):
+        try:
+            cents = to_cents(row[2])
+        except ValueError:
+            # 超出范围或无法解析的旧金额按原来的方式换算，保证迁移可以完成
+            cents = _legacy_cents(row[2])
+            invalid.append(row[0])
+        rows.append(row[:2] + (cents,) + row[3:])
+    conn.executemany('''
+        INSERT INTO records_new (id, user_id, amount_cents, category, type, description, date,
+                                 source, source_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    if invalid:
+        shown = ', '.join(str(record_id) for record_id in invalid[:20])
+        more = ' 等' if len(invalid) > 20 else ''
+        print(f"⚠️ {len(invalid)} 条记录的金额超出范围或无法解析，已按浮点数换算，"
+              f"非数字的金额记为0（记录id: {shown}{more}）")
+    conn.execute('DROP TABLE records')
+    conn.execute('ALTER TABLE records_new RENAME TO records')
+    # 保留自增序号，已删除记录的id不会被重新使用
+    conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'records'", (sequence,))
+
+    conn.execute('''
+        CREATE INDEX idx_records_user_date
+        ON records (user_id, date, type, amount_cents)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_records_user_type
+        ON records (user_id, type, amount_cents)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_records_user_date_id
+        ON records (user_id, date)
+    ''')
+
+    conn.execute('''
+        CREATE VIEW finance_records AS
+        SELECT r.source_id AS id, r.user_id, r.amount_cents / 100.0 AS amount, r.category,
+               r.type AS record_type, r.description, r.date AS record_date,
+               r.created_at, l.updated_at, l.sync_id
+        FROM records r
+        LEFT JOIN finance_records_legacy l ON l.id = r.source_id
+        WHERE r.source = 'finance_records'
+    ''')
+
+    # 汇总表直接按整数金额重新计算，消除之前浮点累加的误差
+    conn.execute('DROP TABLE monthly_rollups')
+    conn.execute('''
+        CREATE TABLE monthly_rollups (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, category, type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO monthly_rollups (user_id, month, category, type, total_cents, count)
+        SELECT user_id, substr(date, 1, 7), category, type, SUM(amount_cents), COUNT(*)
+        FROM records
+        GROUP BY user_id, substr(date, 1, 7), category, type
+    ''')
+
+    # 已保存的报告是按浮点数汇总的，不再作为当前数据版本的结果复用
+    conn.execute('UPDATE reports SET data_version = NULL')
+    conn.execute('ANALYZE')
+
+
+@migration(8, '日期统一格式并添加整数天数列day')
+def add_record_day(conn):
+    conn.execute('ALTER TABLE records ADD COLUMN day INTEGER')
+
+    updates = []
+    months_changed = False
+    invalid = []
+    for record_id, record_date in conn.execute('SELECT id, date FROM records').fetchall():
+        try:
+            canonical = dates.normalize(record_date)
+        except ValueError:
+            # 无法识别的日期保持原样，day为NULL，不会出现在任何日期范围内
+            invalid.append(record_id)
+            continue
+        if canonical[:7] != str(record_date)[:7]:
+            months_changed = True
+        updates.append((canonical, dates.to_day(canonical), record_id))
+    conn.executemany('UPDATE records SET date = ?, day = ? WHERE id = ?', updates)
+    _warn_invalid_dates(invalid)
+
+    # 按天数范围筛选的覆盖索引，以及按 (day, date, id) 倒序翻页的索引
+    conn.execute('DROP INDEX IF EXISTS idx_records_user_date')
+    conn.execute('DROP INDEX IF EXISTS idx_records_user_date_id')
+    conn.execute('''
+        CREATE INDEX idx_records_user_day
+        ON records (user_id, day, type, category, amount_cents)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_records_user_day_date
+        ON records (user_id, day, date)
+    ''')
+
+    # 规范化改变了月份（如 2025/1/5 → 2025-01-05）时重新计算月度汇总
+    if months_changed:
+        conn.execute('DELETE FROM monthly_rollups')
+        conn.execute('''
+            INSERT INTO monthly_rollups (user_id, month, category, type, total_cents, count)
+            SELECT user_id, substr(date, 1, 7), category, type, SUM(amount_cents), COUNT(*)
+            FROM records
+            GROUP BY user_id, substr(date, 1, 7), category, type
+        ''')
+        conn.execute('UPDATE reports SET data_version = NULL')
+    conn.execute('ANALYZE')
+
+
+def _warn_invalid_dates(record_ids):
+    """提示日期无法识别、day为NULL的记录，这些记录不会出现在日期筛选、报告和图表中"""
+    if not record_ids:
+        return
+    shown = ', '.join(str(record_id) for record_id in record_ids[:20])
+    more = ' 等' if len(record_ids) > 20 else ''
+    print(f"⚠️ {len(record_ids)} 条记录的日期无法识别，未设置day，"
+          f"不会出现在按日期筛选的结果、报告和图表中（记录id: {shown}{more}）")
+
+
+@migration(9, '为记录描述和分类创建FTS5全文索引')
+def create_records_fts(conn):
+    # trigram分词按三个字符切分，中文等没有空格的文本也能按任意子串（包括前缀）匹配
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE records_fts USING fts5(
+                description, category,
+                content='records', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 当前SQLite不支持FTS5 trigram分词（需要3.34以上），搜索将逐条匹配: {e}")
+        return
+
+    # 外部内容表，由触发器与records保持同步
+    conn.execute('''
+        CREATE TRIGGER records_fts_insert AFTER INSERT ON records BEGIN
+            INSERT INTO records_fts (rowid, description, category)
+            VALUES (new.id, new.description, new.category);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER records_fts_delete AFTER DELETE ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, description, category)
+            VALUES ('delete', old.id, old.description, old.category);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER records_fts_update AFTER UPDATE OF description, category ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, description, category)
+            VALUES ('delete', old.id, old.description, old.category);
+            INSERT INTO records_fts (rowid, description, category)
+            VALUES (new.id, new.description, new.category);
+        END
+    ''')
+    conn.execute("INSERT INTO records_fts (records_fts) VALUES ('rebuild')")
+
+
+@migration(10, '创建分类表，记录改为按category_id引用分类')
+def create_categories(conn):
+    conn.execute('''
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            sort_order INTEGER NOT NULL DEFAULT 0,
+            archived INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # user_id为NULL的全局分类也参与唯一性检查
+    conn.execute('''
+        CREATE UNIQUE INDEX idx_categories_owner_name
+        ON categories (IFNULL(user_id, 0), name)
+    ''')
+    conn.execute('ALTER TABLE users ADD COLUMN categories_version INTEGER NOT NULL DEFAULT 0')
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany('''
+        INSERT INTO categories (user_id, name, type, sort_order, created_at) VALUES (NULL, ?, ?, ?, ?)
+    ''', [(name, category_type, (index + 1) * 10, now)
+          for category_type, names in categories.DEFAULT_CATEGORIES.items()
+          for index, name in enumerate(names)])
+
+    # 记录中出现的其它分类名称作为该用户的分类，类型取该名称下记录最多的类型
+    global_names = {row[0] for row in conn.execute('SELECT name FROM categories')}
+    custom = {}
+    for user_id, name, record_type, count in conn.execute('''
+        SELECT user_id, category, type, COUNT(*) FROM records
+        GROUP BY user_id, category, type
+        ORDER BY user_id, category, COUNT(*) DESC, type
+    ''').fetchall():
+        if name not in global_names and (user_id, name) not in custom:
+            custom[(user_id, name)] = record_type if record_type in categories.CATEGORY_TYPES else 'expense'
+    # 自定义分类排在同类型的默认分类之后
+    sort_orders = {}
+    for (user_id, name), category_type in custom.items():
+        key = (user_id, category_type)
+        sort_orders[key] = sort_orders.get(key, len(categories.DEFAULT_CATEGORIES[category_type]) * 10) + 10
+        conn.execute('''
+            INSERT INTO categories (user_id, name, type, sort_order, created_at) VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, name, category_type, sort_orders[key], now))
+
+    # 重建records表，category文本列换成整数category_id
+    conn.execute('DROP VIEW IF EXISTS finance_records')
+    for trigger in ('records_fts_insert', 'records_fts_delete', 'records_fts_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute('DROP TABLE IF EXISTS records_fts')
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'records'").fetchone()
+    sequence = row[0] if row else 0
+
+    conn.execute('''
+        CREATE TABLE records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            description TEXT,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            day INTEGER,
+            source TEXT NOT NULL DEFAULT 'records',
+            source_id INTEGER,
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO records_new (id, user_id, amount_cents, category_id, type, description, date, day,
+                                 source, source_id, created_at)
+        SELECT r.id, r.user_id, r.amount_cents, c.id, r.type, r.description, r.date, r.day,
+               r.source, r.source_id, r.created_at
+        FROM records r
+        JOIN categories c ON c.name = r.category AND (c.user_id = r.user_id OR c.user_id IS NULL)
+    ''')
+    copied = conn.execute('SELECT COUNT(*) FROM records_new').fetchone()[0]
+    total = conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+    if copied != total:
+        raise RuntimeError(f'分类迁移后记录数不一致: {copied} != {total}')
+    conn.execute('DROP TABLE records')
+    conn.execute('ALTER TABLE records_new RENAME TO records')
+    conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'records'", (sequence,))
+
+    conn.execute('''
+        CREATE INDEX idx_records_user_day
+        ON records (user_id, day, type, category_id, amount_cents)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_records_user_day_date
+        ON records (user_id, day, date)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_records_user_type
+        ON records (user_id, type, amount_cents)
+    ''')
+
+    conn.execute('''
+        CREATE VIEW finance_records AS
+        SELECT r.source_id AS id, r.user_id, r.amount_cents / 100.0 AS amount, c.name AS category,
+               r.type AS record_type, r.description, r.date AS record_date,
+               r.created_at, l.updated_at, l.sync_id
+        FROM records r
+        JOIN categories c ON c.id = r.category_id
+        LEFT JOIN finance_records_legacy l ON l.id = r.source_id
+        WHERE r.source = 'finance_records'
+    ''')
+
+    conn.execute('DROP TABLE monthly_rollups')
+    conn.execute('''
+        CREATE TABLE monthly_rollups (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, category_id, type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO monthly_rollups (user_id, month, category_id, type, total_cents, count)
+        SELECT user_id, substr(date, 1, 7), category_id, type, SUM(amount_cents), COUNT(*)
+        FROM records
+        GROUP BY user_id, substr(date, 1, 7), category_id, type
+    ''')
+
+    _create_records_fts(conn)
+    conn.execute('ANALYZE')
+
+
+@migration(11, '创建分类月度预算表')
+def create_budgets(conn):
+    # 当月已支出金额取自monthly_rollups，这里只保存预算金额
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS budgets (
+            user_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            created_at TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (user_id, category_id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        ) WITHOUT ROWID
+    ''')
+
+
+@migration(12, '补全旧格式日期（如 YYYY/M/D）记录的day')
+def repair_record_day(conn):
+    # 迁移8执行时无法识别 YYYY/M/D，这些记录的day仍为NULL
+    updates = []
+    users = set()
+    invalid = []
+    for record_id, user_id, record_date in conn.execute(
+            'SELECT id, user_id, date FROM records WHERE day IS NULL').fetchall():
+        try:
+            canonical = dates.normalize(record_date)
+        except ValueError:
+            invalid.append(record_id)
+            continue
+        updates.append((canonical, dates.to_day(canonical), record_id))
+        users.add(user_id)
+    conn.executemany('UPDATE records SET date = ?, day = ? WHERE id = ?', updates)
+    _warn_invalid_dates(invalid)
+
+    # 日期改写后月份可能变化，重新计算这些用户的月度汇总
+    for user_id in users:
+        conn.execute('DELETE FROM monthly_rollups WHERE user_id = ?', (user_id,))
+        conn.execute('''
+            INSERT INTO monthly_rollups (user_id, month, category_id, type, total_cents, count)
+            SELECT user_id, substr(date, 1, 7), category_id, type, SUM(amount_cents), COUNT(*)
+            FROM records WHERE user_id = ?
+            GROUP BY user_id, substr(date, 1, 7), category_id, type
+        ''', (user_id,))
+        conn.execute('UPDATE reports SET data_version = NULL WHERE user_id = ?', (user_id,))
+        conn.execute('UPDATE users SET ledger_version = ledger_version + 1 WHERE id = ?', (user_id,))
+
+
+@migration(13, '为一两个字的短词搜索创建单字和两字索引records_ngram')
+def create_records_ngram(conn):
+    # 内容由search.ngrams在Python中切分，ascii分词只按空格和ASCII标点切开词元；
+    # 查询只需判断是否包含某个词元，不保存位置信息
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE records_ngram USING fts5(
+                grams, content='', tokenize='ascii', detail='none'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 当前SQLite不支持FTS5，短词搜索将逐条匹配: {e}")
+        return
+    search.index_ngrams(conn, conn.execute('SELECT id, description FROM records').fetchall())
+
+
+def _create_records_fts(conn):
+    """创建记录描述和分类名称的全文索引（无内容表，分类名称由触发器从categories查出）"""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE records_fts USING fts5(
+                description, category, content='', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 当前SQLite不支持FTS5 trigram分词（需要3.34以上），搜索将逐条匹配: {e}")
+        return
+
+    # 无内容表删除时必须提供与写入时相同的值
+    conn.execute('''
+        CREATE TRIGGER records_fts_insert AFTER INSERT ON records BEGIN
+            INSERT INTO records_fts (rowid, description, category)
+            VALUES (new.id, new.description, (SELECT name FROM categories WHERE id = new.category_id));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER records_fts_delete AFTER DELETE ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, description, category)
+            VALUES ('delete', old.id, old.description,
+                    (SELECT name FROM categories WHERE id = old.category_id));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER records_fts_update AFTER UPDATE OF description, category_id ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, description, category)
+            VALUES ('delete', old.id, old.description,
+                    (SELECT name FROM categories WHERE id = old.category_id));
+            INSERT INTO records_fts (rowid, description, category)
+            VALUES (new.id, new.description, (SELECT name FROM categories WHERE id = new.category_id));
+        END
+    ''')
+    # 分类改名时重新索引该分类下的记录
+    conn.execute('''
+        CREATE TRIGGER categories_fts_rename AFTER UPDATE OF name ON categories BEGIN
+            INSERT INTO records_fts (records_fts, rowid, description, category)
+            SELECT 'delete', id, description, old.name FROM records WHERE category_id = old.id;
+            INSERT INTO records_fts (rowid, description, category)
+            SELECT id, description, new.name FROM records WHERE category_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        INSERT INTO records_fts (rowid, description, category)
+        SELECT r.id, r.description, c.name FROM records r JOIN categories c ON c.id = r.category_id
+    ''')
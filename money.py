@@ -0,0 +1,45 @@
+"""
+金额换算
+数据库中金额以整数“分”保存，汇总时全部做整数运算，结果精确；
+接口收到的金额按十进制解析并四舍五入到分，返回时再换算为元。
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CENTS_PER_YUAN = 100
+
+# 单条记录金额上限（分），保证大量记录求和也不会超出SQLite的64位整数范围
+MAX_CENTS = 10 ** 13
+
+
+def to_cents(value):
+    """把以元为单位的金额（数字或字符串）转换为整数分，格式错误时抛出ValueError
+
+    浮点数先转成最短的十进制表示再解析，0.1 按 "0.1" 处理而不是二进制近似值。
+    """
+    if value is None or isinstance(value, bool):
+        raise ValueError('金额格式错误')
+    try:
+        amount = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError('金额格式错误')
+    if not amount.is_finite():
+        raise ValueError('金额格式错误')
+
+    cents = int((amount * CENTS_PER_YUAN).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    if abs(cents) > MAX_CENTS:
+        raise ValueError('金额超出范围')
+    return cents
+
+
+def from_cents(cents):
+    """整数分换算为元，用于JSON输出"""
+    return (cents or 0) / CENTS_PER_YUAN
+
+
+def format_cents(cents):
+    """整数分格式化为两位小数的字符串，用于导出文件"""
+    cents = cents or 0
+    sign = '-' if cents < 0 else ''
+    cents = abs(cents)
+    return f'{sign}{cents // CENTS_PER_YUAN}.{cents % CENTS_PER_YUAN:02d}'
@@ -0,0 +1,115 @@
+"""
+报告结果缓存
+按 (用户, 报告类型, 周期, 数据版本) 缓存生成好的报告内容，LRU淘汰并限制总大小。
+数据版本来自 ledger_versions 表，记录增删时该月份的版本号递增，
+因此只有写入涉及的周期会失效，其它周期的缓存继续有效。
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+# 默认最多缓存的报告数
+DEFAULT_MAX_ENTRIES = 1024
+
+# 默认缓存内容总大小上限（按JSON字节数估算）
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def period_months(report_type, period):
+    """报告周期对应的月份区间 [start, end)，月份格式为 YYYY-MM"""
+    if report_type == 'monthly':
+        year, month = int(period[:4]), int(period[5:7])
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return period, f"{next_year}-{next_month:02d}"
+    if report_type == 'yearly':
+        return f"{period}-01", f"{int(period) + 1}-01"
+    raise ValueError(f'未知的报告类型: {report_type}')
+
+
+def period_version(conn, user_id, report_type, period):
+    """报告周期内数据的版本号，周期内没有写入过时为0"""
+    start, end = period_months(report_type, period)
+    row = conn.execute('''
+        SELECT MAX(version) FROM ledger_versions
+        WHERE user_id = ? AND month >= ? AND month < ?
+    ''', (user_id, start, end)).fetchone()
+    return row[0] or 0
+
+
+class ReportCache:
+    """线程安全的LRU报告缓存"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, report_type, period, version):
+        """取出缓存的报告内容，不存在返回None"""
+        key = (user_id, report_type, period, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user_id, report_type, period, version, content, size=None):
+        """缓存报告内容，size为内容的字节数，不提供时按JSON序列化估算"""
+        if size is None:
+            size = len(json.dumps(content, ensure_ascii=False).encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        key = (user_id, report_type, period, version)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (content, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def invalidate_month(self, user_id, month):
+        """删除包含指定月份的月度和年度报告缓存"""
+        self._invalidate(lambda key: key[0] == user_id and (
+            (key[1] == 'monthly' and key[2] == month) or
+            (key[1] == 'yearly' and key[2] == month[:4])
+        ))
+
+    def invalidate_period(self, user_id, report_type, period):
+        """删除指定报告周期的缓存"""
+        self._invalidate(lambda key: key[:3] == (user_id, report_type, period))
+
+    def _invalidate(self, predicate):
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# 进程内共享的缓存实例
+cache = ReportCache()
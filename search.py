@@ -0,0 +1,155 @@
+"""
+记录搜索
+在描述和分类中查找记录。records_fts（FTS5，trigram分词）按子串匹配，
+中文无需分词，输入词的前缀同样能匹配；结果按bm25相关度排序，再按日期倒序。
+少于三个字符的词无法使用trigram索引，描述改用records_ngram匹配：该表以ascii分词
+（与LIKE一样只对ASCII字母忽略大小写）保存每条描述的单字和相邻两字，由ledger在增删记录时维护，
+一两个字的词按单个词元查找；含ASCII标点的短词和不支持FTS5的数据库仍逐条LIKE匹配。
+"""
+
+import categories
+import dates
+
+# trigram索引能匹配的最短词长
+MIN_INDEXED_LENGTH = 3
+
+# records_ngram能匹配的最长词长
+MAX_NGRAM_LENGTH = 2
+
+# 每页最多返回的记录数
+MAX_LIMIT = 100
+
+# 最多使用的搜索词个数
+MAX_TERMS = 10
+
+_SELECT_COLUMNS = 'r.id, r.amount_cents, r.category_id, r.type, r.description, r.date, r.source'
+
+
+def has_index(conn):
+    """数据库中是否已建立records_fts"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'records_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def has_ngram_index(conn):
+    """数据库中是否已建立records_ngram"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'records_ngram'"
+    ).fetchone()
+    return row is not None
+
+
+def _ngram_char(char):
+    # ascii分词把ASCII标点和空白当作分隔符，含这些字符的片段无法作为词元
+    return not char.isascii() or char.isalnum()
+
+
+def ngram_indexable(term):
+    """短词能否在records_ngram中按词元查找"""
+    return 0 < len(term) <= MAX_NGRAM_LENGTH and all(_ngram_char(char) for char in term)
+
+
+def ngrams(text):
+    """描述的单字和相邻两字，以空格分隔、去重，作为records_ngram的内容"""
+    text = text or ''
+    grams = dict.fromkeys(char for char in text if _ngram_char(char))
+    grams.update(dict.fromkeys(text[i:i + 2] for i in range(len(text) - 1)
+                               if _ngram_char(text[i]) and _ngram_char(text[i + 1])))
+    return ' '.join(grams)
+
+
+def index_ngrams(conn, rows):
+    """把新写入的 (id, description) 加入records_ngram"""
+    if rows and has_ngram_index(conn):
+        conn.executemany('INSERT INTO records_ngram (rowid, grams) VALUES (?, ?)',
+                         [(record_id, ngrams(description)) for record_id, description in rows])
+
+
+def unindex_ngrams(conn, rows):
+    """从records_ngram中删除 (id, description)，无内容表删除时必须提供与写入时相同的内容"""
+    if rows and has_ngram_index(conn):
+        conn.executemany("INSERT INTO records_ngram (records_ngram, rowid, grams) VALUES ('delete', ?, ?)",
+                         [(record_id, ngrams(description)) for record_id, description in rows])
+
+
+def split_terms(text):
+    """按空白拆分搜索词，去重并限制个数"""
+    return list(dict.fromkeys((text or '').split()))[:MAX_TERMS]
+
+
+def fts_phrase(term):
+    """把搜索词转为FTS5短语，双引号转义，避免用户输入被当作查询语法"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def like_pattern(term):
+    """把搜索词转为LIKE的包含匹配模式，转义通配符"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_records(conn, user_id, text, record_type=None, start_date=None, end_date=None,
+                   limit=20, offset=0):
+    """搜索用户的记录，多个词需同时匹配，返回 (总数, 当前页的行)
+
+    行为 (id, amount_cents, category_id, type, description, date, source)。
+    日期格式错误时抛出ValueError。
+    """
+    terms = split_terms(text)
+    if not terms:
+        return 0, []
+
+    conditions = ['r.user_id = ?']
+    params = [user_id]
+    if record_type:
+        conditions.append('r.type = ?')
+        params.append(record_type)
+    date_conditions, date_params = dates.range_conditions(start_date, end_date, 'r.day')
+    conditions += date_conditions
+    params += date_params
+
+    use_index = has_index(conn)
+    use_ngram = has_ngram_index(conn)
+    indexed = [term for term in terms if use_index and len(term) >= MIN_INDEXED_LENGTH]
+    category_set = None
+    for term in terms:
+        if term not in indexed:
+            # 分类名称在缓存的分类表中匹配，转为category_id条件
+            if category_set is None:
+                category_set = categories.lookup(conn, user_id)
+            category_ids = category_set.matching(term)
+            if use_ngram and ngram_indexable(term):
+                condition = 'r.id IN (SELECT rowid FROM records_ngram WHERE records_ngram MATCH ?)'
+                params.append(fts_phrase(term))
+            else:
+                condition = "r.description LIKE ? ESCAPE '\\'"
+                params.append(like_pattern(term))
+            if category_ids:
+                condition += f" OR r.category_id IN ({','.join('?' * len(category_ids))})"
+            conditions.append(f'({condition})')
+            params += category_ids
+
+    if indexed:
+        source = 'records_fts JOIN records r ON r.id = records_fts.rowid'
+        conditions.insert(0, 'records_fts MATCH ?')
+        params.insert(0, ' '.join(fts_phrase(term) for term in indexed))
+        order = 'records_fts.rank, r.day DESC, r.date DESC, r.id DESC'
+    else:
+        source = 'records r'
+        order = 'r.day DESC, r.date DESC, r.id DESC'
+
+    # 总数用窗口函数在同一次扫描中得到，翻页超出结果范围时再单独计数
+    where = ' AND '.join(conditions)
+    rows = conn.execute(f'''
+        SELECT {_SELECT_COLUMNS}, COUNT(*) OVER ()
+        FROM {source} WHERE {where}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+    ''', params + [limit, offset]).fetchall()
+    if rows:
+        return rows[0][-1], [row[:-1] for row in rows]
+    if offset:
+        return conn.execute(f'SELECT COUNT(*) FROM {source} WHERE {where}', params).fetchone()[0], []
+    return 0, []
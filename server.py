@@ -0,0 +1,143 @@
+"""
+服务运行模式
+dev       Flask自带开发服务器（默认，桌面单用户使用）
+waitress  多线程生产WSGI服务器，跨平台（pip install waitress）
+gunicorn  多进程+多线程生产WSGI服务器，仅Linux/macOS（pip install gunicorn）
+
+收到SIGINT/SIGTERM时先把就绪状态置为否，让负载均衡停止分配新请求，
+再等待处理中的请求完成后退出。
+"""
+
+import signal
+import threading
+
+SERVER_MODES = ('dev', 'waitress', 'gunicorn')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5000
+DEFAULT_THREADS = 8
+DEFAULT_PROCESSES = 1
+
+# 优雅退出时等待处理中请求的最长时间（秒）
+SHUTDOWN_TIMEOUT = 30
+
+# waitress关闭空闲连接前等待的时间（秒），与waitress默认值相同
+CHANNEL_TIMEOUT = 120
+
+_ready = threading.Event()
+
+
+def is_ready():
+    """服务是否可以接收新请求"""
+    return _ready.is_set()
+
+
+def set_ready(ready):
+    """设置就绪状态（用于不经过serve启动的测试或嵌入场景）"""
+    if ready:
+        _ready.set()
+    else:
+        _ready.clear()
+
+
+def _serve_dev(app, host, port, threads, processes):
+    _ready.set()
+    app.run(debug=False, host=host, port=port, use_reloader=False, threaded=True)
+
+
+def _serve_waitress(app, host, port, threads, processes):
+    try:
+        from waitress import create_server
+    except ImportError:
+        raise RuntimeError('未安装waitress，请运行: pip install waitress')
+
+    if processes > 1:
+        print("⚠️ waitress只支持单进程多线程，已忽略进程数设置")
+
+    server = create_server(app, host=host, port=port, threads=threads,
+                           channel_timeout=CHANNEL_TIMEOUT)
+
+    def shutdown(signum, frame):
+        _ready.clear()
+        print("\n正在停止服务，等待处理中的请求完成...")
+        server.close()
+
+    signal.signal(signal.SIGINT, shutdown)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, shutdown)
+
+    _ready.set()
+    try:
+        server.run()
+    except OSError:
+        # close() 之后事件循环可能在已关闭的socket上返回
+        if _ready.is_set():
+            raise
+    finally:
+        _ready.clear()
+        # 等待仍在执行的请求线程结束
+        server.task_dispatcher.shutdown(cancel_pending=False, timeout=SHUTDOWN_TIMEOUT)
+
+
+def _serve_gunicorn(app, host, port, threads, processes):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError('未安装gunicorn（仅支持Linux/macOS），请运行: pip install gunicorn')
+
+    def post_worker_init(worker):
+        # worker_int只在SIGINT/SIGQUIT时调用，正常停止时主进程向工作进程发送SIGTERM，
+        # 在gunicorn的处理函数之前先置为未就绪
+        handle_exit = signal.getsignal(signal.SIGTERM)
+
+        def handle_term(signum, frame):
+            _ready.clear()
+            if callable(handle_exit):
+                handle_exit(signum, frame)
+
+        signal.signal(signal.SIGTERM, handle_term)
+        signal.siginterrupt(signal.SIGTERM, False)
+        _ready.set()
+
+    def worker_int(worker):
+        _ready.clear()
+
+    class FinanceApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', processes)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('graceful_timeout', SHUTDOWN_TIMEOUT)
+            self.cfg.set('post_worker_init', post_worker_init)
+            self.cfg.set('worker_int', worker_int)
+
+        def load(self):
+            return app
+
+    FinanceApplication().run()
+
+
+def serve(app, mode='dev', host=DEFAULT_HOST, port=DEFAULT_PORT,
+          threads=DEFAULT_THREADS, processes=DEFAULT_PROCESSES):
+    """按指定模式启动服务，阻塞直到服务停止"""
+    runners = {
+        'dev': _serve_dev,
+        'waitress': _serve_waitress,
+        'gunicorn': _serve_gunicorn,
+    }
+    if mode not in runners:
+        raise ValueError(f'未知的运行模式: {mode}')
+    runners[mode](app, host, port, max(1, threads), max(1, processes))
+
+
+def add_arguments(parser):
+    """为命令行解析器添加服务相关参数"""
+    parser.add_argument('--server', choices=SERVER_MODES, default='dev',
+                        help='运行模式，默认dev（Flask开发服务器）')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='监听端口')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='每个进程的工作线程数')
+    parser.add_argument('--processes', type=int, default=DEFAULT_PROCESSES,
+                        help='工作进程数（仅gunicorn模式）')
+    parser.add_argument('--no-browser', action='store_true', help='启动后不自动打开浏览器')
@@ -5,17 +5,38 @@
 
 import sys
 import os
+import argparse
 import threading
 import webbrowser
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
 import sqlite3
 import hashlib
 import secrets
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 import time
 import calendar
 
+import aggregation
+import budgets
+import categories
+import columnar
+import database
+import dates
+import http_cache
+import import_export
+import jobs
+import ledger
+import metrics
+import migrations
+import report_cache
+import search
+import server
+import slow_query
+from database import get_db
+from http_cache import conditional_get
+from money import from_cents, to_cents
+
 # 设置当前工作目录
 if getattr(sys, 'frozen', False):
     # 如果是打包后的可执行文件
@@ -31,11 +52,23 @@ app = Flask(__name__, template_folder=template_dir)
 app.secret_key = 'desktop-finance-app-secret-2024'
 app.config['SESSION_PERMANENT'] = False
 app.config['SESSION_TYPE'] = 'filesystem'
+# 后台任务只保存在本进程内，多进程部署时报告页面和接口都改为同步生成
+app.config['ASYNC_REPORTS'] = True
+database.init_app(app)
+metrics.init_app(app)
+slow_query.init_app(app)
+http_cache.init_app(app)
 
 # 数据库初始化
 def init_database():
     """初始化数据库"""
-    conn = sqlite3.connect('finance_system.db')
+    with database.connection(app.config['DATABASE']) as conn:
+        _create_tables(conn)
+        migrations.migrate(conn)
+
+
+def _create_tables(conn):
+    """创建基础表和默认测试用户"""
     cursor = conn.cursor()
     
     # 创建用户表
@@ -76,7 +109,6 @@ def init_database():
         ''', ('testuser', password_hash, 'test@example.com'))
     
     conn.commit()
-    conn.close()
 
 # 密码加密
 def hash_password(password):
@@ -98,11 +130,10 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        conn = sqlite3.connect('finance_system.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT id, password FROM users WHERE username = ?', (username,))
         user = cursor.fetchone()
-        conn.close()
         
         if user and user[1] == hash_password(password):
             session['user_id'] = user[0]
@@ -126,14 +157,13 @@ def register():
             return render_template('register.html', error='用户名和密码不能为空')
         
         try:
-            conn = sqlite3.connect('finance_system.db')
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO users (username, password, email) 
                 VALUES (?, ?, ?)
             ''', (username, hash_password(password), email))
             conn.commit()
-            conn.close()
             return redirect('/login')
         except sqlite3.IntegrityError:
             return render_template('register.html', error='用户名已存在')
@@ -146,89 +176,353 @@ def logout():
     session.clear()
     return redirect('/login')
 
+# 分页查询每页最多返回的记录数
+MAX_PAGE_SIZE = 500
+
+
+def _date_filter(start_date, end_date):
+    """把可选的开始/结束日期（均含当天）转换为day列上左闭右开的SQL条件"""
+    return dates.range_conditions(start_date, end_date)
+
+
+def _parse_cursor(cursor):
+    """解析 "日期,id" 形式的翻页游标，返回 (day, date, id)"""
+    date_part, id_part = cursor.rsplit(',', 1)
+    return dates.to_day(date_part), date_part, int(id_part)
+
+
 @app.route('/api/records', methods=['GET'])
+@conditional_get
 def get_records():
-    """获取记录 - 修复数据加载异常，合并两个表的数据"""
+    """获取记录
+
+    不带参数时返回全部记录（兼容旧客户端）。支持以下查询参数:
+      limit       每页条数，最大 MAX_PAGE_SIZE
+      before      上一页响应头 X-Next-Cursor 中的游标，返回更早的记录
+      type        income / expense
+      category    分类
+      start_date  开始日期（含）YYYY-MM-DD
+      end_date    结束日期（含）YYYY-MM-DD
+      total       为1时在响应头 X-Total-Count 中返回符合筛选条件的总数
+    """
     if 'user_id' not in session:
         return jsonify([])
     
     try:
-        conn = sqlite3.connect('finance_system.db')
+        limit = request.args.get('limit')
+        before = request.args.get('before')
+        record_type = request.args.get('type')
+        category = request.args.get('category')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        conditions = ['user_id = ?']
+        params = [session['user_id']]
+        
+        if record_type:
+            conditions.append('type = ?')
+            params.append(record_type)
+        if category:
+            # 不存在的分类名称匹配不到任何记录
+            conditions.append('category_id = ?')
+            params.append(categories.lookup(get_db(), session['user_id']).by_name.get(category, 0))
+        date_conditions, date_params = _date_filter(start_date, end_date)
+        conditions += date_conditions
+        params += date_params
+        
+        # 总数不受翻页游标影响
+        filter_sql = ' AND '.join(conditions)
+        filter_params = list(params)
+        
+        if before:
+            conditions.append('(day, date, id) < (?, ?, ?)')
+            params.extend(_parse_cursor(before))
+        
+        if limit is not None:
+            limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'message': '查询参数格式错误'}), 400
+    
+    try:
+        conn = get_db()
         cursor = conn.cursor()
         
-        # 合并查询两个表的数据，避免数据分散问题
+        # 旧finance_records数据已合并到records表，按 (user_id, day, date, id) 索引倒序扫描
+        sql = f'''
+            SELECT id, amount_cents, category_id, type, description, date, source
+            FROM records WHERE {' AND '.join(conditions)}
+            ORDER BY day DESC, date DESC, id DESC
+        '''
+        if limit is not None:
+            # 多取一条用于判断是否还有下一页
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        
+        names = categories.lookup(conn, session['user_id']).names
         records = []
-        
-        # 查询records表
-        cursor.execute('''
-            SELECT id, amount, category, type, description, date 
-            FROM records WHERE user_id = ? ORDER BY date DESC
-        ''', (session['user_id'],))
-        
-        for row in cursor.fetchall():
+        for row in rows:
             records.append({
                 'id': row[0],
-                'amount': row[1],
-                'category': row[2],
+                'amount': from_cents(row[1]),
+                'category': names.get(row[2], ''),
                 'type': row[3],
                 'description': row[4],
                 'date': row[5],
-                'source': 'records'
+                'source': row[6]
             })
         
-        # 查询finance_records表并转换为相同格式
-        cursor.execute('''
-            SELECT id, amount, category, record_type, description, record_date, created_at
-            FROM finance_records WHERE user_id = ? ORDER BY record_date DESC
-        ''', (session['user_id'],))
+        response = jsonify(records[:limit] if limit is not None else records)
         
-        for row in cursor.fetchall():
-            records.append({
-                'id': row[0],
-                'amount': row[1],
-                'category': row[2],
-                'type': row[3],  # record_type -> type
-                'description': row[4],
-                'date': row[5],  # record_date -> date
-                'created_at': row[6],
-                'source': 'finance_records'
-            })
+        if limit is not None and len(records) > limit:
+            last = records[limit - 1]
+            response.headers['X-Next-Cursor'] = f"{last['date']},{last['id']}"
         
-        # 按日期排序
-        records.sort(key=lambda x: x['date'], reverse=True)
+        if request.args.get('total') == '1':
+            cursor.execute(f'SELECT COUNT(*) FROM records WHERE {filter_sql}', filter_params)
+            response.headers['X-Total-Count'] = str(cursor.fetchone()[0])
         
-        conn.close()
-        return jsonify(records)
+        return response
     except Exception as e:
         print(f"获取记录失败: {e}")
         return jsonify([])
 
 @app.route('/api/records', methods=['POST'])
 def add_record():
-    """添加记录"""
+    """添加记录
+
+    支出记录所属分类设置了预算时，返回 over_budget 及该月预算执行情况 budget。
+    """
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': '未登录'})
     
     data = request.get_json()
-    amount = data.get('amount')
     category = data.get('category')
     record_type = data.get('type')
     description = data.get('description', '')
     record_date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
     
     try:
-        conn = sqlite3.connect('finance_system.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO records (user_id, amount, category, type, description, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], amount, category, record_type, description, record_date))
+        amount = to_cents(data.get('amount'))
+        conn = get_db()
+        record_id = ledger.add_record(conn, session['user_id'], amount, category, record_type,
+                                      description, record_date)
+        # 在同一事务中读取，结果包含刚写入的这条记录
+        budget = budgets.record_status(conn, session['user_id'], record_id)
         conn.commit()
-        conn.close()
-        return jsonify({'success': True})
+        return jsonify({
+            'success': True,
+            'id': record_id,
+            'over_budget': bool(budget and budget['over_budget']),
+            'budget': budget
+        })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+# 批量接口单次最多处理的记录数
+MAX_BATCH_SIZE = 1000
+
+@app.route('/api/records/batch', methods=['POST'])
+def add_records_batch():
+    """批量添加记录
+
+    请求体为记录数组（或 {"records": [...]}），字段同添加记录接口。
+    全部记录在一个事务中写入；任意一条校验失败则都不写入，results中给出每条的结果。
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    data = request.get_json(silent=True)
+    items = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': '请提供记录数组'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'success': False, 'message': f'单次最多{MAX_BATCH_SIZE}条记录'}), 400
+    
+    today = datetime.now().strftime('%Y-%m-%d')
+    rows = []
+    results = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('记录必须是对象')
+            if not item.get('type'):
+                raise ValueError('类型必须是 income 或 expense')
+            rows.append(import_export.validate_row(dict(item, date=item.get('date') or today)))
+            results.append({'index': index, 'success': True})
+        except ValueError as e:
+            results.append({'index': index, 'success': False, 'message': str(e)})
+    
+    if len(rows) != len(items):
+        return jsonify({'success': False, 'message': '部分记录校验失败，未写入任何记录', 'results': results}), 400
+    
+    try:
+        conn = get_db()
+        ids = ledger.add_records(conn, session['user_id'], rows, return_ids=True)
+        conn.commit()
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'批量添加失败: {str(e)}'})
+    
+    for result, record_id in zip(results, ids):
+        result['id'] = record_id
+    return jsonify({'success': True, 'created': len(ids), 'results': results})
+
+@app.route('/api/records/batch', methods=['DELETE'])
+def delete_records_batch():
+    """批量删除记录，请求体为 {"ids": [...]}，在一个事务中删除"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    data = request.get_json(silent=True)
+    record_ids = data.get('ids') if isinstance(data, dict) else data
+    if not isinstance(record_ids, list) or not record_ids:
+        return jsonify({'success': False, 'message': '请提供记录id数组'}), 400
+    if len(record_ids) > MAX_BATCH_SIZE:
+        return jsonify({'success': False, 'message': f'单次最多{MAX_BATCH_SIZE}条记录'}), 400
+    if not all(isinstance(record_id, int) and not isinstance(record_id, bool) for record_id in record_ids):
+        return jsonify({'success': False, 'message': '记录id必须是整数'}), 400
+    
+    try:
+        conn = get_db()
+        deleted = ledger.delete_records(conn, session['user_id'], record_ids)
+        conn.commit()
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'批量删除失败: {str(e)}'})
+    
+    results = []
+    for record_id in record_ids:
+        if record_id in deleted:
+            results.append({'id': record_id, 'success': True})
+        else:
+            results.append({'id': record_id, 'success': False, 'message': '记录不存在或无权删除'})
+    return jsonify({'success': True, 'deleted': len(deleted), 'results': results})
+
+@app.route('/api/records/import', methods=['POST'])
+def import_records():
+    """批量导入记录
+
+    上传CSV或NDJSON文件（multipart字段file），或直接以请求体发送文件内容。
+    格式由format参数指定，否则按文件名或Content-Type判断。
+    CSV表头: date,type,category,amount,description（也支持中文表头）
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        fmt = request.args.get('format') or import_export.detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or import_export.detect_format(content_type=request.mimetype)
+    
+    if fmt not in import_export.SUPPORTED_FORMATS:
+        return jsonify({'success': False, 'message': f'不支持的格式: {fmt}'}), 400
+    
+    try:
+        conn = get_db()
+        result = import_export.import_records(conn, session['user_id'],
+                                              import_export.text_stream(stream), fmt)
+        return jsonify(result.to_dict())
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'导入失败: {str(e)}'})
+
+@app.route('/api/records/export')
+def export_records():
+    """流式导出记录
+
+    format为csv（默认）或ndjson，支持 start_date/end_date（均含当天）和 type 筛选。
+    数据从数据库游标分块读出后立即发送，不在内存中组装完整结果。
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in import_export.SUPPORTED_FORMATS:
+        return jsonify({'success': False, 'message': f'不支持的格式: {fmt}'}), 400
+    
+    try:
+        conditions, params = _date_filter(request.args.get('start_date'),
+                                          request.args.get('end_date'))
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式错误'}), 400
+    
+    record_type = request.args.get('type')
+    if record_type:
+        conditions.append('type = ?')
+        params.append(record_type)
+    
+    user_id = session['user_id']
+    db_path = app.config['DATABASE']
+    
+    def generate():
+        # 使用独立连接，响应发送完毕（或客户端断开）时归还
+        with database.connection(db_path) as conn:
+            yield from import_export.iter_export(conn, user_id, fmt, conditions, params)
+    
+    if fmt == 'csv':
+        mimetype, filename = 'text/csv', 'records.csv'
+    else:
+        mimetype, filename = 'application/x-ndjson', 'records.ndjson'
+    
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+@app.route('/api/records/search')
+@conditional_get
+def search_records():
+    """按描述和分类搜索记录
+
+    查询参数:
+      q           搜索词，多个词用空格分隔，需同时匹配（按子串匹配，支持中文）
+      type        income / expense
+      start_date  开始日期（含）YYYY-MM-DD
+      end_date    结束日期（含）YYYY-MM-DD
+      limit       每页条数，默认20，最大 search.MAX_LIMIT
+      offset      跳过的条数
+    结果按相关度排序，相关度相同时按日期倒序。
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': '请输入搜索内容'}), 400
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), search.MAX_LIMIT))
+        offset = max(0, int(request.args.get('offset', 0)))
+        total, rows = search.search_records(
+            get_db(), session['user_id'], query,
+            record_type=request.args.get('type'),
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date'),
+            limit=limit, offset=offset)
+    except ValueError:
+        return jsonify({'success': False, 'message': '查询参数格式错误'}), 400
+    
+    names = categories.lookup(get_db(), session['user_id']).names
+    records = [{
+        'id': row[0],
+        'amount': from_cents(row[1]),
+        'category': names.get(row[2], ''),
+        'type': row[3],
+        'description': row[4],
+        'date': row[5],
+        'source': row[6]
+    } for row in rows]
+    
+    return jsonify({
+        'success': True,
+        'query': query,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'records': records
+    })
+
 @app.route('/api/records/<int:record_id>', methods=['DELETE'])
 def delete_record(record_id):
     """删除记录"""
@@ -236,118 +530,266 @@ def delete_record(record_id):
         return jsonify({'success': False, 'message': '未登录'})
     
     try:
-        conn = sqlite3.connect('finance_system.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM records WHERE id = ? AND user_id = ?', 
-                      (record_id, session['user_id']))
+        conn = get_db()
+        ledger.delete_record(conn, session['user_id'], record_id)
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 @app.route('/api/summary')
+@conditional_get
 def get_summary():
-    """获取汇总数据 - 修复数据加载异常，合并两个表的数据"""
+    """获取汇总数据"""
     if 'user_id' not in session:
         return jsonify({'income': 0, 'expense': 0, 'balance': 0})
     
-    conn = sqlite3.connect('finance_system.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # 总收入 - 合并两个表
-    cursor.execute('SELECT SUM(amount) FROM records WHERE user_id = ? AND type = "income"', 
-                  (session['user_id'],))
-    income_records = cursor.fetchone()[0] or 0
-    
-    cursor.execute('SELECT SUM(amount) FROM finance_records WHERE user_id = ? AND record_type = "income"', 
-                  (session['user_id'],))
-    income_finance_records = cursor.fetchone()[0] or 0
-    
-    # 总支出 - 合并两个表
-    cursor.execute('SELECT SUM(amount) FROM records WHERE user_id = ? AND type = "expense"', 
-                  (session['user_id'],))
-    expense_records = cursor.fetchone()[0] or 0
-    
-    cursor.execute('SELECT SUM(amount) FROM finance_records WHERE user_id = ? AND record_type = "expense"', 
-                  (session['user_id'],))
-    expense_finance_records = cursor.fetchone()[0] or 0
-    
-    total_income = income_records + income_finance_records
-    total_expense = expense_records + expense_finance_records
+    # 从月度汇总表按类型求和，与账本大小无关
+    cursor.execute('''
+        SELECT type, SUM(total_cents) FROM monthly_rollups
+        WHERE user_id = ? GROUP BY type
+    ''', (session['user_id'],))
+    totals = dict(cursor.fetchall())
     
-    conn.close()
+    total_income = totals.get('income') or 0
+    total_expense = totals.get('expense') or 0
     
     return jsonify({
-        'income': total_income,
-        'expense': total_expense,
-        'balance': total_income - total_expense
+        'income': from_cents(total_income),
+        'expense': from_cents(total_expense),
+        'balance': from_cents(total_income - total_expense)
     })
 
+# 月度趋势最多返回的月份数
+MAX_TREND_MONTHS = 60
+
+
+def _shift_month(year, month, offset):
+    """按日历月份偏移，返回 (年, 月)"""
+    index = year * 12 + (month - 1) + offset
+    return index // 12, index % 12 + 1
+
+
 @app.route('/api/monthly-data')
+@conditional_get
 def get_monthly_data():
-    """获取月度数据 - 修复数据加载异常，合并两个表的数据"""
+    """获取月度数据，months参数指定包含本月在内的最近月份数（默认6）"""
     if 'user_id' not in session:
         return jsonify([])
     
-    conn = sqlite3.connect('finance_system.db')
-    cursor = conn.cursor()
+    try:
+        count = int(request.args.get('months', 6))
+    except ValueError:
+        return jsonify({'success': False, 'message': '月份数格式错误'}), 400
+    count = max(1, min(count, MAX_TREND_MONTHS))
     
-    # 获取最近6个月的数据
+    # 按日历月份生成最近几个月
+    now = datetime.now()
     months = []
-    for i in range(5, -1, -1):
-        month = (datetime.now() - timedelta(days=30*i)).strftime('%Y-%m')
-        months.append(month)
+    for offset in range(1 - count, 1):
+        year, month = _shift_month(now.year, now.month, offset)
+        months.append(f"{year}-{month:02d}")
+    next_year, next_month = _shift_month(now.year, now.month, 1)
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    # 在月度汇总表的主键上做一次左闭右开的范围扫描
+    cursor.execute('''
+        SELECT month,
+            SUM(CASE WHEN type = 'income' THEN total_cents ELSE 0 END),
+            SUM(CASE WHEN type = 'expense' THEN total_cents ELSE 0 END)
+        FROM monthly_rollups
+        WHERE user_id = ? AND month >= ? AND month < ?
+        GROUP BY month
+    ''', (session['user_id'], months[0], f"{next_year}-{next_month:02d}"))
+    
+    totals = {month: (income, expense) for month, income, expense in cursor.fetchall()}
     
     monthly_data = []
     for month in months:
-        # 查询records表
-        cursor.execute('''
-            SELECT 
-                SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END),
-                SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END)
-            FROM records 
-            WHERE user_id = ? AND strftime('%Y-%m', date) = ?
-        ''', (session['user_id'], month))
-        
-        result_records = cursor.fetchone()
-        income_records = result_records[0] or 0
-        expense_records = result_records[1] or 0
-        
-        # 查询finance_records表
-        cursor.execute('''
-            SELECT 
-                SUM(CASE WHEN record_type = 'income' THEN amount ELSE 0 END),
-                SUM(CASE WHEN record_type = 'expense' THEN amount ELSE 0 END)
-            FROM finance_records 
-            WHERE user_id = ? AND strftime('%Y-%m', record_date) = ?
-        ''', (session['user_id'], month))
-        
-        result_finance_records = cursor.fetchone()
-        income_finance_records = result_finance_records[0] or 0
-        expense_finance_records = result_finance_records[1] or 0
-        
-        # 合并两个表的数据
-        total_income = income_records + income_finance_records
-        total_expense = expense_records + expense_finance_records
+        total_income, total_expense = totals.get(month, (0, 0))
         
         monthly_data.append({
             'month': month,
-            'income': total_income,
-            'expense': total_expense,
-            'balance': total_income - total_expense
+            'income': from_cents(total_income),
+            'expense': from_cents(total_expense),
+            'balance': from_cents(total_income - total_expense)
         })
     
-    conn.close()
     return jsonify(monthly_data)
 
+@app.route('/api/charts/category')
+@conditional_get
+def get_category_chart():
+    """分类图表数据，在数据库中按类型和分类分组求和"""
+    if 'user_id' not in session:
+        return jsonify({'income': [], 'expense': []})
+    
+    try:
+        conditions, params = _date_filter(request.args.get('start_date'),
+                                          request.args.get('end_date'))
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式错误'}), 400
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    if conditions:
+        cursor.execute(f'''
+            SELECT type, category_id, SUM(amount_cents) AS total
+            FROM records WHERE {' AND '.join(['user_id = ?'] + conditions)}
+            GROUP BY type, category_id
+            ORDER BY total DESC
+        ''', [session['user_id']] + params)
+    else:
+        # 不限日期时直接使用月度汇总表
+        cursor.execute('''
+            SELECT type, category_id, SUM(total_cents) AS total
+            FROM monthly_rollups WHERE user_id = ?
+            GROUP BY type, category_id
+            ORDER BY total DESC
+        ''', (session['user_id'],))
+    rows = cursor.fetchall()
+    
+    names = categories.lookup(conn, session['user_id']).names
+    chart_data = {'income': [], 'expense': []}
+    for record_type, category_id, total in rows:
+        if record_type in chart_data:
+            chart_data[record_type].append({'category': names.get(category_id, ''),
+                                            'amount': from_cents(total)})
+    
+    return jsonify(chart_data)
+
+@app.route('/api/charts/daily')
+@conditional_get
+def get_daily_chart():
+    """每日收支图表数据，在数据库中按天分组求和"""
+    if 'user_id' not in session:
+        return jsonify({'dates': [], 'income': [], 'expense': []})
+    
+    try:
+        conditions, params = _date_filter(request.args.get('start_date'),
+                                          request.args.get('end_date'))
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式错误'}), 400
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT 
+            day,
+            SUM(CASE WHEN type = 'income' THEN amount_cents ELSE 0 END),
+            SUM(CASE WHEN type = 'expense' THEN amount_cents ELSE 0 END)
+        FROM records WHERE {' AND '.join(['user_id = ?'] + conditions)}
+        GROUP BY day
+        ORDER BY day
+    ''', [session['user_id']] + params)
+    
+    chart_data = {'dates': [], 'income': [], 'expense': []}
+    for day, income, expense in cursor.fetchall():
+        chart_data['dates'].append(dates.from_day(day))
+        chart_data['income'].append(from_cents(income))
+        chart_data['expense'].append(from_cents(expense))
+    
+    return jsonify(chart_data)
+
 @app.route('/api/categories')
 def get_categories():
-    """获取分类"""
-    return jsonify({
-        'income': ['工资', '奖金', '投资', '其他收入'],
-        'expense': ['餐饮', '交通', '购物', '娱乐', '医疗', '教育', '住房', '其他支出']
-    })
+    """获取分类
+
+    默认返回未归档分类的名称 {'income': [...], 'expense': [...]}，按显示顺序排列；
+    detail=1 时返回包含归档分类在内的完整信息列表（id、名称、类型、顺序、是否归档、是否自定义）。
+    """
+    category_set = categories.lookup(get_db(), session.get('user_id'))
+    if request.args.get('detail') == '1':
+        return jsonify({'success': True, 'categories': category_set.ordered(include_archived=True)})
+    return jsonify(category_set.listing())
+
+@app.route('/api/categories', methods=['POST'])
+def create_category():
+    """添加自定义分类，参数: name, type, sort_order（可选）"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        conn = get_db()
+        category_id = categories.create(conn, session['user_id'], data.get('name'),
+                                        data.get('type'), data.get('sort_order'))
+        conn.commit()
+        return jsonify({'success': True, 'id': category_id})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/api/categories/<int:category_id>', methods=['PATCH', 'PUT'])
+def update_category(category_id):
+    """修改自定义分类，参数均可选: name（改名）, sort_order, archived
+
+    全局默认分类不能修改。改名后已有记录显示新名称，报告和分析缓存随之失效。
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        conn = get_db()
+        user_id = session['user_id']
+        if not categories.update(conn, user_id, category_id, name=data.get('name'),
+                                 sort_order=data.get('sort_order'), archived=data.get('archived')):
+            return jsonify({'success': False, 'message': '分类不存在或不能修改'}), 404
+        if data.get('name') is not None:
+            ledger.touch_all(conn, user_id)
+        conn.commit()
+        return jsonify({'success': True})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/api/budgets')
+def get_budgets():
+    """各分类预算在某月的执行情况（month 为 YYYY-MM，默认当月），已支出金额取自月度汇总，不扫描记录"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    try:
+        month = budgets.parse_month(request.args.get('month'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify(dict(budgets.list_status(get_db(), session['user_id'], month),
+                        success=True, month=month))
+
+@app.route('/api/budgets', methods=['POST', 'PUT'])
+def set_budget():
+    """设置支出分类的每月预算，参数: category（分类名称）, amount（元）；已有预算时覆盖"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        conn = get_db()
+        category_id = budgets.set_budget(conn, session['user_id'], data.get('category'),
+                                         to_cents(data.get('amount')))
+        status = budgets.category_status(conn, session['user_id'], category_id,
+                                         budgets.parse_month(data.get('month')))
+        conn.commit()
+        return jsonify({'success': True, 'category_id': category_id, 'budget': status})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/api/budgets/<int:category_id>', methods=['DELETE'])
+def delete_budget(category_id):
+    """删除分类预算"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    conn = get_db()
+    if not budgets.delete_budget(conn, session['user_id'], category_id):
+        return jsonify({'success': False, 'message': '预算不存在'}), 404
+    conn.commit()
+    return jsonify({'success': True})
 
 # 报告相关API
 @app.route('/api/web/reports', methods=['GET'])
@@ -357,7 +799,7 @@ def get_reports_list():
         return jsonify([])
     
     try:
-        conn = sqlite3.connect('finance_system.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # 检查reports表是否存在
@@ -380,7 +822,6 @@ def get_reports_list():
                 'generated_at': row[4]
             })
         
-        conn.close()
         return jsonify(reports)
     except Exception as e:
         print(f"获取报告列表失败: {e}")
@@ -393,7 +834,7 @@ def get_report_content(report_id):
         return jsonify({})
     
     try:
-        conn = sqlite3.connect('finance_system.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -401,7 +842,6 @@ def get_report_content(report_id):
         ''', (report_id, session['user_id']))
         
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             return json.loads(result[0])
@@ -418,31 +858,144 @@ def delete_report(report_id):
         return jsonify({'success': False, 'message': '未登录'})
     
     try:
-        conn = sqlite3.connect('finance_system.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # 检查报告是否存在且属于当前用户
         cursor.execute('''
-            SELECT id FROM reports WHERE id = ? AND user_id = ?
+            SELECT report_type, period FROM reports WHERE id = ? AND user_id = ?
         ''', (report_id, session['user_id']))
         
-        if not cursor.fetchone():
-            conn.close()
+        report = cursor.fetchone()
+        if not report:
             return jsonify({'success': False, 'message': '报告不存在或无权删除'})
         
         # 删除报告
         cursor.execute('DELETE FROM reports WHERE id = ? AND user_id = ?', 
                       (report_id, session['user_id']))
         conn.commit()
-        conn.close()
+        report_cache.cache.invalidate_period(session['user_id'], report[0], report[1])
         
         return jsonify({'success': True, 'message': '报告删除成功'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'删除报告失败: {str(e)}'})
 
+def _save_report(cursor, user_id, report_type, period, title, report_content, data_version):
+    """保存生成的报告，返回内容序列化后的字节数"""
+    content = json.dumps(report_content, ensure_ascii=False)
+    generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute('''
+        INSERT INTO reports (user_id, report_type, period, title, content, generated_at, data_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, report_type, period, title, content, generated_at, data_version))
+    return len(content.encode('utf-8'))
+
+def _cached_report(conn, user_id, report_type, period, title, build):
+    """取出与当前数据版本一致的报告，没有时调用build生成并保存
+
+    先查进程内缓存，再查reports表中同一数据版本的已保存报告，都没有才重新计算，
+    避免重复生成相同内容的报告记录。数据版本在计算前读取，期间若有写入只会让缓存
+    提前失效，不会把旧内容挂在新版本下。
+    """
+    version = report_cache.period_version(conn, user_id, report_type, period)
+    
+    report_content = report_cache.cache.get(user_id, report_type, period, version)
+    if report_content is not None:
+        return report_content
+    
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT content FROM reports
+        WHERE user_id = ? AND report_type = ? AND period = ? AND data_version = ?
+        ORDER BY id DESC LIMIT 1
+    ''', (user_id, report_type, period, version))
+    row = cursor.fetchone()
+    
+    if row:
+        report_content = json.loads(row[0])
+        size = len(row[0].encode('utf-8'))
+    else:
+        report_content = build()
+        size = _save_report(cursor, user_id, report_type, period, title, report_content, version)
+        conn.commit()
+    
+    report_cache.cache.put(user_id, report_type, period, version, report_content, size)
+    return report_content
+
+def build_monthly_report(conn, user_id, year, month):
+    """生成（或取出已缓存的）月度报告内容"""
+    start_date = f"{year}-{month:02d}-01"
+    last_day = calendar.monthrange(year, month)[1]
+    end_date = f"{year}-{month:02d}-{last_day}"
+    
+    def build():
+        stats = aggregation.aggregate_period(conn, user_id, start_date, end_date, top_n=5)
+        return {
+            'summary': {
+                'income': stats.income,
+                'expense': stats.expense,
+                'balance': stats.balance,
+                'records_count': stats.records_count
+            },
+            'category_stats': stats.category_stats(),
+            'top_expenses': stats.top_records('expense'),
+            'top_incomes': stats.top_records('income')
+        }
+    
+    return _cached_report(conn, user_id, 'monthly', f"{year}-{month:02d}",
+                          f"{year}年{month}月财务报告", build)
+
+def build_yearly_report(conn, user_id, year):
+    """生成（或取出已缓存的）年度报告内容"""
+    start_date = f"{year}-01-01"
+    end_date = f"{year}-12-31"
+    
+    def build():
+        stats = aggregation.aggregate_period(conn, user_id, start_date, end_date, top_n=10)
+        return {
+            'summary': {
+                'income': stats.income,
+                'expense': stats.expense,
+                'balance': stats.balance,
+                'records_count': stats.records_count
+            },
+            'category_stats': stats.category_stats(),
+            'monthly_trend': stats.monthly_trend([f"{year}-{month:02d}" for month in range(1, 13)]),
+            'top_expenses': stats.top_records('expense'),
+            'top_incomes': stats.top_records('income')
+        }
+    
+    return _cached_report(conn, user_id, 'yearly', f"{year}", f"{year}年度财务报告", build)
+
+def _submit_report_job(job_type, build, *args):
+    """把报告生成提交到后台任务，任务使用独立的数据库连接"""
+    user_id = session['user_id']
+    db_path = app.config['DATABASE']
+    message = '月度报告生成成功' if job_type == 'monthly_report' else '年度报告生成成功'
+    
+    def run():
+        with database.connection(db_path) as conn:
+            report_content = build(conn, user_id, *args)
+        return {'success': True, 'message': message, 'report': report_content}
+    
+    try:
+        job = jobs.manager.submit(user_id, job_type, run)
+    except jobs.QueueFullError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    
+    return jsonify({
+        'success': True,
+        'message': '报告已提交后台生成',
+        'job_id': job.id,
+        'status': job.status
+    }), 202
+
 @app.route('/api/web/reports/monthly', methods=['POST'])
 def generate_monthly_report():
-    """生成月度报告"""
+    """生成月度报告，请求中 async 为 true 时提交后台任务并立即返回任务id
+
+    多进程部署时任务状态不在进程间共享，忽略 async 并同步生成。
+    """
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': '未登录'})
     
@@ -451,115 +1004,10 @@ def generate_monthly_report():
         year = data.get('year', datetime.now().year)
         month = data.get('month', datetime.now().month)
         
-        # 获取月度数据
-        start_date = f"{year}-{month:02d}-01"
-        last_day = calendar.monthrange(year, month)[1]
-        end_date = f"{year}-{month:02d}-{last_day}"
-        
-        conn = sqlite3.connect('finance_system.db')
-        cursor = conn.cursor()
-        
-        # 获取记录
-        records = []
-        
-        # 查询records表
-        cursor.execute('''
-            SELECT amount, category, type, description, date 
-            FROM records WHERE user_id = ? AND date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
-        
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 查询finance_records表
-        cursor.execute('''
-            SELECT amount, category, record_type, description, record_date 
-            FROM finance_records WHERE user_id = ? AND record_date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
+        if data.get('async') and app.config['ASYNC_REPORTS']:
+            return _submit_report_job('monthly_report', build_monthly_report, year, month)
         
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 计算汇总
-        income = sum(r['amount'] for r in records if r['type'] == 'income')
-        expense = sum(r['amount'] for r in records if r['type'] == 'expense')
-        balance = income - expense
-        
-        # 分类统计
-        category_stats = {}
-        for record in records:
-            category = record['category']
-            if category not in category_stats:
-                category_stats[category] = {'income': 0, 'expense': 0}
-            
-            if record['type'] == 'income':
-                category_stats[category]['income'] += record['amount']
-            else:
-                category_stats[category]['expense'] += record['amount']
-        
-        # 大额记录
-        top_expenses = sorted(
-            [r for r in records if r['type'] == 'expense'],
-            key=lambda x: x['amount'],
-            reverse=True
-        )[:5]
-        
-        top_incomes = sorted(
-            [r for r in records if r['type'] == 'income'],
-            key=lambda x: x['amount'],
-            reverse=True
-        )[:5]
-        
-        # 生成报告内容
-        report_content = {
-            'summary': {
-                'income': income,
-                'expense': expense,
-                'balance': balance,
-                'records_count': len(records)
-            },
-            'category_stats': category_stats,
-            'top_expenses': top_expenses,
-            'top_incomes': top_incomes
-        }
-        
-        # 保存报告
-        report_title = f"{year}年{month}月财务报告"
-        generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 确保reports表存在
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                report_type TEXT NOT NULL,
-                period TEXT NOT NULL,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                generated_at TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        cursor.execute('''
-            INSERT INTO reports (user_id, report_type, period, title, content, generated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], 'monthly', f"{year}-{month:02d}", report_title, json.dumps(report_content, ensure_ascii=False), generated_at))
-        
-        conn.commit()
-        conn.close()
+        report_content = build_monthly_report(get_db(), session['user_id'], year, month)
         
         return jsonify({
             'success': True,
@@ -572,7 +1020,10 @@ def generate_monthly_report():
 
 @app.route('/api/web/reports/yearly', methods=['POST'])
 def generate_yearly_report():
-    """生成年度报告"""
+    """生成年度报告，请求中 async 为 true 时提交后台任务并立即返回任务id
+
+    多进程部署时任务状态不在进程间共享，忽略 async 并同步生成。
+    """
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': '未登录'})
     
@@ -580,131 +1031,10 @@ def generate_yearly_report():
         data = request.get_json()
         year = data.get('year', datetime.now().year)
         
-        # 获取年度数据
-        start_date = f"{year}-01-01"
-        end_date = f"{year}-12-31"
+        if data.get('async') and app.config['ASYNC_REPORTS']:
+            return _submit_report_job('yearly_report', build_yearly_report, year)
         
-        conn = sqlite3.connect('finance_system.db')
-        cursor = conn.cursor()
-        
-        # 获取记录
-        records = []
-        
-        # 查询records表
-        cursor.execute('''
-            SELECT amount, category, type, description, date 
-            FROM records WHERE user_id = ? AND date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
-        
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 查询finance_records表
-        cursor.execute('''
-            SELECT amount, category, record_type, description, record_date 
-            FROM finance_records WHERE user_id = ? AND record_date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
-        
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 计算汇总
-        income = sum(r['amount'] for r in records if r['type'] == 'income')
-        expense = sum(r['amount'] for r in records if r['type'] == 'expense')
-        balance = income - expense
-        
-        # 分类统计
-        category_stats = {}
-        for record in records:
-            category = record['category']
-            if category not in category_stats:
-                category_stats[category] = {'income': 0, 'expense': 0}
-            
-            if record['type'] == 'income':
-                category_stats[category]['income'] += record['amount']
-            else:
-                category_stats[category]['expense'] += record['amount']
-        
-        # 月度趋势
-        monthly_trend = []
-        for month in range(1, 13):
-            month_start = f"{year}-{month:02d}-01"
-            month_end = f"{year}-{month:02d}-{calendar.monthrange(year, month)[1]}"
-            
-            month_income = sum(r['amount'] for r in records if r['type'] == 'income' and month_start <= r['date'] <= month_end)
-            month_expense = sum(r['amount'] for r in records if r['type'] == 'expense' and month_start <= r['date'] <= month_end)
-            
-            monthly_trend.append({
-                'month': f"{year}-{month:02d}",
-                'income': month_income,
-                'expense': month_expense,
-                'balance': month_income - month_expense
-            })
-        
-        # 大额记录
-        top_expenses = sorted(
-            [r for r in records if r['type'] == 'expense'],
-            key=lambda x: x['amount'],
-            reverse=True
-        )[:10]
-        
-        top_incomes = sorted(
-            [r for r in records if r['type'] == 'income'],
-            key=lambda x: x['amount'],
-            reverse=True
-        )[:10]
-        
-        # 生成报告内容
-        report_content = {
-            'summary': {
-                'income': income,
-                'expense': expense,
-                'balance': balance,
-                'records_count': len(records)
-            },
-            'category_stats': category_stats,
-            'monthly_trend': monthly_trend,
-            'top_expenses': top_expenses,
-            'top_incomes': top_incomes
-        }
-        
-        # 保存报告
-        report_title = f"{year}年度财务报告"
-        generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 确保reports表存在
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                report_type TEXT NOT NULL,
-                period TEXT NOT NULL,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                generated_at TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        cursor.execute('''
-            INSERT INTO reports (user_id, report_type, period, title, content, generated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], 'yearly', f"{year}", report_title, json.dumps(report_content, ensure_ascii=False), generated_at))
-        
-        conn.commit()
-        conn.close()
+        report_content = build_yearly_report(get_db(), session['user_id'], year)
         
         return jsonify({
             'success': True,
@@ -715,8 +1045,34 @@ def generate_yearly_report():
     except Exception as e:
         return jsonify({'success': False, 'message': f'生成年度报告失败: {str(e)}'})
 
+# 后台任务API
+@app.route('/api/web/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务状态，完成后包含结果"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    job = jobs.manager.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/web/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消后台任务"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    job = jobs.manager.cancel(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
+
 # 数据分析API
 @app.route('/api/web/analysis/time-range')
+@conditional_get
 def time_range_analysis():
     """时间范围分析"""
     if 'user_id' not in session:
@@ -729,86 +1085,13 @@ def time_range_analysis():
         if not start_date or not end_date:
             return jsonify({'success': False, 'message': '请提供开始日期和结束日期'})
         
-        conn = sqlite3.connect('finance_system.db')
-        cursor = conn.cursor()
-        
-        # 获取记录
-        records = []
-        
-        # 查询records表
-        cursor.execute('''
-            SELECT amount, category, type, description, date 
-            FROM records WHERE user_id = ? AND date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
-        
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 查询finance_records表
-        cursor.execute('''
-            SELECT amount, category, record_type, description, record_date 
-            FROM finance_records WHERE user_id = ? AND record_date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
-        
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 按日期分组
-        daily_data = {}
-        for record in records:
-            date_key = record['date'][:10]
-            if date_key not in daily_data:
-                daily_data[date_key] = {'income': 0, 'expense': 0}
-            
-            if record['type'] == 'income':
-                daily_data[date_key]['income'] += record['amount']
-            else:
-                daily_data[date_key]['expense'] += record['amount']
-        
-        # 按分类统计
-        category_data = {}
-        for record in records:
-            category = record['category']
-            if category not in category_data:
-                category_data[category] = {'income': 0, 'expense': 0}
-            
-            if record['type'] == 'income':
-                category_data[category]['income'] += record['amount']
-            else:
-                category_data[category]['expense'] += record['amount']
+        conn = get_db()
+        stats = columnar.engine.aggregate_period(conn, session['user_id'], start_date, end_date, top_n=10)
         
         # 计算统计指标
-        total_income = sum(r['amount'] for r in records if r['type'] == 'income')
-        total_expense = sum(r['amount'] for r in records if r['type'] == 'expense')
-        avg_daily_income = total_income / len(daily_data) if daily_data else 0
-        avg_daily_expense = total_expense / len(daily_data) if daily_data else 0
-        
-        # 大额记录
-        top_incomes = sorted(
-            [r for r in records if r['type'] == 'income'],
-            key=lambda x: x['amount'],
-            reverse=True
-        )[:10]
-        
-        top_expenses = sorted(
-            [r for r in records if r['type'] == 'expense'],
-            key=lambda x: x['amount'],
-            reverse=True
-        )[:10]
-        
-        conn.close()
+        days_count = len(stats.daily)
+        avg_daily_income = stats.income / days_count if days_count else 0
+        avg_daily_expense = stats.expense / days_count if days_count else 0
         
         return jsonify({
             'success': True,
@@ -817,19 +1100,19 @@ def time_range_analysis():
                 'end_date': end_date
             },
             'summary': {
-                'total_income': total_income,
-                'total_expense': total_expense,
-                'balance': total_income - total_expense,
-                'records_count': len(records),
-                'days_count': len(daily_data),
+                'total_income': stats.income,
+                'total_expense': stats.expense,
+                'balance': stats.balance,
+                'records_count': stats.records_count,
+                'days_count': days_count,
                 'avg_daily_income': avg_daily_income,
                 'avg_daily_expense': avg_daily_expense
             },
-            'daily_data': daily_data,
-            'category_data': category_data,
+            'daily_data': stats.daily_stats(),
+            'category_data': stats.category_stats(),
             'top_records': {
-                'incomes': top_incomes,
-                'expenses': top_expenses
+                'incomes': stats.top_records('income'),
+                'expenses': stats.top_records('expense')
             }
         })
         
@@ -837,6 +1120,7 @@ def time_range_analysis():
         return jsonify({'success': False, 'message': f'时间范围分析失败: {str(e)}'})
 
 @app.route('/api/web/analysis/category')
+@conditional_get
 def category_analysis():
     """分类分析"""
     if 'user_id' not in session:
@@ -849,76 +1133,25 @@ def category_analysis():
         if not start_date or not end_date:
             return jsonify({'success': False, 'message': '请提供开始日期和结束日期'})
         
-        conn = sqlite3.connect('finance_system.db')
-        cursor = conn.cursor()
-        
-        # 获取记录
-        records = []
-        
-        # 查询records表
-        cursor.execute('''
-            SELECT amount, category, type, description, date 
-            FROM records WHERE user_id = ? AND date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
-        
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 查询finance_records表
-        cursor.execute('''
-            SELECT amount, category, record_type, description, record_date 
-            FROM finance_records WHERE user_id = ? AND record_date BETWEEN ? AND ?
-        ''', (session['user_id'], start_date, end_date))
-        
-        for row in cursor.fetchall():
-            records.append({
-                'amount': row[0],
-                'category': row[1],
-                'type': row[2],
-                'description': row[3],
-                'date': row[4]
-            })
-        
-        # 分类统计
-        category_stats = {}
-        for record in records:
-            category = record['category']
-            if category not in category_stats:
-                category_stats[category] = {
-                    'income': 0,
-                    'expense': 0,
-                    'count': 0
-                }
-            
-            category_stats[category]['count'] += 1
-            
-            if record['type'] == 'income':
-                category_stats[category]['income'] += record['amount']
-            else:
-                category_stats[category]['expense'] += record['amount']
+        conn = get_db()
+        stats = columnar.engine.aggregate_period(conn, session['user_id'], start_date, end_date, top_n=0)
+        category_stats = stats.category_stats(with_count=True)
         
-        # 计算占比
-        total_income = sum(stats['income'] for stats in category_stats.values())
-        total_expense = sum(stats['expense'] for stats in category_stats.values())
+        # 计算占比（按整数分求和）
+        total_income = sum(item['income'] for item in stats.categories.values())
+        total_expense = sum(item['expense'] for item in stats.categories.values())
         
-        for category, stats in category_stats.items():
+        for category_id, cents in stats.categories.items():
+            item = category_stats[stats.category_name(category_id)]
             if total_income > 0:
-                stats['income_percentage'] = (stats['income'] / total_income) * 100
+                item['income_percentage'] = (cents['income'] / total_income) * 100
             else:
-                stats['income_percentage'] = 0
+                item['income_percentage'] = 0
             
             if total_expense > 0:
-                stats['expense_percentage'] = (stats['expense'] / total_expense) * 100
+                item['expense_percentage'] = (cents['expense'] / total_expense) * 100
             else:
-                stats['expense_percentage'] = 0
-        
-        conn.close()
+                item['expense_percentage'] = 0
         
         return jsonify({
             'success': True,
@@ -927,10 +1160,10 @@ def category_analysis():
                 'end_date': end_date
             },
             'summary': {
-                'total_income': total_income,
-                'total_expense': total_expense,
-                'balance': total_income - total_expense,
-                'records_count': len(records)
+                'total_income': from_cents(total_income),
+                'total_expense': from_cents(total_expense),
+                'balance': from_cents(total_income - total_expense),
+                'records_count': stats.records_count
             },
             'category_stats': category_stats
         })
@@ -938,6 +1171,44 @@ def category_analysis():
     except Exception as e:
         return jsonify({'success': False, 'message': f'分类分析失败: {str(e)}'})
 
+@app.route('/api/diagnostics/slow-queries')
+def get_slow_queries():
+    """最近的慢查询及其执行计划
+
+    记录包含所有用户的SQL，只在开启 SLOW_QUERY_ENDPOINT（--slow-query-endpoint）时可用。
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    if not app.config['SLOW_QUERY_ENDPOINT']:
+        return jsonify({'success': False, 'message': '慢查询诊断接口未开启'}), 404
+    
+    try:
+        limit = int(request.args.get('limit', slow_query.RECENT_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit必须是整数'}), 400
+    
+    return jsonify({
+        'success': True,
+        'threshold_ms': slow_query.log.threshold_ms,
+        'queries': slow_query.log.recent(max(limit, 0))
+    })
+
+@app.route('/ready')
+def ready():
+    """就绪检查：服务未在退出且数据库可用时返回200"""
+    if not server.is_ready():
+        return jsonify({'status': 'stopping'}), 503
+    try:
+        get_db().execute('SELECT 1').fetchone()
+    except Exception as e:
+        return jsonify({'status': 'unavailable', 'message': str(e)}), 503
+    return jsonify({'status': 'ok'})
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus格式的请求耗时、SQL统计和缓存指标"""
+    return Response(metrics.metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/reports')
 def reports():
     """报告页面"""
@@ -950,39 +1221,79 @@ def reports():
     
     return render_template('reports.html', 
                          current_month=current_month, 
-                         current_year=current_year)
+                         current_year=current_year,
+                         async_reports=app.config['ASYNC_REPORTS'])
 
-def open_browser():
+def open_browser(url='http://127.0.0.1:5000'):
     """打开浏览器"""
     time.sleep(3)  # 等待服务启动
-    webbrowser.open('http://127.0.0.1:5000')
+    webbrowser.open(url)
 
-def main():
+def main(argv=None):
     """主函数"""
+    parser = argparse.ArgumentParser(description='智能记账客户端')
+    server.add_arguments(parser)
+    parser.add_argument('--db', default=app.config['DATABASE'], help='数据库文件')
+    parser.add_argument('--db-pool-size', type=int,
+                        help='数据库连接池大小，默认与线程数相同（至少8）')
+    parser.add_argument('--journal-mode', choices=database.JOURNAL_MODES,
+                        default=app.config['DB_JOURNAL_MODE'], help='SQLite日志模式，默认WAL')
+    parser.add_argument('--slow-query-ms', type=float, default=app.config['SLOW_QUERY_MS'],
+                        help='慢查询阈值（毫秒），0表示关闭')
+    parser.add_argument('--slow-query-log', default=app.config['SLOW_QUERY_LOG'],
+                        help='慢查询日志文件')
+    parser.add_argument('--slow-query-endpoint', action='store_true',
+                        help='开放慢查询诊断接口（可看到所有用户的SQL，仅用于诊断）')
+    args = parser.parse_args(argv)
+    
     print("=" * 50)
     print("💰 智能记账客户端 - 简化桌面版")
     print("=" * 50)
     
+    app.config['DATABASE'] = args.db
+    app.config['DB_JOURNAL_MODE'] = args.journal_mode
+    # 每个工作线程都可能同时持有一个数据库连接
+    app.config['DB_POOL_SIZE'] = args.db_pool_size or max(database.DEFAULT_POOL_SIZE, args.threads)
+    
+    # 多个gunicorn进程之间不共享任务，轮询可能落到没有该任务的进程
+    app.config['ASYNC_REPORTS'] = not (args.server == 'gunicorn' and args.processes > 1)
+    
+    app.config['SLOW_QUERY_MS'] = args.slow_query_ms
+    app.config['SLOW_QUERY_LOG'] = args.slow_query_log
+    app.config['SLOW_QUERY_ENDPOINT'] = args.slow_query_endpoint
+    slow_query.log.configure(args.slow_query_ms, args.slow_query_log, app.config['SLOW_QUERY_REDACT'])
+    
     # 初始化数据库
     init_database()
+    # 初始化用的连接不带入工作进程
+    database.close_pools()
     print("✅ 数据库初始化完成")
     
-    # 在后台线程中打开浏览器
-    browser_thread = threading.Thread(target=open_browser)
-    browser_thread.daemon = True
-    browser_thread.start()
+    url_host = '127.0.0.1' if args.host in ('0.0.0.0', '::') else args.host
+    url = f"http://{url_host}:{args.port}"
+    
+    # 开发模式（桌面使用）下在后台线程中打开浏览器
+    if args.server == 'dev' and not args.no_browser:
+        browser_thread = threading.Thread(target=open_browser, args=(url,))
+        browser_thread.daemon = True
+        browser_thread.start()
     
     print("\n🎉 客户端启动成功！")
-    print("访问地址: http://127.0.0.1:5000")
+    print(f"运行模式: {args.server}（线程数 {args.threads}，进程数 {args.processes}）")
+    print(f"访问地址: {url}")
     print("测试账号: testuser / test123")
     print("\n按 Ctrl+C 停止服务")
     
-    # 启动Flask应用
+    # 启动服务
     try:
-        app.run(debug=False, host='127.0.0.1', port=5000, use_reloader=False)
+        server.serve(app, args.server, args.host, args.port, args.threads, args.processes)
     except KeyboardInterrupt:
         print("\n\n正在停止服务...")
-        print("服务已停止")
+    except RuntimeError as e:
+        print(f"❌ {e}")
+    finally:
+        database.close_pools()
+    print("服务已停止")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,166 @@
+"""
+慢查询日志
+执行时间（含取结果）超过阈值的SQL语句连同参数、耗时、所在接口和
+EXPLAIN QUERY PLAN 输出写入滚动日志文件（每行一个JSON），
+最近的记录保存在内存中供诊断接口查看。参数默认脱敏，只保留类型。
+
+配置项（Flask app.config）:
+    SLOW_QUERY_MS       阈值毫秒数，默认200，设为0或负数关闭
+    SLOW_QUERY_LOG      日志文件路径，默认 slow_queries.log，为空时只保存在内存
+    SLOW_QUERY_REDACT   是否对参数脱敏，默认True
+    SLOW_QUERY_ENDPOINT 是否开放诊断接口（可看到所有用户的SQL和执行计划），默认False
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+
+import database
+
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_LOG_FILE = 'slow_queries.log'
+
+# 单个日志文件大小上限及保留的历史文件数
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# 内存中保留的最近慢查询条数
+RECENT_SIZE = 200
+
+# 缓存的执行计划条数（按SQL文本）
+PLAN_CACHE_SIZE = 256
+
+# 这些语句没有执行计划
+_NO_PLAN_PREFIXES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'ANALYZE', 'VACUUM',
+                     'CREATE', 'DROP', 'ALTER', 'SAVEPOINT', 'RELEASE')
+
+_state = threading.local()
+
+
+class SlowQueryLog:
+    """慢查询记录器"""
+
+    def __init__(self, threshold_ms=DEFAULT_THRESHOLD_MS, redact=True):
+        self.threshold_ms = threshold_ms
+        self.redact = redact
+        self.logger = None
+        self._recent = deque(maxlen=RECENT_SIZE)
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def configure(self, threshold_ms=DEFAULT_THRESHOLD_MS, log_file=DEFAULT_LOG_FILE, redact=True):
+        self.threshold_ms = threshold_ms
+        self.redact = redact
+        if log_file:
+            logger = logging.getLogger('finance.slow_query')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            self.logger = logger
+        else:
+            self.logger = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms is not None and self.threshold_ms > 0
+
+    def observe(self, conn, sql, params, seconds, rows):
+        """数据库语句观察者"""
+        if not self.enabled or seconds * 1000 < self.threshold_ms:
+            return
+        # 获取执行计划时执行的EXPLAIN语句不再记录
+        if getattr(_state, 'active', False):
+            return
+        _state.active = True
+        try:
+            self.record(conn, sql, params, seconds, rows)
+        finally:
+            _state.active = False
+
+    def record(self, conn, sql, params, seconds, rows):
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(seconds * 1000, 2),
+            'rows': rows,
+            'endpoint': request.endpoint if has_request_context() else None,
+            'sql': ' '.join(sql.split()),
+            'params': self._format_params(params),
+            'plan': self.explain(conn, sql, params)
+        }
+        with self._lock:
+            self._recent.append(entry)
+        if self.logger is not None:
+            self.logger.info(json.dumps(entry, ensure_ascii=False))
+
+    def _format_params(self, params):
+        if params is None:
+            return None
+        if isinstance(params, dict):
+            return {key: self._format_value(value) for key, value in params.items()}
+        return [self._format_value(value) for value in params]
+
+    def _format_value(self, value):
+        if not self.redact or value is None:
+            return value
+        return f'<{type(value).__name__}>'
+
+    def explain(self, conn, sql, params):
+        """语句的执行计划，同一SQL只查询一次"""
+        key = sql.strip()
+        if params is None or key.upper().startswith(_NO_PLAN_PREFIXES):
+            return None
+
+        with self._lock:
+            plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        try:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {key}', params).fetchall()
+        except Exception as e:
+            return [f'无法获取执行计划: {e}']
+        plan = [detail for _, _, _, detail in rows]
+
+        with self._lock:
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
+
+    def recent(self, limit=RECENT_SIZE):
+        """最近的慢查询，新的在前"""
+        with self._lock:
+            entries = list(self._recent)
+        entries.reverse()
+        return entries[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._plans.clear()
+
+
+# 进程内共享的慢查询记录器
+log = SlowQueryLog()
+
+
+def init_app(app):
+    """按应用配置启用慢查询日志"""
+    app.config.setdefault('SLOW_QUERY_MS', DEFAULT_THRESHOLD_MS)
+    app.config.setdefault('SLOW_QUERY_LOG', DEFAULT_LOG_FILE)
+    app.config.setdefault('SLOW_QUERY_REDACT', True)
+    app.config.setdefault('SLOW_QUERY_ENDPOINT', False)
+    log.configure(app.config['SLOW_QUERY_MS'], app.config['SLOW_QUERY_LOG'],
+                  app.config['SLOW_QUERY_REDACT'])
+    database.add_query_observer(log.observe)
@@ -54,10 +54,10 @@ def start_server():
         if getattr(sys, 'frozen', False):
             # 在打包环境中，simple_desktop_client.py已经被打包进exe
             import simple_desktop_client
-            simple_desktop_client.main()
+            simple_desktop_client.main(sys.argv[1:])
         else:
-            # 在开发环境中，运行simple_desktop_client.py
-            subprocess.run([sys.executable, 'simple_desktop_client.py'])
+            # 在开发环境中，运行simple_desktop_client.py，命令行参数（运行模式、端口等）原样传递
+            subprocess.run([sys.executable, 'simple_desktop_client.py'] + sys.argv[1:])
             
     except Exception as e:
         print(f"❌ 启动失败: {e}")
@@ -0,0 +1,98 @@
+"""HTTP接口测试"""
+
+import database
+import ledger
+import simple_desktop_client
+
+
+def test_async_report_is_synchronous_when_jobs_are_per_process(client, monkeypatch):
+    monkeypatch.setitem(simple_desktop_client.app.config, 'ASYNC_REPORTS', False)
+    response = client.post('/api/web/reports/monthly', json={'year': 2024, 'month': 1, 'async': True})
+    assert response.status_code == 200
+    assert 'job_id' not in response.get_json()
+    assert response.get_json()['report']['summary']['records_count'] == 0
+
+    monkeypatch.setitem(simple_desktop_client.app.config, 'ASYNC_REPORTS', True)
+    response = client.post('/api/web/reports/yearly', json={'year': 2024, 'async': True})
+    assert response.status_code == 202
+    assert response.get_json()['job_id']
+
+
+def test_slow_query_endpoint_is_off_by_default(client, monkeypatch):
+    assert client.get('/api/diagnostics/slow-queries').status_code == 404
+
+    monkeypatch.setitem(simple_desktop_client.app.config, 'SLOW_QUERY_ENDPOINT', True)
+    response = client.get('/api/diagnostics/slow-queries')
+    assert response.status_code == 200
+    assert response.get_json()['success']
+
+
+def _add(client, amount, record_type, date):
+    return client.post('/api/records', json={'amount': amount, 'category': '餐饮' if record_type == 'expense' else '工资',
+                                             'type': record_type, 'description': '', 'date': date}).get_json()['id']
+
+
+def test_keyset_pages_cover_every_record_once(client):
+    # 同一天、同一时间的记录按id区分先后
+    ids = [_add(client, 10, 'expense', '2024-01-01'), _add(client, 20, 'expense', '2024-01-02 08:00:00'),
+           _add(client, 30, 'expense', '2024-01-02 08:00:00'), _add(client, 40, 'income', '2024-01-02'),
+           _add(client, 50, 'expense', '2024-01-03')]
+    expected = [ids[4], ids[2], ids[1], ids[3], ids[0]]
+
+    for limit in (1, 2, 5):
+        seen, cursor = [], None
+        while True:
+            response = client.get('/api/records', query_string={'limit': limit, 'before': cursor, 'total': 1}
+                                  if cursor else {'limit': limit, 'total': 1})
+            page = response.get_json()
+            assert len(page) <= limit
+            # 总数不受翻页游标影响
+            assert response.headers['X-Total-Count'] == '5'
+            seen += [item['id'] for item in page]
+            cursor = response.headers.get('X-Next-Cursor')
+            if cursor is None:
+                break
+        assert seen == expected
+
+    response = client.get('/api/records', query_string={'limit': 2, 'type': 'expense', 'total': 1})
+    assert response.headers['X-Total-Count'] == '4'
+    assert client.get('/api/records', query_string={'limit': 0}).get_json()[0]['id'] == ids[4]
+    assert 'X-Total-Count' not in client.get('/api/records', query_string={'limit': 2}).headers
+    assert client.get('/api/records', query_string={'limit': 2, 'before': 'bad'}).status_code == 400
+
+
+def test_batch_add_writes_nothing_when_any_row_fails(client):
+    response = client.post('/api/records/batch', json={'records': [
+        {'amount': 10, 'category': '餐饮', 'type': 'expense', 'date': '2024-01-01'},
+        {'amount': 'abc', 'category': '餐饮', 'type': 'expense', 'date': '2024-01-01'},
+        {'amount': 5, 'category': '餐饮', 'date': '2024-01-01'},
+    ]})
+    assert response.status_code == 400
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [True, False, False]
+    assert client.get('/api/records').get_json() == []
+
+    response = client.post('/api/records/batch', json=[
+        {'amount': 10, 'category': '餐饮', 'type': 'expense', 'date': '2024-01-01'},
+        {'amount': 20, 'category': '工资', 'type': 'income', 'date': '2024-01-02'},
+    ])
+    assert response.get_json()['created'] == 2
+    assert all(result['id'] for result in response.get_json()['results'])
+
+
+def test_batch_delete_reports_each_id(client, db_path):
+    with database.connection(db_path) as conn:
+        conn.execute("INSERT INTO users (username, password) VALUES ('other', '')")
+        foreign = ledger.add_record(conn, 2, 700, '餐饮', 'expense', '', '2024-01-01')
+        conn.commit()
+    own = [_add(client, 10, 'expense', '2024-01-01'), _add(client, 20, 'expense', '2024-01-01')]
+
+    response = client.delete('/api/records/batch', json={'ids': [own[0], foreign, 999999, own[0]]})
+    body = response.get_json()
+    assert body['deleted'] == 1
+    assert [result['success'] for result in body['results']] == [True, False, False, True]
+    assert client.get('/api/summary').get_json()['expense'] == 20
+    with database.connection(db_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM records WHERE id = ?', (foreign,)).fetchone()[0] == 1
+
+    assert client.delete('/api/records/batch', json={'ids': [own[1], 'x']}).status_code == 400
@@ -0,0 +1,44 @@
+"""列式分析引擎的增量刷新测试"""
+
+import sqlite3
+
+import pytest
+
+import aggregation
+import columnar
+import ledger
+
+pytest.importorskip('numpy')
+
+
+def _summary(result):
+    return (result.records_count, result.income_cents, result.expense_cents,
+            sorted(result.daily.items()), sorted(result.categories.items()))
+
+
+def test_refresh_matches_row_aggregation(db_path):
+    conn = sqlite3.connect(db_path)
+    ledger.add_records(conn, 1, [
+        (1250, '餐饮', 'expense', '午饭', '2024-01-05'),
+        (500000, '工资', 'income', '一月工资', '2024-01-10'),
+        (3000, '交通', 'expense', '打车', '2024-02-03'),
+        (800, '餐饮', 'expense', '早饭', '2024-03-15'),
+    ])
+    conn.commit()
+
+    engine = columnar.ColumnarEngine()
+    engine.aggregate_period(conn, 1, '2024-01-01', '2024-03-31')
+
+    ledger.add_record(conn, 1, 4500, '餐饮', 'expense', '晚饭', '2024-02-20')
+    ledger.add_record(conn, 1, 200, '交通', 'expense', '公交', '2024-04-01')
+    doomed = conn.execute("SELECT id FROM records WHERE description = '早饭'").fetchone()[0]
+    ledger.delete_record(conn, 1, doomed)
+    conn.commit()
+
+    for start, end in [('2024-01-01', '2024-12-31'), ('2024-02-01', '2024-02-29')]:
+        assert (_summary(engine.aggregate_period(conn, 1, start, end))
+                == _summary(aggregation.aggregate_period(conn, 1, start, end)))
+    stats = engine.stats()
+    assert stats['misses'] == 1
+    assert stats['refreshes'] == 1
+    conn.close()
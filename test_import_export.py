@@ -0,0 +1,78 @@
+"""
+导入导出测试
+"""
+
+import io
+import sqlite3
+
+import pytest
+
+import categories
+import database
+import import_export
+
+
+def _import(db_path, text, fmt='csv', batch_size=import_export.BATCH_SIZE):
+    with database.connection(db_path) as conn:
+        return import_export.import_records(conn, 1, io.StringIO(text), fmt, batch_size)
+
+
+def _count(db_path):
+    with database.connection(db_path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM records WHERE user_id = 1').fetchone()[0]
+
+
+def test_overlong_category_rejects_only_that_row(db_path):
+    long_name = '分' * 21
+    text = ('date,type,category,amount,description\n'
+            '2024-01-01,expense,餐饮,10.5,午餐\n'
+            f'2024-01-02,expense,{long_name},20,太长\n'
+            '2024-01-03,income,工资,1000,\n')
+
+    result = _import(db_path, text, batch_size=1)
+
+    assert result.imported == 2
+    assert result.failed == 1
+    assert result.errors == [{'line': 3, 'message': '分类名称不能超过20个字符'}]
+    assert _count(db_path) == 2
+
+
+def test_validate_row_keeps_sign_when_type_given():
+    row = import_export.validate_row({'amount': '-5', 'type': 'expense', 'category': '餐饮',
+                                      'date': '2024-01-01'})
+    assert row[0] == -500
+
+    row = import_export.validate_row({'amount': '-5', 'category': '餐饮', 'date': '2024-01-01'})
+    assert row[:3] == (500, '餐饮', 'expense')
+
+
+def test_export_round_trip(db_path):
+    text = ('date,type,category,amount,description\n'
+            '2024-01-01,expense,餐饮,10.50,午餐\n'
+            '2024-01-02 08:30:00,income,兼职,200,\n')
+    assert _import(db_path, text).imported == 2
+
+    with database.connection(db_path) as conn:
+        exported = ''.join(import_export.iter_export(conn, 1))
+    assert exported.lstrip('\ufeff').splitlines() == [
+        'date,type,category,amount,description',
+        '2024-01-01,expense,餐饮,10.50,午餐',
+        '2024-01-02 08:30:00,income,兼职,200.00,',
+    ]
+
+
+def test_import_batch_holds_write_lock_while_reading(db_path, monkeypatch):
+    # 批次读取分类期间其他连接提交写入，会使延迟事务之后的写入失败
+    resolve = categories.resolve
+
+    def resolve_with_concurrent_write(conn, user_id, pairs):
+        other = sqlite3.connect(db_path, timeout=0)
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            other.execute("UPDATE users SET ledger_version = ledger_version + 1 WHERE id = 1")
+        other.close()
+        return resolve(conn, user_id, pairs)
+
+    monkeypatch.setattr(categories, 'resolve', resolve_with_concurrent_write)
+    result = _import(db_path, 'date,type,category,amount,description\n2024-01-01,expense,餐饮,10.5,午餐\n')
+    assert result.imported == 1
+    assert _count(db_path) == 1
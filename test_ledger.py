@@ -0,0 +1,55 @@
+"""账本写入与月度汇总维护测试"""
+
+import sqlite3
+import threading
+
+import database
+import ledger
+
+
+def _rollups(conn):
+    return conn.execute('''
+        SELECT month, category_id, type, total_cents, count FROM monthly_rollups
+        WHERE user_id = 1 ORDER BY month, category_id, type
+    ''').fetchall()
+
+
+def test_rollups_follow_adds_and_deletes(db_path):
+    conn = sqlite3.connect(db_path)
+    first = ledger.add_record(conn, 1, 1250, '餐饮', 'expense', '午饭', '2024-01-05')
+    ids = ledger.add_records(conn, 1, [
+        (800, '餐饮', 'expense', '早饭', '2024-01-06'),
+        (500000, '工资', 'income', '一月工资', '2024-01-10'),
+        (3000, '交通', 'expense', '打车', '2024-02-03'),
+    ], return_ids=True)
+    assert ledger.delete_records(conn, 1, [first, ids[2], 999999]) == {first, ids[2]}
+
+    incremental = _rollups(conn)
+    assert sorted((month, record_type, total, count) for month, _, record_type, total, count in incremental) == \
+        [('2024-01', 'expense', 800, 1), ('2024-01', 'income', 500000, 1)]
+    ledger.rebuild_rollups(conn, 1)
+    assert _rollups(conn) == incremental
+    conn.close()
+
+
+def test_concurrent_delete_subtracts_once(db_path):
+    with database.connection(db_path) as conn:
+        record_id = ledger.add_record(conn, 1, 500, '餐饮', 'expense', '午饭', '2024-01-05')
+        ledger.add_record(conn, 1, 700, '餐饮', 'expense', '晚饭', '2024-01-05')
+        conn.commit()
+
+    # 第一个连接删除后暂不提交，第二个连接的删除要等写锁释放
+    first = sqlite3.connect(db_path)
+    assert ledger.delete_records(first, 1, [record_id]) == {record_id}
+    results = []
+    second = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+    worker = threading.Thread(target=lambda: results.append(ledger.delete_records(second, 1, [record_id])))
+    worker.start()
+    first.commit()
+    worker.join()
+    second.commit()
+
+    assert results == [set()]
+    assert _rollups(first) == [('2024-01', 5, 'expense', 700, 1)]
+    first.close()
+    second.close()
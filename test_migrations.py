@@ -0,0 +1,118 @@
+"""
+数据库迁移测试
+"""
+
+import sqlite3
+
+import database
+import dates
+import migrations
+
+
+def _rerun(conn, version):
+    """删除指定版本及之后的迁移记录并重新执行"""
+    conn.execute('DELETE FROM schema_version WHERE version >= ?', (version,))
+    conn.commit()
+    return migrations.migrate(conn)
+
+
+def test_normalize_accepts_slash_dates():
+    assert dates.normalize('2025/1/5') == '2025-01-05'
+    assert dates.normalize('2025/01/05 8:30') == '2025-01-05 08:30:00'
+
+
+def test_repair_record_day_fills_legacy_dates(db_path, capsys, monkeypatch):
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in migrations.MIGRATIONS if m[0] <= 12])
+    with database.connection(db_path) as conn:
+        conn.executemany('''
+            INSERT INTO records (user_id, amount_cents, category_id, type, description, date, day)
+            VALUES (1, ?, 5, 'expense', '', ?, NULL)
+        ''', [(1000, '2025/1/5'), (250, '2025/1/20 12:00'), (300, '去年')])
+        conn.commit()
+
+        assert _rerun(conn, 12) == [12]
+
+        rows = conn.execute('SELECT date, day FROM records ORDER BY id').fetchall()
+        assert rows[:2] == [('2025-01-05', dates.to_day('2025-01-05')),
+                            ('2025-01-20 12:00:00', dates.to_day('2025-01-20'))]
+        assert rows[2] == ('去年', None)
+        assert conn.execute('''
+            SELECT total_cents, count FROM monthly_rollups
+            WHERE user_id = 1 AND month = '2025-01' AND category_id = 5 AND type = 'expense'
+        ''').fetchone() == (1250, 2)
+
+    assert '1 条记录的日期无法识别' in capsys.readouterr().out
+
+
+def test_amounts_converted_with_decimal_rounding(tmp_path, monkeypatch, capsys):
+    import simple_desktop_client
+
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    simple_desktop_client._create_tables(conn)
+
+    # 先迁移到金额仍为REAL的版本6，写入旧数据后再执行之后的迁移
+    all_migrations = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in all_migrations if m[0] <= 6])
+    migrations.migrate(conn)
+    conn.executemany('''
+        INSERT INTO records (user_id, amount, category, type, description, date)
+        VALUES (1, ?, '餐饮', 'expense', '', '2024-03-01')
+    ''', [(1.005,), (2.675,), (0.1,), (19.99,), ('abc',)])
+    conn.commit()
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', all_migrations)
+    migrations.migrate(conn)
+
+    assert [row[0] for row in conn.execute('SELECT amount_cents FROM records ORDER BY id')] == \
+        [101, 268, 10, 1999, 0]
+    assert conn.execute('''
+        SELECT total_cents, count FROM monthly_rollups WHERE user_id = 1 AND month = '2024-03'
+    ''').fetchone() == (101 + 268 + 10 + 1999, 5)
+    conn.close()
+    assert '1 条记录的金额超出范围或无法解析' in capsys.readouterr().out
+
+
+def test_categories_migration_links_records_to_ids(tmp_path, monkeypatch):
+    import simple_desktop_client
+
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    simple_desktop_client._create_tables(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('other', '')")
+    conn.commit()
+
+    # 迁移到记录仍按名称保存分类的版本9，写入内置和自定义分类的记录
+    all_migrations = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in all_migrations if m[0] <= 9])
+    migrations.migrate(conn)
+    conn.executemany('''
+        INSERT INTO records (user_id, amount_cents, category, type, description, date, day)
+        VALUES (?, ?, ?, ?, '', '2024-03-01', ?)
+    ''', [(user_id, amount, category, record_type, dates.to_day('2024-03-01'))
+          for user_id, amount, category, record_type in [
+              (1, 1000, '餐饮', 'expense'), (1, 500, '奶茶', 'expense'), (1, 450, '奶茶', 'expense'),
+              (1, 100, '奶茶', 'income'), (1, 800000, '工资', 'income'), (2, 300, '奶茶', 'income')]])
+    conn.commit()
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', all_migrations)
+    migrations.migrate(conn)
+
+    global_ids = dict(conn.execute('SELECT name, id FROM categories WHERE user_id IS NULL'))
+    custom = conn.execute('''
+        SELECT user_id, name, type, sort_order FROM categories WHERE user_id IS NOT NULL ORDER BY user_id
+    ''').fetchall()
+    # 自定义分类的类型取记录最多的类型，排在同类型默认分类之后
+    assert custom == [(1, '奶茶', 'expense', 90), (2, '奶茶', 'income', 50)]
+    custom_ids = {(user_id, name): category_id for category_id, user_id, name in conn.execute(
+        'SELECT id, user_id, name FROM categories WHERE user_id IS NOT NULL')}
+
+    records = conn.execute('SELECT user_id, category_id, amount_cents FROM records ORDER BY id').fetchall()
+    assert records == [
+        (1, global_ids['餐饮'], 1000), (1, custom_ids[(1, '奶茶')], 500), (1, custom_ids[(1, '奶茶')], 450),
+        (1, custom_ids[(1, '奶茶')], 100), (1, global_ids['工资'], 800000), (2, custom_ids[(2, '奶茶')], 300)]
+    sums = conn.execute('''
+        SELECT user_id, SUM(total_cents), SUM(count) FROM monthly_rollups GROUP BY user_id ORDER BY user_id
+    ''').fetchall()
+    assert sums == [(1, 1000 + 500 + 450 + 100 + 800000, 5), (2, 300, 1)]
+    conn.close()
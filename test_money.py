@@ -0,0 +1,61 @@
+"""
+金额换算测试
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from money import MAX_CENTS, format_cents, from_cents, to_cents
+
+
+@pytest.mark.parametrize('value, cents', [
+    ('12.34', 1234),
+    (12.34, 1234),
+    (0.1, 10),
+    (1.005, 101),
+    ('1.005', 101),
+    ('-1.005', -101),
+    ('2.675', 268),
+    (' 7 ', 700),
+    (3, 300),
+    (Decimal('0.125'), 13),
+    ('0', 0),
+])
+def test_to_cents_rounds_half_up_in_decimal(value, cents):
+    assert to_cents(value) == cents
+
+
+@pytest.mark.parametrize('value', [None, True, '', 'abc', '1,000', 'nan', 'inf', '-Infinity'])
+def test_to_cents_rejects_invalid(value):
+    with pytest.raises(ValueError, match='金额格式错误'):
+        to_cents(value)
+
+
+def test_to_cents_rejects_out_of_range():
+    assert to_cents(MAX_CENTS / 100) == MAX_CENTS
+    with pytest.raises(ValueError, match='金额超出范围'):
+        to_cents(MAX_CENTS / 100 + 1)
+
+
+def test_from_cents():
+    assert from_cents(1234) == 12.34
+    assert from_cents(-5) == -0.05
+    assert from_cents(None) == 0
+
+
+@pytest.mark.parametrize('cents, text', [
+    (0, '0.00'),
+    (None, '0.00'),
+    (5, '0.05'),
+    (1234, '12.34'),
+    (-5, '-0.05'),
+    (-123456, '-1234.56'),
+])
+def test_format_cents(cents, text):
+    assert format_cents(cents) == text
+
+
+def test_format_cents_round_trips_through_to_cents():
+    for cents in (0, 1, -1, 99, 100, 101, -12345, MAX_CENTS):
+        assert to_cents(format_cents(cents)) == cents
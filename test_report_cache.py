@@ -0,0 +1,33 @@
+"""报告缓存失效测试"""
+
+import report_cache
+
+
+def _report(client, **period):
+    response = client.post(f"/api/web/reports/{'monthly' if 'month' in period else 'yearly'}", json=period)
+    return response.get_json()['report']['summary']
+
+
+def test_write_invalidates_only_affected_periods(client):
+    report_cache.cache.clear()
+    client.post('/api/records', json={'amount': 12.5, 'category': '餐饮', 'type': 'expense',
+                                      'description': '午饭', 'date': '2024-01-05'})
+    assert _report(client, year=2024, month=1)['expense'] == 12.5
+    assert _report(client, year=2024, month=2)['expense'] == 0
+    assert _report(client, year=2024)['expense'] == 12.5
+
+    client.post('/api/records', json={'amount': 30, 'category': '交通', 'type': 'expense',
+                                      'description': '打车', 'date': '2024-01-20'})
+    hits = report_cache.cache.stats()['hits']
+    assert _report(client, year=2024, month=1)['expense'] == 42.5
+    assert _report(client, year=2024)['expense'] == 42.5
+    assert report_cache.cache.stats()['hits'] == hits
+    # 未写入的月份仍从缓存取出
+    assert _report(client, year=2024, month=2)['expense'] == 0
+    assert report_cache.cache.stats()['hits'] == hits + 1
+
+    records = client.get('/api/records').get_json()
+    record_id = next(item['id'] for item in records if item['description'] == '打车')
+    client.delete(f'/api/records/{record_id}')
+    assert _report(client, year=2024, month=1)['expense'] == 12.5
+    assert _report(client, year=2024)['expense'] == 12.5
@@ -0,0 +1,40 @@
+"""记录搜索测试"""
+
+import sqlite3
+
+import ledger
+import search
+
+
+def test_ngrams_skip_ascii_punctuation():
+    assert search.ngrams('Hi-咖啡') == 'H i 咖 啡 Hi 咖啡'
+    assert search.ngram_indexable('咖啡')
+    assert not search.ngram_indexable('i-')
+    assert not search.ngram_indexable('咖啡店')
+
+
+def test_short_terms_use_ngram_index(db_path, monkeypatch):
+    conn = sqlite3.connect(db_path)
+    assert search.has_ngram_index(conn)
+    ledger.add_records(conn, 1, [
+        (1250, '餐饮', 'expense', '公司楼下咖啡', '2024-01-05'),
+        (3000, '交通', 'expense', 'Taxi 回家', '2024-01-06'),
+    ])
+    removed = ledger.add_record(conn, 1, 800, '餐饮', 'expense', '咖啡豆', '2024-01-07')
+    ledger.delete_record(conn, 1, removed)
+    conn.commit()
+
+    def no_like(term):
+        raise AssertionError(f'不应逐条LIKE匹配: {term}')
+    monkeypatch.setattr(search, 'like_pattern', no_like)
+
+    def descriptions(text):
+        return [row[4] for row in search.search_records(conn, 1, text)[1]]
+
+    assert descriptions('咖啡') == ['公司楼下咖啡']
+    assert descriptions('啡') == ['公司楼下咖啡']
+    assert descriptions('ta') == ['Taxi 回家']
+    assert descriptions('i 回') == ['Taxi 回家']
+    # 分类名称仍按category_id匹配
+    assert descriptions('交通') == ['Taxi 回家']
+    conn.close()